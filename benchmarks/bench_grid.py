@@ -0,0 +1,76 @@
+"""
+Benchmark of the SARIMA parameter search: serial fits in-process against the parallel search, for a growing
+number of processes, on a synthetic monthly series.
+
+    python -m benchmarks.bench_grid [n_configs] [n_years]
+"""
+
+import os
+import sys
+import time
+from functools import partial
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from tropicalia.algorithm import SARIMA
+from tropicalia.config import settings
+from tropicalia.jobs import ProcessMap
+
+
+def make_frame(n_years: int) -> pd.DataFrame:
+    months = n_years * 12
+    rng = np.random.default_rng(0)
+    values = 100 + 10 * np.sin(np.arange(months) * 2 * np.pi / 12) + np.arange(months) * 0.1 + rng.normal(size=months)
+    df = pd.DataFrame(
+        {"date": pd.date_range("2000-01-01", periods=months, freq="MS"), "yield_values": values},
+    )
+    return df.set_index(["date"])
+
+
+def serial(df: pd.DataFrame, configs: list) -> list:
+    """
+    Former search: every configuration is fitted in turn within the calling process.
+    """
+    return [SARIMA().evaluate_config(df, config) for config in configs]
+
+
+def parallel(df: pd.DataFrame, configs: list) -> list:
+    """
+    Current search: the configurations are fitted in worker processes.
+
+    Returns the best parameter selection.
+    """
+    sarima = SARIMA()
+    with ProcessMap(partial(sarima.evaluate_config, df), sarima.grid_workers(), settings.GRID_FIT_TIMEOUT) as pool:
+        return sarima.best_config(sarima.score(pool, configs))
+
+
+def run(n_configs: int, n_years: int) -> None:
+    df = make_frame(n_years)
+    configs = list(islice(SARIMA().configs(), n_configs))
+    cores = os.cpu_count() or 1
+
+    print(f"configs: {len(configs)}  months: {len(df)}  cores: {cores}")
+
+    start = time.perf_counter()
+    serial(df, configs)
+    baseline = time.perf_counter() - start
+    print(f"{'serial:':16}{baseline:8.2f} s")
+
+    processes = 1
+    while processes <= cores:
+        settings.GRID_WORKERS = processes
+        start = time.perf_counter()
+        best = parallel(df, configs)
+        elapsed = time.perf_counter() - start
+        print(f"{f'{processes} processes:':16}{elapsed:8.2f} s  speedup: {baseline / elapsed:5.2f}x  best: {best}")
+        processes *= 2
+
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 576,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    )
@@ -0,0 +1,60 @@
+"""
+Benchmark of the dataset load path: a JSON array of `DatasetRow` through the bulk upsert against a chunked file import.
+
+    python -m benchmarks.bench_import [n_rows]
+"""
+
+import asyncio
+import io
+import json
+import sys
+import time
+from typing import List
+
+import pandas as pd
+from pydantic import parse_obj_as
+
+from tropicalia.database import close_db_connection, create_db_connection
+from tropicalia.formats import pa
+from tropicalia.manager import DatasetManager
+from tropicalia.models.dataset import DatasetRow
+
+
+def make_frame(n_rows: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "date": pd.date_range("1900-01-01", periods=n_rows // 10 + 1).repeat(10)[:n_rows].strftime("%Y-%m-%d"),
+            "crop_type": [f"Crop {i % 10}" for i in range(n_rows)],
+            "yield_values": [float(i % 100) for i in range(n_rows)],
+        }
+    )
+
+
+async def run(n_rows: int) -> None:
+    df = make_frame(n_rows)
+    payload = df.to_json(orient="records")
+    files = {"csv": df.to_csv(index=False).encode()}
+    if pa is not None:
+        buffer = io.BytesIO()
+        df.to_parquet(buffer)
+        files["parquet"] = buffer.getvalue()
+
+    db = await create_db_connection(":memory:")
+    start = time.perf_counter()
+    rows = parse_obj_as(List[DatasetRow], json.loads(payload))
+    await DatasetManager().upsert_many(rows, "benchmark", db)
+    upsert = time.perf_counter() - start
+    await close_db_connection()
+
+    print(f"rows: {n_rows}")
+    print(f"{'JSON upsert:':16}{upsert:8.3f} s  {n_rows / upsert:12.0f} rows/s")
+
+    for file_format, content in files.items():
+        db = await create_db_connection(":memory:")
+        report = await DatasetManager().import_file(io.BytesIO(content), file_format, "benchmark", db)
+        await close_db_connection()
+        print(f"{file_format + ' import:':16}{report.seconds:8.3f} s  {report.rows_per_second:12.0f} rows/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
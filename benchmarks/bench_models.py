@@ -0,0 +1,54 @@
+"""
+Microbenchmark of building models from database rows: full pydantic validation against the `construct()` row factory.
+
+    python -m benchmarks.bench_models [n_rows]
+"""
+
+import sys
+import time
+from typing import Callable, List, Sequence, Type
+
+from pydantic import BaseModel
+
+from tropicalia.database import row_factory
+from tropicalia.models.algorithm import Algorithm
+from tropicalia.models.dataset import DatasetRow
+from tropicalia.models.user import UserInDB
+
+ROWS = {
+    DatasetRow: ("0123456789abcdef", "2000-01-01", "Mango", 12.5),
+    Algorithm: ("01234567", "SARIMA", "Mango", "2000-01-01"),
+    UserInDB: ("username", "user@tropicalia.com", "$2b$12$" + "x" * 53),
+}
+
+
+def validated(model: Type[BaseModel]) -> Callable[[Sequence], BaseModel]:
+    """
+    Former way of building models from rows: zipping against the fields and validating.
+    """
+
+    def build(row: Sequence) -> BaseModel:
+        return model(**{key: row[t] for t, key in enumerate(model.__fields__.keys())})
+
+    return build
+
+
+def timeit(build: Callable[[Sequence], BaseModel], rows: List[Sequence]) -> float:
+    start = time.perf_counter()
+    list(map(build, rows))
+    return time.perf_counter() - start
+
+
+def run(n_rows: int) -> None:
+    print(f"rows: {n_rows}")
+    for model, row in ROWS.items():
+        rows = [row] * n_rows
+        assert validated(model)(row) == row_factory(model)(row)
+
+        slow = timeit(validated(model), rows)
+        fast = timeit(row_factory(model), rows)
+        print(f"{model.__name__:12} validated: {slow:7.3f} s  row factory: {fast:7.3f} s  speedup: {slow / fast:5.1f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
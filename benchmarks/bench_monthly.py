@@ -0,0 +1,88 @@
+"""
+Benchmark of the monthly aggregation: former per-crop resampling with a JSON round trip
+against the single-pass `DatasetManager.monthly_frame`. Reports time and peak memory.
+
+    python -m benchmarks.bench_monthly [n_crops]
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from tropicalia.manager import DatasetManager
+from tropicalia.models.dataset import Dataset, DatasetRow
+
+
+def make_daily(n_years: int, n_crops: int) -> pd.DataFrame:
+    dates = pd.date_range("1990-01-01", periods=365 * n_years, freq="D")
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "date": np.tile(dates, n_crops),
+            "crop_type": np.repeat([f"Crop {i:03d}" for i in range(n_crops)], len(dates)),
+            "yield_values": rng.random(len(dates) * n_crops) * 100,
+        }
+    )
+
+
+def legacy_aggregate_monthly(df_daily: pd.DataFrame) -> Dataset:
+    """
+    Former implementation: one resample per crop, concatenation and a JSON / eval round trip.
+    """
+    df_month = pd.DataFrame()
+    df_daily["date"] = pd.to_datetime(df_daily["date"])
+
+    for v in df_daily["crop_type"].unique():
+        df_var = df_daily[df_daily["crop_type"] == v][["date", "yield_values"]]
+        df_var = df_var.set_index("date").resample("MS").sum()
+        df_var["crop_type"] = v
+        df_var = df_var.reset_index()
+
+        df_month = pd.concat([df_month, df_var])
+
+    df_month = df_month[df_month["yield_values"] > 0.0]
+    df_month["date"] = df_month["date"].dt.strftime("%Y-%m-%d")
+    df_month = df_month[["date", "crop_type", "yield_values"]]
+    month_json = df_month.to_json(orient="table", index=False)
+    month_json = eval(month_json)
+    month_json = eval(json.dumps(month_json["data"]))
+
+    return Dataset(data=[DatasetRow(**row) for row in month_json])
+
+
+def aggregate_monthly(df_daily: pd.DataFrame) -> Dataset:
+    """
+    Current implementation: a single groupby over every crop.
+    """
+    manager = DatasetManager()
+    return manager.frame_to_dataset(manager.monthly_frame(df_daily))
+
+
+def measure(func, df: pd.DataFrame):
+    df = df.copy()
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(df)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def run(n_crops: int) -> None:
+    for n_years in (10, 20, 30):
+        df = make_daily(n_years, n_crops)
+        legacy_time, legacy_peak = measure(legacy_aggregate_monthly, df)
+        new_time, new_peak = measure(aggregate_monthly, df)
+
+        print(f"{n_years} years x {n_crops} crops ({len(df)} daily rows)")
+        print(f"  per-crop resample + JSON: {legacy_time:7.3f} s  peak {legacy_peak:8.1f} MiB")
+        print(f"  single-pass groupby:      {new_time:7.3f} s  peak {new_peak:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,58 @@
+"""
+Benchmark of read throughput with concurrent clients for different reader pool sizes.
+
+    python -m benchmarks.bench_read_pool [n_rows] [n_clients]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from tropicalia.database import close_db_connection, create_db_connection, db
+
+QUERY = """
+    SELECT crop_type, COUNT(*), SUM(yield_values)
+    FROM dataset
+    WHERE crop_type >= ? AND crop_type < ?
+    GROUP BY crop_type
+"""
+
+
+async def populate(n_rows: int) -> None:
+    async with db.write() as connection:
+        await connection.executemany(
+            "INSERT INTO dataset (uid, date, crop_type, yield_values) VALUES (?, ?, ?, ?)",
+            ((str(i), f"{1990 + i % 30}-01-01", f"Crop {i % 50}", float(i % 100)) for i in range(n_rows)),
+        )
+
+
+async def client(n_queries: int) -> None:
+    for _ in range(n_queries):
+        async with db.read() as connection:
+            res = await connection.execute(QUERY, ["Crop", "Cros"])
+            await res.fetchall()
+
+
+async def run(n_rows: int, n_clients: int, n_queries: int = 10) -> None:
+    print(f"rows: {n_rows}  clients: {n_clients}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = str(Path(tmp_dir, "db.sqlite3"))
+        for pool_size in (1, 2, 4, 8):
+            await create_db_connection(path=path, pool_size=pool_size)
+            if pool_size == 1:
+                await populate(n_rows)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(client(n_queries) for _ in range(n_clients)))
+            elapsed = time.perf_counter() - start
+            await close_db_connection()
+
+            print(f"pool size {pool_size}: {n_clients * n_queries / elapsed:8.1f} queries/s")
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    n_clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    asyncio.run(run(n_rows, n_clients))
@@ -0,0 +1,65 @@
+"""
+Comparison of the SARIMA parameter search strategies: the exhaustive grid against the stepwise search,
+reporting the fits performed and the best AIC achieved on synthetic monthly series.
+
+    python -m benchmarks.bench_search [n_years] [margin ...]
+"""
+
+import sys
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from tropicalia.algorithm import SARIMA, SearchStrategy
+from tropicalia.config import settings
+
+
+def make_series(n_years: int) -> Dict[str, pd.DataFrame]:
+    months = n_years * 12
+    rng = np.random.default_rng(0)
+    t = np.arange(months)
+    seasonal = 10 * np.sin(t * 2 * np.pi / 12)
+
+    ar = np.zeros(months)
+    for i in range(1, months):
+        ar[i] = 0.7 * ar[i - 1] + rng.normal()
+
+    series = {
+        "seasonal trend": 100 + seasonal + 0.1 * t + rng.normal(size=months),
+        "seasonal AR(1)": 50 + seasonal + ar,
+        "random walk": 100 + np.cumsum(rng.normal(size=months)),
+    }
+    dates = pd.date_range("2000-01-01", periods=months, freq="MS")
+
+    return {
+        name: pd.DataFrame({"date": dates, "yield_values": values}).set_index(["date"])
+        for name, values in series.items()
+    }
+
+
+def run(n_years: int, margins: list) -> None:
+    print(f"months: {n_years * 12}")
+
+    for name, df in make_series(n_years).items():
+        strategies = [(SearchStrategy.GRID.value, 0)] + [(SearchStrategy.STEPWISE.value, margin) for margin in margins]
+
+        for search, margin in strategies:
+            settings.STEPWISE_AIC_MARGIN = margin
+            start = time.perf_counter()
+            scores = SARIMA(search).search_models(df)
+            elapsed = time.perf_counter() - start
+
+            label = search if search == SearchStrategy.GRID.value else f"{search} ({margin:g})"
+            best = min(scores, key=scores.get)
+            print(
+                f"{name:16}{label:18}fits: {len(scores):4}  AIC: {scores[best]:10.2f}  {elapsed:8.2f} s  best: {best}"
+            )
+
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+        [float(margin) for margin in sys.argv[2:]] or [0, 2],
+    )
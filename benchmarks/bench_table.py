@@ -0,0 +1,76 @@
+"""
+Regression benchmark of `DatasetManager.get_table` over a 20-year daily history,
+against the former nested scan of the daily rows for every month.
+
+    python -m benchmarks.bench_table [n_crops]
+"""
+
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from benchmarks.bench_monthly import aggregate_monthly
+from tropicalia.manager import DatasetManager
+from tropicalia.models.dataset import Dataset, DatasetRow, MonthRow, TableDataset
+
+
+def make_daily(n_years: int, n_crops: int) -> Dataset:
+    start = date(2000, 1, 1)
+    return Dataset(
+        data=[
+            DatasetRow(
+                uid=f"{crop}-{day}", date=start + timedelta(days=day), crop_type=f"Crop {crop}", yield_values=1.0
+            )
+            for crop in range(n_crops)
+            for day in range(365 * n_years)
+        ]
+    )
+
+
+def legacy_get_table(daily_data: Dataset, monthly_data: Dataset) -> TableDataset:
+    """
+    Former implementation: every month scans the whole daily history.
+    """
+    monthly_data = list(map(lambda row: row.dict(), monthly_data.data))
+    daily_data = list(map(lambda row: row.dict(), daily_data.data))
+
+    for month_data in monthly_data:
+        year = month_data["date"].year
+        month = month_data["date"].month
+        crop_type = month_data["crop_type"]
+
+        data_in_month = [
+            x for x in daily_data if x["date"].year == year and x["date"].month == month and x["crop_type"] == crop_type
+        ]
+        month_data["children"] = data_in_month
+
+    monthly_data = sorted(monthly_data, key=lambda k: k["date"])
+    dataset_rows = [MonthRow(**row) for row in monthly_data]
+
+    return TableDataset(data=dataset_rows)
+
+
+def run(n_crops: int, n_years: int = 20) -> None:
+    manager = DatasetManager()
+    daily_data = make_daily(n_years, n_crops)
+    monthly_data = aggregate_monthly(pd.DataFrame([row.dict() for row in daily_data.data]))
+
+    start = time.perf_counter()
+    legacy = legacy_get_table(daily_data, monthly_data)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = manager.get_table(daily_data, monthly_data)
+    table_time = time.perf_counter() - start
+
+    assert table == legacy
+
+    print(f"{n_years} years x {n_crops} crops ({len(daily_data.data)} daily rows, {len(table.data)} months)")
+    print(f"  nested scan:   {legacy_time:8.3f} s")
+    print(f"  grouped build: {table_time:8.3f} s")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2)
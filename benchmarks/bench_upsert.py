@@ -0,0 +1,74 @@
+"""
+Benchmark of the dataset upsert path: legacy per-row round trips against the bulk `executemany` upsert.
+
+    python -m benchmarks.bench_upsert [n_rows]
+"""
+
+import asyncio
+import sys
+import time
+from datetime import date, timedelta
+
+import aiosqlite
+
+from tropicalia.manager import DatasetManager
+from tropicalia.migrations import migrate
+from tropicalia.models.dataset import DatasetRow
+
+
+def make_rows(n_rows: int):
+    start = date(1990, 1, 1)
+    return [
+        DatasetRow(uid=str(i), date=start + timedelta(days=i), crop_type="Mango", yield_values=float(i % 100))
+        for i in range(n_rows)
+    ]
+
+
+async def legacy_upsert(row: DatasetRow, db: aiosqlite.Connection) -> None:
+    """
+    Round trips issued by the former `DatasetManager.upsert`: lookup, write, re-select and lookup.
+    """
+    res = await db.execute(f"SELECT * FROM dataset WHERE uid = '{row.uid}'")
+    row_in_db = await res.fetchall()
+    if row_in_db:
+        query = f"""
+            UPDATE dataset
+            SET (date, crop_type, yield_values) = ('{row.date}', '{row.crop_type}', '{row.yield_values}')
+            WHERE uid = '{row.uid}'
+        """
+    else:
+        query = f"""
+            INSERT INTO dataset (uid, date, crop_type, yield_values)
+            VALUES ('{row.uid}', '{row.date}', '{row.crop_type}', '{row.yield_values}')
+        """
+    await db.execute(query)
+    res = await db.execute(f"SELECT * FROM dataset WHERE uid = '{row.uid}'")
+    await res.fetchall()
+    res = await db.execute(f"SELECT * FROM dataset WHERE uid = '{row.uid}'")
+    await res.fetchall()
+
+
+async def run(n_rows: int) -> None:
+    rows = make_rows(n_rows)
+
+    async with aiosqlite.connect(":memory:") as db:
+        await migrate(db)
+        start = time.perf_counter()
+        for row in rows:
+            await legacy_upsert(row, db)
+        await db.commit()
+        legacy = time.perf_counter() - start
+
+    async with aiosqlite.connect(":memory:") as db:
+        await migrate(db)
+        start = time.perf_counter()
+        await DatasetManager().upsert_many(rows, "benchmark", db)
+        bulk = time.perf_counter() - start
+
+    print(f"rows: {n_rows}")
+    print(f"per-row upsert: {legacy:8.3f} s  {n_rows / legacy:12.0f} rows/s")
+    print(f"bulk upsert:    {bulk:8.3f} s  {n_rows / bulk:12.0f} rows/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
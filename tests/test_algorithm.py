@@ -0,0 +1,192 @@
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pkg_resources
+import pytest
+
+from tropicalia import algorithm
+from tropicalia.algorithm import (
+    SARIMA,
+    HoltWinters,
+    MLAlgorithm,
+    SearchStrategy,
+    SeasonalMean,
+    SeasonalNaive,
+    refresh_algorithm,
+    seasonal_means,
+)
+from tropicalia.config import settings
+
+
+class DistancePool:
+    """
+    Stand-in for a `ProcessMap`, scoring configurations by their distance to a target one.
+    """
+
+    def __init__(self, target: tuple):
+        self.target = target
+        self.fits = 0
+
+    def map(self, configs: list) -> list:
+        self.fits += len(configs)
+        return [(sum((a - b) ** 2 for a, b in zip(config, self.target)), None) for config in configs]
+
+
+def monthly_frame(values: np.ndarray) -> pd.DataFrame:
+    dates = pd.date_range("2000-01-01", periods=len(values), freq="MS")
+    return pd.DataFrame({"date": dates, "yield_values": values}).set_index(["date"])
+
+
+def test_configs() -> None:
+    """
+    Test whether the grid covers every parameter configuration within bounds.
+    """
+    configs = list(SARIMA().configs())
+
+    assert len(configs) == 3 * 2 * 4 * 3 * 2 * 4
+    assert configs[0] == (0, 0, 0, 0, 0, 0, 12) and configs[-1] == (2, 1, 3, 2, 1, 3, 12)
+
+
+def test_neighbours() -> None:
+    """
+    Test whether the neighbours of a configuration stay within bounds and keep its differencing orders.
+    """
+    neighbours = set(SARIMA().neighbours((0, 1, 0, 0, 1, 0, 12)))
+
+    assert neighbours == {
+        (1, 1, 0, 0, 1, 0, 12),
+        (0, 1, 1, 0, 1, 0, 12),
+        (0, 1, 0, 1, 1, 0, 12),
+        (0, 1, 0, 0, 1, 1, 12),
+        (1, 1, 1, 0, 1, 0, 12),
+        (0, 1, 0, 1, 1, 1, 12),
+    }
+
+
+def test_stepwise() -> None:
+    """
+    Test whether the stepwise search reaches the best configuration with a fraction of the fits of the grid,
+    keeping the differencing orders of the unit root tests.
+    """
+    df = monthly_frame(np.cumsum(np.random.default_rng(0).normal(size=120)))
+    target = (2, 1, 3, 0, 0, 2, 12)
+    pool = DistancePool(target)
+
+    scores = SARIMA(SearchStrategy.STEPWISE.value).stepwise(df, pool)
+
+    assert SARIMA().best_config(scores) == [(2, 1, 3), (0, 0, 2, 12)]
+    assert {(config[1], config[4]) for config in scores} == {(1, 0)}
+    assert pool.fits == len(scores) < len(list(SARIMA().configs())) // 4
+
+
+def test_differences() -> None:
+    """
+    Test whether seasonal and non seasonal differencing is chosen for seasonal and trending data.
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(240)
+
+    assert SARIMA().differences(monthly_frame(rng.normal(size=240))) == (0, 0)
+    assert SARIMA().differences(monthly_frame(10 * np.sin(t * 2 * np.pi / 12) + rng.normal(size=240)))[1] == 1
+    assert SARIMA().differences(monthly_frame(np.cumsum(rng.normal(size=240))))[0] == 1
+
+
+def test_refresh() -> None:
+    """
+    Test whether a fitted model is extended with the new months, and whether a full training is due
+    when past months have changed or too many months were added.
+    """
+    rng = np.random.default_rng(0)
+    values = 100 + 10 * np.sin(np.arange(72) * 2 * np.pi / 12) + rng.normal(size=72)
+    fit_model = SARIMA().fit(monthly_frame(values[:60]), [(1, 0, 0), (0, 1, 0, 12)])
+
+    refreshed = SARIMA().refresh(monthly_frame(values[:66]), fit_model)
+    assert refreshed.nobs == 66
+    assert refreshed.model.order == (1, 0, 0) and refreshed.model.seasonal_order == (0, 1, 0, 12)
+    assert SARIMA().refresh(monthly_frame(values[:60]), fit_model) is fit_model
+
+    changed = values.copy()
+    changed[10] += 50
+    assert SARIMA().refresh(monthly_frame(changed[:66]), fit_model) is None
+    drifted = values.copy()
+    drifted[60:] += 100
+    assert SARIMA().refresh(monthly_frame(drifted), fit_model) is None
+
+    settings.REFRESH_MAX_MONTHS, max_months = 3, settings.REFRESH_MAX_MONTHS
+    try:
+        assert SARIMA().refresh(monthly_frame(values[:66]), fit_model) is None
+    finally:
+        settings.REFRESH_MAX_MONTHS = max_months
+
+
+def test_refresh_fallback(monkeypatch) -> None:
+    """
+    Test whether an algorithm which cannot be refreshed is trained from scratch.
+    """
+    values = 100 + 10 * np.sin(np.arange(72) * 2 * np.pi / 12)
+    fit_model = SARIMA().fit(monthly_frame(values[:60]), [(1, 0, 0), (0, 1, 0, 12)])
+    monkeypatch.setattr(SARIMA, "search_models", lambda self, df: {(0, 0, 0, 0, 1, 0, 12): 0})
+
+    alg_obj, refreshed = refresh_algorithm("SARIMA", monthly_frame(values[1:]), pickle.dumps(fit_model))
+
+    assert not refreshed
+    assert pickle.loads(alg_obj).model.order == (0, 0, 0)
+
+
+def test_register(monkeypatch) -> None:
+    """
+    Test whether algorithms join the registry through the decorator and the entry points of installed packages.
+    """
+    monkeypatch.setattr(algorithm, "ALGORITHMS", dict(algorithm.ALGORITHMS))
+
+    @algorithm.register("Decorated")
+    class Decorated(MLAlgorithm):
+        pass
+
+    entry_point = SimpleNamespace(name="Plugin", load=lambda: SeasonalNaive)
+    monkeypatch.setattr(pkg_resources, "iter_entry_points", lambda group: [entry_point])
+    algorithm.load_plugins()
+
+    assert algorithm.ALGORITHMS["Decorated"] is Decorated and algorithm.ALGORITHMS["Plugin"] is SeasonalNaive
+    assert {"SARIMA", "Prophet", "SeasonalNaive", "SeasonalMean", "HoltWinters"} <= set(algorithm.ALGORITHMS)
+
+
+def test_seasonal_means() -> None:
+    """
+    Test whether the seasonal means of many series, of any length, are those of the previous values of each month.
+    """
+    values = np.arange(40, dtype=float).reshape(2, 20)
+
+    fitted, season = seasonal_means(values)
+
+    assert np.isnan(fitted[:, :12]).all()
+    assert np.array_equal(fitted[:, 12:], values[:, :8])
+    # The season to come starts with months 8 to 11, seen once, followed by months 0 to 7, seen twice.
+    assert np.array_equal(season[:, :4], values[:, 8:12])
+    assert np.array_equal(season[:, 4:], values[:, :8] + 6)
+
+
+def test_baselines() -> None:
+    """
+    Test whether the baseline algorithms forecast a seasonal series, starting the month after their data.
+    """
+    t = np.arange(62)
+    values = 100 + 10 * np.sin(t * 2 * np.pi / 12)
+    df = monthly_frame(values)
+    plain = df.reset_index()
+
+    for alg in [SeasonalNaive(), SeasonalMean(), HoltWinters()]:
+        fit_model = pickle.loads(pickle.dumps(alg.train(df)))
+
+        last_year_data, forecast = alg.forecast(plain, False, fit_model)
+        prediction = alg.predict(plain, fit_model)
+
+        assert len(last_year_data) == len(prediction) == 36 and len(forecast) == 12
+        assert forecast["date"].iloc[0] == df.index[-1] + pd.DateOffset(months=1)
+        assert np.allclose(forecast["yield_values"], 100 + 10 * np.sin(np.arange(62, 74) * 2 * np.pi / 12), atol=1)
+        assert alg.refresh(monthly_frame(values[:-1]), fit_model).last_date == df.index[-2]
+
+    with pytest.raises(ValueError):
+        HoltWinters().train(monthly_frame(values[:20]))
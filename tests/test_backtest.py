@@ -0,0 +1,74 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from tropicalia.algorithm import SARIMA
+from tropicalia.backtest import cutoffs, score
+from tropicalia.config import settings
+from tropicalia.database import Database, close_db_connection, create_db_connection
+from tropicalia.manager import BacktestManager, DatasetManager
+from tropicalia.models.dataset import DatasetRow
+
+
+@pytest.fixture
+async def setup_database() -> Database:
+    """
+    Fixture to set up the migrated database
+    """
+    db = await create_db_connection(path=":memory:")
+    yield db
+
+    # TEAR DOWN
+    await close_db_connection()
+
+
+def test_cutoffs() -> None:
+    """
+    Test whether the cutoffs leave out the longest horizon and keep the shortest training data.
+    """
+    assert cutoffs(60, 3, 2) == [44, 46, 48]
+    assert cutoffs(50, 12, 1) == [36, 37, 38]
+    assert cutoffs(40, 12, 1) == []
+
+
+def test_score() -> None:
+    """
+    Test whether the errors of each horizon are measured over the months ahead of every successful fold.
+    """
+    values = np.arange(14, dtype=float)
+    forecasts = [np.arange(12) + 1.0, None, np.full(12, np.nan)]
+    forecasts[2][:1] = 4
+
+    scores = score(values, [0, 1, 2], forecasts)
+
+    # The first month ahead of the first fold has no yield, and the last fold is valid for the next month only.
+    assert scores[1] == (2, 1.5, 100.0, np.sqrt(2.5))
+    assert scores[12].folds == 1 and scores[12].mae == 1 and scores[12].rmse == 1
+    assert scores[12].mape == pytest.approx(np.mean(1 / np.arange(1, 12)) * 100)
+
+
+@pytest.mark.asyncio
+async def test_backtest(setup_database, monkeypatch) -> None:
+    """
+    Test whether the folds of every pair are evaluated and their metrics stored, replacing previous ones.
+    """
+    db = setup_database
+    rng = np.random.default_rng(0)
+    values = 100 + 10 * np.sin(np.arange(60) * 2 * np.pi / 12) + rng.normal(size=60)
+    rows = [
+        DatasetRow(uid=None, date=date(2000 + i // 12, i % 12 + 1, 1), crop_type="Mango", yield_values=value)
+        for i, value in enumerate(values)
+    ]
+    await DatasetManager().upsert_many(rows, "test", db)
+    monkeypatch.setattr(SARIMA, "search_config", lambda self, df: [(1, 0, 0), (0, 1, 0, 12)])
+    monkeypatch.setattr(settings, "BACKTEST_FOLDS", 3)
+    monkeypatch.setattr(settings, "BACKTEST_WORKERS", 2)
+
+    metrics = await BacktestManager().backtest(["SARIMA"], [], "test")
+    assert [(m.crop_type, m.horizon, m.folds) for m in metrics] == [("Mango", 1, 3), ("Mango", 12, 3)]
+    assert all(0 < m.mae <= m.rmse < 10 and 0 < m.mape < 10 for m in metrics)
+
+    await BacktestManager().backtest(["SARIMA"], ["Mango"], "test")
+    stored = await BacktestManager().get(None, "Mango", "test", db)
+    assert [(m.algorithm, m.horizon, m.mae) for m in stored] == [(m.algorithm, m.horizon, m.mae) for m in metrics]
@@ -0,0 +1,58 @@
+from tropicalia.cache import ResultCache
+
+
+def test_cache_hit_and_miss() -> None:
+    """
+    Test whether entries are only served for the revision they were computed from.
+    """
+    cache = ResultCache(max_entries=8, max_bytes=1024, ttl=60)
+    cache.put("Man", (None,), "Mango:1", b"table", "application/json")
+
+    assert cache.get("Man", (None,), "Mango:1").content == b"table"
+    assert cache.get("Man", (10,), "Mango:1") is None
+    assert cache.get("Man", (None,), "Mango:2") is None
+    assert cache.get("Man", (None,), "Mango:1") is None
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 3, 0)
+
+
+def test_cache_bounds() -> None:
+    """
+    Test whether the least recently used entries are evicted to honour the size bounds,
+    and whether expired entries are not served.
+    """
+    cache = ResultCache(max_entries=2, max_bytes=10, ttl=60)
+    cache.put("A", (), "", b"aaaa", "")
+    cache.put("B", (), "", b"bbbb", "")
+    cache.get("A", (), "")
+    cache.put("C", (), "", b"cccc", "")
+
+    assert cache.get("B", (), "") is None
+    assert cache.get("A", (), "") and cache.get("C", (), "")
+
+    cache.put("D", (), "", b"dddddddd", "")
+    assert list(cache.entries) == [("D", ())]
+    assert cache.stats().evictions == 3
+
+    cache.put("E", (), "", b"e" * 11, "")
+    assert cache.get("E", (), "") is None
+
+    expired = ResultCache(max_entries=2, max_bytes=10, ttl=-1)
+    expired.put("A", (), "", b"aaaa", "")
+    assert expired.get("A", (), "") is None
+
+
+def test_cache_invalidate() -> None:
+    """
+    Test whether writing a crop type invalidates the entries of every prefix matching it, ignoring case.
+    """
+    cache = ResultCache(max_entries=8, max_bytes=1024, ttl=60)
+    for prefix in ("", "Man", "Mango", "mango", "M_ngo", "Mandarin", "Avo"):
+        cache.put(prefix, (), "", b"table", "")
+
+    cache.invalidate(["Mango"])
+
+    assert [key[0] for key in cache.entries] == ["Mandarin", "Avo"]
+    assert cache.stats().invalidations == 5
+    assert cache.size == 10
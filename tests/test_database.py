@@ -0,0 +1,106 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from tropicalia.database import Database, close_db_connection, create_db_connection, db, row_factory
+from tropicalia.models.algorithm import Algorithm
+from tropicalia.models.dataset import DatasetRow
+
+
+@pytest.fixture
+async def setup_pool(tmp_path) -> Database:
+    """
+    Fixture to set up a pooled database on disk
+    """
+    await create_db_connection(path=str(tmp_path / "db.sqlite3"), pool_size=2)
+    yield db
+
+    # TEAR DOWN
+    await close_db_connection()
+
+
+@pytest.mark.asyncio
+async def test_wal_mode(setup_pool) -> None:
+    """
+    Test whether the database is set up in WAL mode with the requested amount of readers.
+    """
+    res = await setup_pool.client.execute("PRAGMA journal_mode")
+    (mode,) = await res.fetchone()
+
+    assert mode == "wal"
+    assert setup_pool.readers.qsize() == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_readers(setup_pool) -> None:
+    """
+    Test whether concurrent readers borrow different connections and give them back.
+    """
+    async with setup_pool.read() as first, setup_pool.read() as second:
+        assert first is not second
+        assert setup_pool.readers.empty()
+
+    assert setup_pool.readers.qsize() == 2
+
+
+@pytest.mark.asyncio
+async def test_readers_are_read_only(setup_pool) -> None:
+    """
+    Test whether pooled connections refuse to write.
+    """
+    with pytest.raises(Exception):
+        async with setup_pool.read() as connection:
+            await connection.execute("DELETE FROM dataset")
+
+
+@pytest.mark.asyncio
+async def test_write_transaction(setup_pool) -> None:
+    """
+    Test whether writes are committed on success, rolled back on failure and visible to readers.
+    """
+    query = "INSERT INTO dataset (uid, date, crop_type, yield_values) VALUES (?, '2000-01-01', 'Mango', 1.0)"
+
+    async with setup_pool.write() as connection:
+        await connection.execute(query, ["0"])
+
+    with pytest.raises(RuntimeError):
+        async with setup_pool.write() as connection:
+            await connection.execute(query, ["1"])
+            raise RuntimeError
+
+    async with setup_pool.read() as connection:
+        res = await connection.execute("SELECT uid FROM dataset")
+        rows = await res.fetchall()
+
+    assert rows == [("0",)]
+
+
+@pytest.mark.asyncio
+async def test_writers_are_serialized(setup_pool) -> None:
+    """
+    Test whether concurrent writers wait for each other.
+    """
+    events = []
+
+    async def writer(name: str) -> None:
+        async with setup_pool.write():
+            events.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} end")
+
+    await asyncio.gather(writer("a"), writer("b"))
+
+    assert events == ["a start", "a end", "b start", "b end"]
+
+
+def test_row_factory() -> None:
+    """
+    Test whether rows are built into the same models as through validation, parsing their dates.
+    """
+    row = ("0", "2000-01-01", "Mango", 1.0)
+    dataset_row = row_factory(DatasetRow)(row)
+
+    assert dataset_row == DatasetRow(uid="0", date="2000-01-01", crop_type="Mango", yield_values=1.0)
+    assert dataset_row.date == date(2000, 1, 1)
+    assert row_factory(Algorithm)(("0", "SARIMA", "Mango", "2000-12-01")).last_date == date(2000, 12, 1)
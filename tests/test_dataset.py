@@ -0,0 +1,296 @@
+import json
+from datetime import date
+from functools import partial
+
+import pytest
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from tropicalia.api.v1 import dataset
+from tropicalia.auth import get_current_user
+from tropicalia.database import Database, close_db_connection, create_db_connection
+from tropicalia.manager import DatasetManager
+from tropicalia.models.dataset import DatasetRow
+from tropicalia.models.user import UserInDB
+
+
+@pytest.fixture
+async def setup_database() -> Database:
+    """
+    Fixture to set up the migrated database
+    """
+    db = await create_db_connection(path=":memory:")
+    yield db
+
+    # TEAR DOWN
+    await close_db_connection()
+
+
+@pytest.fixture
+def client(tmp_path) -> TestClient:
+    """
+    Fixture to set up a client of the data API, authenticated and with its own database
+    """
+    app = FastAPI()
+    app.include_router(dataset.router, prefix="/api/v1/data")
+    app.add_event_handler("startup", partial(create_db_connection, path=str(tmp_path / "db.sqlite3")))
+    app.add_event_handler("shutdown", close_db_connection)
+    app.dependency_overrides[get_current_user] = lambda: UserInDB(username="test", email="test@test", password="")
+
+    with TestClient(app) as client:
+        yield client
+
+
+def table_rows(client: TestClient) -> list:
+    """
+    Returns the (uid, yield_values) of every day of the table served by the data API.
+    """
+    res = client.get("/api/v1/data/get")
+    return [(day["uid"], day["yield_values"]) for month in res.json()["data"] for day in month["children"]]
+
+
+def by_month(months: list) -> list:
+    """
+    Sorts the months of a data table by crop type and date, the order in which they are streamed.
+    """
+    return sorted(months, key=lambda month: (month["crop_type"], month["date"]))
+
+
+async def stored_rows(db: Database) -> list:
+    res = await db.execute("SELECT uid, date, crop_type, yield_values FROM dataset ORDER BY uid")
+    return await res.fetchall()
+
+
+@pytest.mark.asyncio
+async def test_upsert_many(setup_database) -> None:
+    """
+    Test whether existing rows are updated in place and new ones are inserted, giving a uid to those lacking one.
+    """
+    db = setup_database
+    await DatasetManager().upsert_many(
+        [DatasetRow(uid="a", date="2000-01-01", crop_type="Mango", yield_values=1.0)], "test", db
+    )
+
+    rows = [
+        DatasetRow(uid="a", date="2000-02-01", crop_type="Avocado", yield_values=2.0),
+        DatasetRow(uid=None, date="2000-03-01", crop_type="Mango", yield_values=3.0),
+    ]
+    rows_in_db = await DatasetManager().upsert_many(rows, "test", db)
+
+    new_uid = rows_in_db[1].uid
+    assert new_uid and new_uid != "a"
+    assert [row.uid for row in rows_in_db] == ["a", new_uid]
+    assert sorted(await stored_rows(db)) == sorted(
+        [("a", "2000-02-01", "Avocado", 2.0), (new_uid, "2000-03-01", "Mango", 3.0)]
+    )
+
+
+@pytest.mark.asyncio
+async def test_upsert_many_repeated_uid(setup_database) -> None:
+    """
+    Test whether the last occurrence of a uid repeated within a batch is the one stored.
+    """
+    db = setup_database
+    rows = [
+        DatasetRow(uid="a", date="2000-01-01", crop_type="Mango", yield_values=1.0),
+        DatasetRow(uid="a", date="2000-01-02", crop_type="Mango", yield_values=2.0),
+    ]
+
+    rows_in_db = await DatasetManager().upsert_many(rows, "test", db)
+
+    assert [row.yield_values for row in rows_in_db] == [2.0, 2.0]
+    assert await stored_rows(db) == [("a", "2000-01-02", "Mango", 2.0)]
+    res = await db.execute("SELECT yield_values, days FROM dataset_monthly")
+    assert await res.fetchall() == [(2.0, 1)]
+
+
+@pytest.mark.asyncio
+async def test_upsert_many_rollback(setup_database) -> None:
+    """
+    Test whether a batch failing partway through is rolled back as a whole.
+    """
+    db = setup_database
+    await DatasetManager().upsert_many(
+        [DatasetRow(uid="a", date="2000-01-01", crop_type="Mango", yield_values=1.0)], "test", db
+    )
+
+    rows = [
+        DatasetRow(uid="b", date="2000-01-02", crop_type="Mango", yield_values=2.0),
+        DatasetRow(uid="a", date="2000-01-01", crop_type="Mango", yield_values=3.0),
+        # Breaks the NOT NULL constraint of the crop type.
+        DatasetRow.construct(uid="c", date="2000-01-03", crop_type=None, yield_values=4.0),
+    ]
+
+    assert await DatasetManager().upsert_many(rows, "test", db) is None
+    assert await stored_rows(db) == [("a", "2000-01-01", "Mango", 1.0)]
+
+
+@pytest.mark.asyncio
+async def test_get_prefix(setup_database) -> None:
+    """
+    Test whether crop types are matched by prefix as with `LIKE`: ignoring case and with `%` and `_` as wildcards.
+    """
+    db = setup_database
+    rows = [
+        DatasetRow(uid="0", date="2000-01-01", crop_type="Mango", yield_values=1.0),
+        DatasetRow(uid="1", date="2000-01-01", crop_type="Mango Kent", yield_values=1.0),
+        DatasetRow(uid="2", date="2000-01-01", crop_type="Avocado", yield_values=1.0),
+    ]
+    await DatasetManager().upsert_many(rows, "test", db)
+
+    for prefix, uids in [("mango", ["0", "1"]), ("MANGO K", ["1"]), ("M_ngo", ["0", "1"]), ("%o", ["2", "0", "1"])]:
+        dataset = await DatasetManager().get(prefix, "test", db)
+        assert [row.uid for row in dataset.data] == uids
+        monthly = await DatasetManager().get_monthly(prefix, "test", db)
+        assert sorted(row.crop_type for row in monthly.data) == sorted(rows[int(uid)].crop_type for uid in uids)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("start_date,end_date", [(None, None), (date(2000, 1, 2), date(2000, 2, 1))])
+async def test_get_pages(setup_database, start_date, end_date) -> None:
+    """
+    Test whether paging through crop types sharing a prefix returns every row once, in (crop_type, date, uid) order.
+    """
+    db = setup_database
+    rows = [
+        DatasetRow(uid=f"{crop_type}-{day}-{i}", date=day, crop_type=crop_type, yield_values=1.0)
+        for crop_type in ["Mango", "Mango Tommy", "Avocado"]
+        for day in ["2000-01-01", "2000-01-02", "2000-02-01", "2000-03-01"]
+        for i in range(2)
+    ]
+    await DatasetManager().upsert_many(rows, "test", db)
+    first, last = start_date or date.min, end_date or date.max
+    expected = sorted(
+        (row.crop_type, row.date, row.uid) for row in rows if row.crop_type != "Avocado" and first <= row.date <= last
+    )
+
+    paged, cursor = [], [None, None, None]
+    while True:
+        page = await DatasetManager().get("Mango", "test", db, start_date, end_date, 3, *cursor)
+        if not page.data:
+            break
+        assert len(page.data) <= 3
+        paged += [(row.crop_type, row.date, row.uid) for row in page.data]
+        cursor = list(paged[-1])
+
+    assert paged == expected
+
+
+def test_get_cache_prefix(client) -> None:
+    """
+    Test whether crop type prefixes differing only in case share their cached table.
+    """
+    row = {"uid": "a", "date": "2000-01-01", "crop_type": "Pitahaya", "yield_values": 1.0}
+    assert client.post("/api/v1/data/upsert", json=row).status_code == 200
+    before = client.get("/api/v1/data/cache").json()
+
+    for prefix in ("Pitahaya", "pitahaya", "PITAHAYA"):
+        assert client.get("/api/v1/data/get", params={"crop_type": prefix}).status_code == 200
+
+    after = client.get("/api/v1/data/cache").json()
+    assert (after["entries"] - before["entries"], after["misses"] - before["misses"]) == (1, 1)
+    assert after["hits"] - before["hits"] == 2
+
+
+def test_get_incomplete_cursor(client) -> None:
+    """
+    Test whether a page is refused unless its cursor is complete.
+    """
+    res = client.get("/api/v1/data/get", params={"limit": 2, "after_crop_type": "Mango", "after_date": "2000-01-01"})
+    assert res.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_delete_many(setup_database) -> None:
+    """
+    Test whether a batch of rows is deleted at once, reporting only the rows actually removed.
+    """
+    db = setup_database
+    rows = [DatasetRow(uid=str(i), date="2000-01-01", crop_type="Mango", yield_values=1.0) for i in range(3)]
+    await DatasetManager().upsert_many(rows, "test", db)
+
+    missing = DatasetRow(uid="missing", date="2000-01-01", crop_type="Mango", yield_values=1.0)
+    deleted_rows = await DatasetManager().delete_many([rows[0], rows[2], rows[2], missing], "test", db)
+
+    assert sorted(row.uid for row in deleted_rows) == ["0", "2"]
+    res = await db.execute("SELECT uid FROM dataset")
+    assert await res.fetchall() == [("1",)]
+
+
+def test_apply(client) -> None:
+    """
+    Test whether changes are applied as a whole, keeping none of them if a row to delete is missing.
+    """
+    row = {"uid": "a", "date": "2000-01-01", "crop_type": "Mango", "yield_values": 1.0}
+    updated_row = dict(row, yield_values=2.0)
+    new_row = {"uid": "b", "date": "2000-01-02", "crop_type": "Mango", "yield_values": 3.0}
+    missing_row = dict(row, uid="missing")
+    res = client.post("/api/v1/data/upsert", json=row)
+    assert res.status_code == 200
+
+    res = client.post("/api/v1/data/apply", json=[[updated_row, new_row], [missing_row]])
+    assert res.status_code == 404
+    assert table_rows(client) == [("a", 1.0)]
+
+    res = client.post("/api/v1/data/apply", json=[[new_row], [updated_row]])
+    assert res.status_code == 200
+    assert table_rows(client) == [("b", 3.0)]
+
+
+STREAM_ROWS = [
+    DatasetRow(uid="0", date="2000-01-01", crop_type="Mango", yield_values=1.0),
+    DatasetRow(uid="1", date="2000-01-20", crop_type="Mango", yield_values=2.0),
+    DatasetRow(uid="2", date="2000-02-10", crop_type="Mango", yield_values=0.0),
+    DatasetRow(uid="3", date="2000-03-05", crop_type="Mango", yield_values=4.0),
+    DatasetRow(uid="4", date="2000-03-25", crop_type="Mango", yield_values=0.0),
+    DatasetRow(uid="5", date="2000-01-15", crop_type="Mango Tommy", yield_values=8.0),
+    DatasetRow(uid="6", date="2000-02-01", crop_type="Mango Tommy", yield_values=16.0),
+    DatasetRow(uid="7", date="2000-01-01", crop_type="Avocado", yield_values=32.0),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "crop_type,start_date,end_date",
+    [
+        ("", None, None),
+        ("Mango", None, None),
+        ("Mango", date(2000, 1, 10), date(2000, 3, 10)),
+        ("Mango Tommy", date(2000, 2, 1), None),
+    ],
+)
+async def test_stream_table(setup_database, crop_type, start_date, end_date) -> None:
+    """
+    Test whether the streamed months, ordered by crop type and date, are those of the data table,
+    also when crop types share a prefix, days have no yield or months are cut by the date range.
+    """
+    db = setup_database
+    await DatasetManager().upsert_many(STREAM_ROWS, "test", db)
+
+    daily_data = await DatasetManager().get(crop_type, "test", db, start_date, end_date)
+    monthly_data = await DatasetManager().get_monthly(crop_type, "test", db, start_date=start_date, end_date=end_date)
+    table = jsonable_encoder(DatasetManager().get_table(daily_data, monthly_data))["data"]
+
+    lines = DatasetManager().stream_table(crop_type, "test", db, start_date, end_date, chunk_size=2)
+    months = [json.loads(line) async for line in lines]
+
+    assert table
+    assert months == by_month(table)
+
+
+def test_get_stream(client) -> None:
+    """
+    Test whether the data table is streamed as NDJSON when asked either by parameter or by `Accept` header.
+    """
+    res = client.post("/api/v1/data/upsert", json=jsonable_encoder(STREAM_ROWS))
+    assert res.status_code == 200
+    table = client.get("/api/v1/data/get", params={"crop_type": "Mango"}).json()["data"]
+
+    for params, headers in [({"stream": True}, {}), ({}, {"Accept": "application/x-ndjson"})]:
+        res = client.get("/api/v1/data/get", params=dict(params, crop_type="Mango"), headers=headers)
+
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("application/x-ndjson")
+        assert res.headers["ETag"]
+        assert [json.loads(line) for line in res.text.splitlines()] == by_month(table)
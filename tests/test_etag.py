@@ -0,0 +1,117 @@
+from datetime import date
+from functools import partial
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tropicalia import manager
+from tropicalia.api.v1 import algorithm, dataset
+from tropicalia.auth import get_current_user
+from tropicalia.cache import ResultCache
+from tropicalia.database import close_db_connection, create_db_connection
+from tropicalia.etag import is_fresh, make_etag
+from tropicalia.formats import COLUMNAR_JSON
+from tropicalia.manager import AlgorithmManager
+from tropicalia.models.algorithm import Algorithm
+from tropicalia.models.user import UserInDB
+from tropicalia.singleflight import SingleFlight
+
+ROWS = [
+    {"uid": "a", "date": "2000-01-01", "crop_type": "Mango", "yield_values": 1.0},
+    {"uid": "b", "date": "2000-01-02", "crop_type": "Mango", "yield_values": 2.0},
+]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch) -> TestClient:
+    """
+    Fixture to set up a client of the data and algorithm APIs, authenticated and with its own database and cache.
+    Predictions are made up, so that no trained algorithm is needed.
+    """
+    cache = ResultCache(max_entries=8, max_bytes=1024 * 1024, ttl=60)
+    monkeypatch.setattr(dataset, "table_cache", cache)
+    monkeypatch.setattr(manager, "table_cache", cache)
+    monkeypatch.setattr(AlgorithmManager, "predict_flights", SingleFlight())
+
+    async def compute_prediction(self, algorithm, crop_type, is_monthly, current_user, db):
+        trained_alg = Algorithm(uid="a", algorithm=algorithm, crop_type=crop_type, last_date=date(2000, 1, 1))
+        frame = pd.DataFrame({"date": [date(2000, 1, 1)], "yield_values": [1.0]})
+        return trained_alg, frame, frame, frame
+
+    monkeypatch.setattr(AlgorithmManager, "compute_prediction", compute_prediction)
+
+    app = FastAPI()
+    app.include_router(dataset.router, prefix="/api/v1/data")
+    app.include_router(algorithm.router, prefix="/api/v1/algorithm")
+    app.add_event_handler("startup", partial(create_db_connection, path=str(tmp_path / "db.sqlite3")))
+    app.add_event_handler("shutdown", close_db_connection)
+    app.dependency_overrides[get_current_user] = lambda: UserInDB(username="test", email="test@test", password="")
+
+    with TestClient(app) as client:
+        assert client.post("/api/v1/data/upsert", json=ROWS).status_code == 200
+        yield client
+
+
+def test_make_etag() -> None:
+    """
+    Test whether ETags change with the revision and the request parameters.
+    """
+    etag = make_etag("Mango:1", "Mango", None)
+
+    assert etag == make_etag("Mango:1", "Mango", None)
+    assert etag != make_etag("Mango:2", "Mango", None)
+    assert etag != make_etag("Mango:1", "Mango", 10)
+    assert etag.startswith('"') and etag.endswith('"')
+
+
+def test_is_fresh() -> None:
+    """
+    Test whether If-None-Match headers are compared weakly against the ETag.
+    """
+    etag = make_etag("Mango:1")
+
+    assert not is_fresh(None, etag)
+    assert not is_fresh('"other"', etag)
+    assert is_fresh(etag, etag)
+    assert is_fresh(f'"other", W/{etag}', etag)
+    assert is_fresh("*", etag)
+
+
+@pytest.mark.parametrize(
+    "url,params",
+    [
+        ("/api/v1/data/get", {"crop_type": "Mango"}),
+        ("/api/v1/algorithm/predict", {"algorithm": "SARIMA", "crop_type": "Mango"}),
+    ],
+)
+def test_not_modified(client, url, params) -> None:
+    """
+    Test whether `304 Not Modified` is answered to a matching If-None-Match, unless the crop type has changed
+    since or another media type is asked for.
+    """
+    res = client.get(url, params=params)
+    etag = res.headers["ETag"]
+    assert res.status_code == 200
+
+    res = client.get(url, params=params, headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["ETag"] == etag
+
+    res = client.get(url, params=params, headers={"If-None-Match": etag, "Accept": COLUMNAR_JSON})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+
+    for method, path, row in [
+        ("POST", "/api/v1/data/upsert", dict(ROWS[0], yield_values=4.0)),
+        ("DELETE", "/api/v1/data/delete", ROWS[1]),
+    ]:
+        assert client.request(method, path, json=row).status_code == 200
+
+        res = client.get(url, params=params, headers={"If-None-Match": etag})
+        assert res.status_code == 200
+        assert res.headers["ETag"] != etag
+
+        etag = res.headers["ETag"]
+        assert client.get(url, params=params, headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,172 @@
+import io
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from tropicalia.formats import (
+    ARROW_STREAM,
+    COLUMNAR_JSON,
+    DATASET_COLUMNS,
+    csv_stream,
+    negotiate,
+    parquet_stream,
+    prediction_arrow,
+    prediction_columns,
+    prediction_rows,
+    table_arrow,
+    table_columns,
+)
+from tropicalia.models.algorithm import Algorithm
+
+pa = pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def table_frames() -> tuple:
+    """
+    Fixture to set up the daily rows and monthly sums frames of a data table
+    """
+    df_daily = pd.DataFrame(
+        [
+            ("0", "2000-01-01", "Avocado", 1.0),
+            ("1", "2000-01-02", "Avocado", 2.0),
+            ("2", "2000-01-01", "Mango", 4.0),
+            ("3", "2000-02-01", "Mango", 8.0),
+        ],
+        columns=["uid", "date", "crop_type", "yield_values"],
+    )
+    df_monthly = pd.DataFrame(
+        [
+            (pd.Timestamp("2000-01-01"), "Avocado", 3.0),
+            (pd.Timestamp("2000-01-01"), "Mango", 4.0),
+            (pd.Timestamp("2000-02-01"), "Mango", 8.0),
+            (pd.Timestamp("2000-03-01"), "Mango", 16.0),
+        ],
+        columns=["date", "crop_type", "yield_values"],
+    )
+    return df_daily, df_monthly
+
+
+@pytest.fixture
+def prediction() -> tuple:
+    """
+    Fixture to set up the frames of a prediction
+    """
+    ly_data = pd.DataFrame({"date": ["2000-01-01"], "yield_values": [1.0]})
+    pred = pd.DataFrame({"index": pd.to_datetime(["2001-01-01", "2001-02-01"]), "predicted_mean": [2.0, 3.0]})
+    algorithm = Algorithm(uid="0", algorithm="SARIMA", crop_type="Mango", last_date=date(2000, 1, 1))
+    return ly_data, pred, pred, algorithm
+
+
+def test_negotiate() -> None:
+    """
+    Test whether the columnar media types are picked from the Accept header.
+    """
+    assert negotiate(None) is None
+    assert negotiate("application/json") is None
+    assert negotiate(f"{COLUMNAR_JSON}, application/json;q=0.5") == COLUMNAR_JSON
+    assert negotiate(ARROW_STREAM) == ARROW_STREAM
+
+
+def test_table_columns(table_frames) -> None:
+    """
+    Test whether the data table is laid out by columns, ordered by date and without months lacking days.
+    """
+    columns = table_columns(*table_frames)
+
+    assert columns["date"] == ["2000-01-01", "2000-01-01", "2000-02-01"]
+    assert columns["crop_type"] == ["Avocado", "Mango", "Mango"]
+    assert columns["yield_values"] == [3.0, 4.0, 8.0]
+    assert columns["children"][0] == {
+        "uid": ["0", "1"],
+        "date": ["2000-01-01", "2000-01-02"],
+        "yield_values": [1.0, 2.0],
+    }
+    assert [child["uid"] for child in columns["children"]] == [["0", "1"], ["2"], ["3"]]
+
+
+def test_table_arrow(table_frames) -> None:
+    """
+    Test whether the data table Arrow stream holds the same table as the columnar JSON.
+    """
+    table = pa.ipc.open_stream(table_arrow(*table_frames)).read_all()
+
+    assert table.column_names == ["date", "crop_type", "yield_values", "children"]
+    assert table.column("date").to_pylist() == [date(2000, 1, 1), date(2000, 1, 1), date(2000, 2, 1)]
+    assert [[day["uid"] for day in days] for days in table.column("children").to_pylist()] == [["0", "1"], ["2"], ["3"]]
+
+
+def test_empty_table(table_frames) -> None:
+    """
+    Test whether an empty data table is laid out with empty columns.
+    """
+    df_daily, df_monthly = table_frames
+
+    assert table_columns(df_daily.iloc[0:0], df_monthly)["date"] == []
+    assert pa.ipc.open_stream(table_arrow(df_daily.iloc[0:0], df_monthly.iloc[0:0])).read_all().num_rows == 0
+
+
+def test_prediction_columns(prediction) -> None:
+    """
+    Test whether each series of a prediction is laid out by columns.
+    """
+    columns = prediction_columns(*prediction)
+
+    assert columns["last_date"] == "2000-01-01"
+    assert columns["last_year_data"] == {"date": ["2000-01-01"], "yield_values": [1.0]}
+    assert columns["forecast"] == {"date": ["2001-01-01", "2001-02-01"], "yield_values": [2.0, 3.0]}
+
+
+def test_prediction_arrow(prediction) -> None:
+    """
+    Test whether the prediction Arrow stream holds every series and the algorithm info.
+    """
+    table = pa.ipc.open_stream(prediction_arrow(*prediction)).read_all()
+
+    assert table.column("series").to_pylist() == ["last_year_data"] + ["prediction"] * 2 + ["forecast"] * 2
+    assert table.schema.metadata[b"algorithm"] == b"SARIMA"
+
+
+async def chunks(*chunks):
+    for rows in chunks:
+        yield rows
+
+
+async def read_stream(stream) -> bytes:
+    return b"".join([part async for part in stream])
+
+
+@pytest.mark.asyncio
+async def test_csv_stream() -> None:
+    """
+    Test whether chunks of rows are streamed as a single CSV file.
+    """
+    content = await read_stream(
+        csv_stream(DATASET_COLUMNS, chunks([("0", "2000-01-01", "Mango", 1.0)], [("1", "2000-01-02", "Mango", 2.0)]))
+    )
+
+    assert content.decode().splitlines() == [
+        "uid,date,crop_type,yield_values",
+        "0,2000-01-01,Mango,1.0",
+        "1,2000-01-02,Mango,2.0",
+    ]
+    assert await read_stream(csv_stream(DATASET_COLUMNS, chunks())) == b"uid,date,crop_type,yield_values\r\n"
+
+
+@pytest.mark.asyncio
+async def test_parquet_stream(prediction) -> None:
+    """
+    Test whether chunks of rows are streamed as a single Parquet file, with a row group per chunk.
+    """
+    parquet = pytest.importorskip("pyarrow.parquet")
+    rows = prediction_rows(*prediction[:3])
+
+    content = await read_stream(parquet_stream(["series", "date", "yield_values"], chunks(rows[:2], rows[2:])))
+    file = parquet.ParquetFile(io.BytesIO(content))
+
+    assert file.num_row_groups == 2
+    assert file.read(use_threads=False).to_pydict()["date"] == [row[1] for row in rows]
+
+    content = await read_stream(parquet_stream(DATASET_COLUMNS, chunks()))
+    assert parquet.ParquetFile(io.BytesIO(content)).read(use_threads=False).num_rows == 0
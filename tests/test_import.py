@@ -0,0 +1,77 @@
+import io
+
+import pandas as pd
+import pytest
+
+from tropicalia.database import Database, close_db_connection, create_db_connection
+from tropicalia.manager import DatasetManager
+
+
+@pytest.fixture
+async def setup_database() -> Database:
+    """
+    Fixture to set up the migrated database
+    """
+    db = await create_db_connection(path=":memory:")
+    yield db
+
+    # TEAR DOWN
+    await close_db_connection()
+
+
+def test_validate_chunk() -> None:
+    """
+    Test whether a chunk is turned into records, giving a uid to the rows lacking one.
+    """
+    df = pd.DataFrame(
+        {"uid": ["a", None], "date": ["2000-01-01", "2000-01-02"], "crop_type": ["Mango"] * 2, "yield_values": [1, 2]}
+    )
+    records = DatasetManager().validate_chunk(df)
+
+    assert records[0] == ("a", "2000-01-01", "Mango", 1.0)
+    assert records[1][0] and records[1][1:] == ("2000-01-02", "Mango", 2.0)
+
+
+def test_validate_invalid_chunk() -> None:
+    """
+    Test whether invalid rows and missing columns are reported.
+    """
+    df = pd.DataFrame({"date": ["2000-01-01", "date", "2000-01-03"], "crop_type": ["Mango", "Mango", None]})
+
+    with pytest.raises(ValueError, match="Missing columns: yield_values"):
+        DatasetManager().validate_chunk(df)
+
+    df["yield_values"] = [1.0, 2.0, 3.0]
+    with pytest.raises(ValueError, match="Invalid rows: 12, 13"):
+        DatasetManager().validate_chunk(df, offset=10)
+
+
+@pytest.mark.asyncio
+async def test_import_file(setup_database) -> None:
+    """
+    Test whether a file is imported in chunks, updating existing rows.
+    """
+    db = setup_database
+    content = "uid,date,crop_type,yield_values\n" + "".join(f"{i},2000-01-0{i % 9 + 1},Mango,1.0\n" for i in range(9))
+    content += "0,2000-01-01,Mango,2.0\n"
+
+    report = await DatasetManager().import_file(io.StringIO(content), "csv", "test", db, chunk_size=4)
+
+    assert report.rows == 10
+    res = await db.execute("SELECT yield_values FROM dataset_monthly")
+    assert await res.fetchall() == [(10.0,)]
+
+
+@pytest.mark.asyncio
+async def test_import_invalid_file(setup_database) -> None:
+    """
+    Test whether a file with invalid rows is not imported at all.
+    """
+    db = setup_database
+    content = "date,crop_type,yield_values\n2000-01-01,Mango,1.0\n2000-01-02,Mango,1.0\n2000-01-03,Mango,\n"
+
+    with pytest.raises(ValueError, match="Invalid rows: 3"):
+        await DatasetManager().import_file(io.StringIO(content), "csv", "test", db, chunk_size=2)
+
+    res = await db.execute("SELECT COUNT(*) FROM dataset")
+    assert await res.fetchall() == [(0,)]
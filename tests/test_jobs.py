@@ -0,0 +1,344 @@
+import asyncio
+import pickle
+import time
+from datetime import date
+
+import numpy as np
+import pytest
+
+from tropicalia import database
+from tropicalia.algorithm import ALGORITHMS, MLAlgorithm
+from tropicalia.database import Database, close_db_connection, create_db_connection
+from tropicalia.jobs import JobStatus, ProcessMap, stop_workers, workers
+from tropicalia.manager import AlgorithmManager, DatasetManager, JobManager
+from tropicalia.models.dataset import DatasetRow
+from tropicalia.singleflight import SingleFlight
+
+
+class MeanAlgorithm(MLAlgorithm):
+    """
+    Stand-in algorithm whose fitted model is the mean of the data.
+    """
+
+    def train(self, df):
+        return df["yield_values"].mean()
+
+
+async def insert_rows(db: Database) -> None:
+    rows = [
+        DatasetRow(uid=None, date=date(2000, 1, 5), crop_type="Mango", yield_values=1),
+        DatasetRow(uid=None, date=date(2000, 1, 20), crop_type="Mango Kent", yield_values=2),
+        DatasetRow(uid=None, date=date(2000, 4, 1), crop_type="Mango", yield_values=3),
+        DatasetRow(uid=None, date=date(2000, 2, 1), crop_type="Avocado", yield_values=4),
+        DatasetRow(uid=None, date=date(2000, 6, 1), crop_type="Avocado", yield_values=5),
+    ]
+    await DatasetManager().upsert_many(rows, "test", db)
+
+
+@pytest.fixture
+async def setup_database() -> Database:
+    """
+    Fixture to set up the migrated database
+    """
+    db = await create_db_connection(path=":memory:")
+    yield db
+
+    # TEAR DOWN
+    await stop_workers()
+    await close_db_connection()
+
+
+@pytest.mark.asyncio
+async def test_submit_job(setup_database) -> None:
+    """
+    Test whether a job is returned as pending right away and its outcome is stored once it has run.
+    """
+    db = setup_database
+
+    job = await JobManager().submit("SARIMA", "Mango", "test", db)
+    assert job.status == JobStatus.PENDING.value
+
+    await asyncio.gather(*workers.tasks)
+
+    job = await JobManager().get(job.uid, db)
+    assert job.status == JobStatus.FAILED.value
+    assert job.detail == "There is no data for crop type Mango"
+    assert job.finished is not None
+
+
+@pytest.mark.asyncio
+async def test_resume_jobs(setup_database) -> None:
+    """
+    Test whether the jobs left unfinished are run again, in submission order.
+    """
+    db = setup_database
+    query = "INSERT INTO job (uid, algorithm, crop_type, username, status, submitted) VALUES (?, ?, ?, ?, ?, ?)"
+    await db.execute(query, ["a", "SARIMA", "Mango", "test", "running", "2000-01-02T00:00:00"])
+    await db.execute(query, ["b", "SARIMA", "Mango", "test", "pending", "2000-01-01T00:00:00"])
+    await db.execute(query, ["c", "SARIMA", "Mango", "test", "done", "2000-01-01T00:00:00"])
+    await db.commit()
+
+    jobs = await JobManager().resume()
+    assert [job.uid for job in jobs] == ["b", "a"]
+
+    await asyncio.gather(*workers.tasks)
+
+    assert (await JobManager().get("a", db)).status == JobStatus.FAILED.value
+    assert (await JobManager().get("c", db)).status == JobStatus.DONE.value
+
+
+@pytest.mark.asyncio
+async def test_monthly_frames(setup_database) -> None:
+    """
+    Test whether the monthly data of several crop types read at once matches the one read for each crop type,
+    also for crop types matched ignoring case or with wildcards.
+    """
+    db = setup_database
+    await insert_rows(db)
+
+    crop_types = ["Mango", "Mango Kent", "Avocado", "Papaya", "mango kent", "_vocado"]
+    frames = await DatasetManager().get_monthly_frames(crop_types, "test", db)
+    assert list(frames) == ["Mango", "Mango Kent", "Avocado", "mango kent", "_vocado"]
+
+    for crop_type, df_month in frames.items():
+        df, last_date = AlgorithmManager().model_frame(df_month)
+        expected_df, expected_last_date = await AlgorithmManager().train_frame(crop_type, "test", db)
+        assert last_date == expected_last_date
+        assert df.index.equals(expected_df.index)
+        assert np.allclose(df["yield_values"], expected_df["yield_values"])
+
+    assert frames["Mango"]["yield_values"].tolist() == [3, 0, 0, 3]
+
+
+@pytest.mark.asyncio
+async def test_monthly_matrix(setup_database) -> None:
+    """
+    Test whether the monthly data of several crop types laid out as an array matches the one read for each of them.
+    """
+    db = setup_database
+    await insert_rows(db)
+    crop_types = ["Mango", "Mango Kent", "Avocado", "Papaya", "mango kent", "_vocado"]
+
+    frames = await DatasetManager().get_monthly_frames(crop_types, "test", db)
+    crops, months, values = await DatasetManager().get_monthly_matrix(crop_types, "test", db)
+    assert crops == list(frames) and values.shape == (5, 6)
+
+    for crop_type, row in zip(crops, values):
+        df_month = frames[crop_type]
+        within = months.isin(df_month["date"])
+        assert np.array_equal(row[within], df_month["yield_values"]) and np.isnan(row[~within]).all()
+
+
+@pytest.mark.asyncio
+async def test_predict_batch(setup_database) -> None:
+    """
+    Test whether the predictions of many crop types made at once match the ones made for each of them,
+    leaving out the crop types without enough data.
+    """
+    db = setup_database
+    rng = np.random.default_rng(0)
+    ranges = {"Mango": (0, 40), "Mango Kent": (6, 40), "Avocado": (0, 30), "Papaya": (20, 30)}
+    rows = [
+        DatasetRow(uid=None, date=date(2000 + i // 12, i % 12 + 1, 1), crop_type=crop_type, yield_values=value)
+        for crop_type, (start, end) in ranges.items()
+        for i, value in zip(range(start, end), rng.normal(100, 10, end - start))
+    ]
+    await DatasetManager().upsert_many(rows, "test", db)
+    frames = await DatasetManager().get_monthly_frames(list(ranges), "test", db)
+
+    for algorithm in ["SeasonalNaive", "SeasonalMean"]:
+        for is_monthly in [False, True]:
+            predictions = await AlgorithmManager().predict_batch(algorithm, [], is_monthly, "test", db)
+            assert sorted(prediction.crop_type for prediction in predictions) == ["Avocado", "Mango", "Mango Kent"]
+
+            for prediction in predictions:
+                df, last_date = AlgorithmManager().model_frame(frames[prediction.crop_type])
+                alg = ALGORITHMS[algorithm]()
+                fit_model = alg.train(df)
+                last_year_data, forecast = alg.forecast(df.reset_index(), is_monthly, fit_model)
+                pred = forecast if is_monthly else alg.predict(df.reset_index(), fit_model)
+
+                assert prediction.uid is None and prediction.last_date == last_date
+                for dataset, expected in [
+                    (prediction.last_year_data, last_year_data),
+                    (prediction.prediction, pred),
+                    (prediction.forecast, forecast),
+                ]:
+                    assert [row.date for row in dataset.data] == expected["date"].dt.date.tolist()
+                    assert np.allclose([row.yield_values for row in dataset.data], expected["yield_values"])
+
+
+@pytest.mark.asyncio
+async def test_train_batch(setup_database, monkeypatch) -> None:
+    """
+    Test whether every algorithm is trained for every crop type in one pass, reporting the pairs without data.
+    """
+    db = setup_database
+    await insert_rows(db)
+    uploads = {}
+    monkeypatch.setitem(ALGORITHMS, "Mean", MeanAlgorithm)
+    monkeypatch.setattr(
+        AlgorithmManager.minio, "put_file", lambda folder_name, file_name, data: uploads.update({file_name: data})
+    )
+
+    summary = await AlgorithmManager().train_batch(["Mean"], [], "test")
+    assert [(pair.crop_type, pair.status) for pair in summary.pairs] == [
+        ("Avocado", JobStatus.DONE.value),
+        ("Mango", JobStatus.DONE.value),
+        ("Mango Kent", JobStatus.DONE.value),
+    ]
+    assert pickle.loads(uploads[summary.pairs[1].algorithm_uid]) == 1.5
+    trained_alg = await AlgorithmManager().check("Mean", "Mango", "test", db)
+    assert trained_alg.uid == summary.pairs[1].algorithm_uid and trained_alg.last_date == date(2000, 4, 1)
+
+    summary = await AlgorithmManager().train_batch(["Mean"], ["Papaya"], "test")
+    assert summary.pairs[0].status == JobStatus.FAILED.value
+    assert summary.pairs[0].detail == "There is no data for crop type Papaya"
+
+
+@pytest.mark.asyncio
+async def test_train_shared(setup_database, monkeypatch) -> None:
+    """
+    Test whether concurrent identical trainings share a single one, which is stored once,
+    and whether it is uploaded without holding the writer.
+    """
+    db = setup_database
+    await insert_rows(db)
+    uploads = []
+    monkeypatch.setitem(ALGORITHMS, "Mean", MeanAlgorithm)
+    monkeypatch.setattr(AlgorithmManager, "train_flights", SingleFlight())
+
+    def put_file(folder_name, file_name, data):
+        assert not database.db.write_lock.locked()
+        uploads.append(file_name)
+        return AlgorithmManager.minio.get_url(folder_name, file_name)
+
+    monkeypatch.setattr(AlgorithmManager.minio, "put_file", put_file)
+
+    results = await asyncio.gather(*(AlgorithmManager().train_shared("Mean", "Mango", "test") for _ in range(3)))
+
+    assert len({trained_alg.uid for trained_alg, _ in results}) == 1
+    assert uploads == [results[0][0].uid]
+    assert AlgorithmManager().flight_stats().train.dict() == {"flights": 1, "coalesced": 2, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_train_quoted_crop_type(setup_database, monkeypatch) -> None:
+    """
+    Test whether the algorithm of a crop type with quotes is stored, replacing the one of the same last date.
+    """
+    db = setup_database
+    crop_type = "Mango's'); DROP TABLE algorithm; --"
+    await DatasetManager().upsert_many(
+        [DatasetRow(uid=None, date=date(2000, 1, 1), crop_type=crop_type, yield_values=1)], "test", db
+    )
+    monkeypatch.setitem(ALGORITHMS, "Mean", MeanAlgorithm)
+    monkeypatch.setattr(AlgorithmManager, "train_flights", SingleFlight())
+    monkeypatch.setattr(
+        AlgorithmManager.minio,
+        "put_file",
+        lambda folder_name, file_name, data: AlgorithmManager.minio.get_url(folder_name, file_name),
+    )
+
+    for _ in range(2):
+        trained_alg, _ = await AlgorithmManager().train_shared("Mean", crop_type, "test")
+
+    res = await db.execute("SELECT uid, crop_type FROM algorithm")
+    assert await res.fetchall() == [(trained_alg.uid, crop_type)]
+
+
+@pytest.mark.asyncio
+async def test_train_shared_revision(setup_database, monkeypatch) -> None:
+    """
+    Test whether a training requested after the data has changed does not join the one of the old data.
+    """
+    db = setup_database
+    await insert_rows(db)
+    release = asyncio.Event()
+    fit = AlgorithmManager.fit
+    monkeypatch.setitem(ALGORITHMS, "Mean", MeanAlgorithm)
+    monkeypatch.setattr(AlgorithmManager, "train_flights", SingleFlight())
+    monkeypatch.setattr(
+        AlgorithmManager.minio,
+        "put_file",
+        lambda folder_name, file_name, data: AlgorithmManager.minio.get_url(folder_name, file_name),
+    )
+
+    async def gated_fit(self, algorithm, df):
+        await release.wait()
+        return await fit(self, algorithm, df)
+
+    monkeypatch.setattr(AlgorithmManager, "fit", gated_fit)
+
+    first = asyncio.ensure_future(AlgorithmManager().train_shared("Mean", "Mango", "test"))
+    second = asyncio.ensure_future(AlgorithmManager().train_shared("Mean", "Mango", "test"))
+    await asyncio.sleep(0.1)
+    await DatasetManager().upsert_many(
+        [DatasetRow(uid=None, date=date(2000, 5, 1), crop_type="Mango", yield_values=1)], "test", db
+    )
+    third = asyncio.ensure_future(AlgorithmManager().train_shared("Mean", "Mango", "test"))
+    await asyncio.sleep(0.1)
+    release.set()
+
+    (first_alg, _), (second_alg, _), (third_alg, _) = await asyncio.gather(first, second, third)
+
+    assert first_alg.uid == second_alg.uid != third_alg.uid
+    assert (first_alg.last_date, third_alg.last_date) == (date(2000, 4, 1), date(2000, 5, 1))
+    assert AlgorithmManager().flight_stats().train.dict() == {"flights": 2, "coalesced": 1, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_predict_shared(setup_database, monkeypatch) -> None:
+    """
+    Test whether concurrent identical predictions share a single computation, unless the data has changed
+    in between, in which case a new computation is started instead of joining the one of the old data.
+    """
+    db = setup_database
+    await insert_rows(db)
+    computed = []
+    release = asyncio.Event()
+    monkeypatch.setattr(AlgorithmManager, "predict_flights", SingleFlight())
+
+    async def compute_prediction(self, algorithm, crop_type, is_monthly, current_user, db):
+        revision = await DatasetManager().get_revision(crop_type, db)
+        computed.append(revision)
+        await release.wait()
+        return revision
+
+    monkeypatch.setattr(AlgorithmManager, "compute_prediction", compute_prediction)
+
+    first = asyncio.ensure_future(AlgorithmManager().predict_frames("Mean", "Mango", False, "test", db))
+    second = asyncio.ensure_future(AlgorithmManager().predict_frames("Mean", "Mango", False, "test", db))
+    await asyncio.sleep(0.1)
+    await DatasetManager().upsert_many(
+        [DatasetRow(uid=None, date=date(2000, 5, 1), crop_type="Mango", yield_values=1)], "test", db
+    )
+    third = asyncio.ensure_future(AlgorithmManager().predict_frames("Mean", "Mango", False, "test", db))
+    await asyncio.sleep(0.1)
+    release.set()
+
+    results = await asyncio.gather(first, second, third)
+
+    assert results[0] == results[1] != results[2] == await DatasetManager().get_revision("Mango", db)
+    assert computed == [results[0], results[2]]
+    assert AlgorithmManager().flight_stats().predict.dict() == {"flights": 2, "coalesced": 1, "in_flight": 0}
+
+
+def test_process_map() -> None:
+    """
+    Test whether items are mapped in order, reporting errors and killing the calls that time out,
+    and whether the pool keeps working afterwards.
+    """
+    start = time.monotonic()
+    with ProcessMap(time.sleep, processes=2, timeout=2) as pool:
+        results = pool.map([0, 0.1, -1, 60, 0])
+        assert [error for _, error in results] == [
+            None,
+            None,
+            "ValueError: sleep length must be non-negative",
+            "Timeout",
+            None,
+        ]
+        assert pool.map([0, 0, 0]) == [(None, None)] * 3
+
+    assert time.monotonic() - start < 30
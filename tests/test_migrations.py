@@ -0,0 +1,251 @@
+import pytest
+
+from tropicalia.database import (
+    Database,
+    PrefixIndex,
+    close_db_connection,
+    create_db_connection,
+    has_prefix,
+    prefix_range,
+)
+from tropicalia.migrations import MIGRATIONS, get_version, migrate
+
+
+@pytest.fixture
+async def setup_database() -> Database:
+    """
+    Fixture to set up the migrated database
+    """
+    db = await create_db_connection(path=":memory:")
+    yield db
+
+    # TEAR DOWN
+    await close_db_connection()
+
+
+async def query_plan(db: Database, query: str, params: list) -> str:
+    res = await db.execute(f"EXPLAIN QUERY PLAN {query}", params)
+    plan = await res.fetchall()
+    return " ".join(row[-1] for row in plan)
+
+
+@pytest.mark.asyncio
+async def test_migrations(setup_database) -> None:
+    """
+    Test whether every migration is applied once and the schema version is stored.
+    """
+    db = setup_database
+
+    assert await get_version(db) == len(MIGRATIONS)
+    assert await migrate(db) == len(MIGRATIONS)
+
+    res = await db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = [row[0] for row in await res.fetchall()]
+
+    assert {"dataset", "algorithm", "users", "job", "retrain_queue", "metric"} <= set(tables)
+
+
+def test_prefix_range() -> None:
+    """
+    Test whether the prefix range predicate matches the same values as the prefix.
+    """
+    assert prefix_range("crop_type", "") == ("1 = 1", [])
+    assert prefix_range("crop_type", "Mango") == ("crop_type LIKE ?", ["Mango%"])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("prefix", ["", "Mango", "mango", "MANGO K", "M_ngo", "Man%t", "Ñ", "ñ", "Mango.", "["])
+async def test_prefix_matches(setup_database, prefix) -> None:
+    """
+    Test whether prefixes are matched in Python as in SQL: ignoring the case of ASCII letters only,
+    and with `%` and `_` as wildcards.
+    """
+    db = setup_database
+    values = ["Mango", "mango", "Mango Kent", "MANGO KEITT", "Mingo", "Mandarin", "Avocado", "Ñame", "ñame", "Mango.1"]
+    await db.executemany("INSERT INTO crop_revision (crop_type, revision) VALUES (?, 1)", [(v,) for v in values])
+
+    predicate, params = prefix_range("crop_type", prefix)
+    res = await db.execute(f"SELECT crop_type FROM crop_revision WHERE {predicate}", params)
+    expected = {row[0] for row in await res.fetchall()}
+
+    assert {value for value in values if has_prefix(value, prefix)} == expected
+    assert [values[i] for i in PrefixIndex(values).find(prefix)] == [value for value in values if value in expected]
+
+
+@pytest.mark.asyncio
+async def test_dataset_query_uses_index(setup_database) -> None:
+    """
+    Test whether the dataset crop type prefix and date range filters are answered with index seeks.
+    """
+    db = setup_database
+    predicate, params = prefix_range("crop_type", "Mango")
+    query = f"""
+        SELECT uid, date, crop_type, yield_values FROM dataset
+        WHERE crop_type IN (SELECT crop_type FROM dataset_monthly WHERE {predicate}) AND date >= ?
+        ORDER BY crop_type, date, uid LIMIT ?
+    """
+    plan = await query_plan(db, query, params + ["2000-01-01", -1])
+
+    assert "USING COVERING INDEX ix_dataset_crop_type_date (crop_type=? AND date>?)" in plan
+    assert "USING COVERING INDEX ix_dataset_monthly_crop_type_nocase (crop_type>? AND crop_type<?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.asyncio
+async def test_dataset_page_query_uses_index(setup_database) -> None:
+    """
+    Test whether a page of the dataset resumes from its cursor with an index seek.
+    """
+    db = setup_database
+    predicate, params = prefix_range("crop_type", "Mango")
+    query = f"""
+        SELECT uid, date, crop_type, yield_values FROM dataset
+        WHERE crop_type = ? AND (date, uid) > (?, ?) AND {predicate}
+        UNION ALL
+        SELECT uid, date, crop_type, yield_values FROM dataset
+        WHERE crop_type IN (SELECT crop_type FROM dataset_monthly WHERE {predicate} AND crop_type > ?)
+        ORDER BY crop_type, date, uid LIMIT ?
+    """
+    plan = await query_plan(db, query, ["Mango", "2000-01-01", "0"] + params + params + ["Mango", 10])
+
+    assert "USING COVERING INDEX ix_dataset_crop_type_date (crop_type=? AND (date,uid)>(?,?))" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.asyncio
+async def test_revision_query_uses_index(setup_database) -> None:
+    """
+    Test whether the revisions of a crop type prefix are read with an index range scan.
+    """
+    db = setup_database
+    predicate, params = prefix_range("crop_type", "Mango")
+    query = f"SELECT crop_type, revision FROM crop_revision WHERE {predicate} ORDER BY crop_type"
+    plan = await query_plan(db, query, params)
+
+    assert "USING COVERING INDEX ix_crop_revision_crop_type_nocase (crop_type>? AND crop_type<?)" in plan
+
+
+@pytest.mark.asyncio
+async def test_algorithm_query_uses_index(setup_database) -> None:
+    """
+    Test whether the latest trained algorithm lookup is answered with an index search.
+    """
+    db = setup_database
+    query = """
+        SELECT uid, algorithm, crop_type, last_date
+        FROM algorithm
+        WHERE algorithm = ? AND crop_type = ?
+        ORDER BY last_date DESC
+        LIMIT 1
+    """
+    plan = await query_plan(db, query, ["SARIMA", "Mango"])
+
+    assert "USING COVERING INDEX ix_algorithm_pair_last_date" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.asyncio
+async def test_users_query_uses_index(setup_database) -> None:
+    """
+    Test whether users are looked up by username and email with their unique indexes.
+    """
+    db = setup_database
+
+    plan = await query_plan(db, "SELECT * FROM users WHERE username = ?", ["username"])
+    assert "USING INDEX ux_users_username" in plan
+
+    plan = await query_plan(db, "SELECT * FROM users WHERE email = ?", ["email"])
+    assert "USING INDEX ux_users_email" in plan
+
+
+@pytest.mark.asyncio
+async def test_monthly_aggregate(setup_database) -> None:
+    """
+    Test whether the monthly aggregate follows inserts, updates and deletes of the dataset.
+    """
+    db = setup_database
+    upsert = """
+        INSERT INTO dataset (uid, date, crop_type, yield_values) VALUES (?, ?, ?, ?)
+        ON CONFLICT(uid) DO UPDATE SET date = excluded.date, crop_type = excluded.crop_type,
+        yield_values = excluded.yield_values
+    """
+    await db.executemany(
+        upsert,
+        [
+            ("0", "2000-01-01", "Mango", 1.0),
+            ("1", "2000-01-15", "Mango", 2.0),
+            ("2", "2000-02-01", "Mango", 4.0),
+            ("3", "2000-01-01", "Avocado", 8.0),
+        ],
+    )
+    await db.executemany(upsert, [("1", "2000-02-15", "Mango", 16.0)])
+    await db.execute("DELETE FROM dataset WHERE uid = '3'")
+    await db.commit()
+
+    res = await db.execute("SELECT crop_type, month, yield_values, days FROM dataset_monthly ORDER BY crop_type, month")
+    monthly = await res.fetchall()
+
+    assert monthly == [("Mango", "2000-01-01", 1.0, 1), ("Mango", "2000-02-01", 20.0, 2)]
+
+
+@pytest.mark.asyncio
+async def test_monthly_aggregate_drift(setup_database) -> None:
+    """
+    Test whether the monthly sums are exact after their days are inserted and deleted again, so that a month
+    left with days without yield is not mistaken for a month with yield.
+    """
+    db = setup_database
+    query = "INSERT INTO dataset (uid, date, crop_type, yield_values) VALUES (?, ?, ?, ?)"
+    await db.executemany(
+        query, [("0", "2000-01-01", "Mango", 0.0), ("1", "2000-01-02", "Mango", 0.1), ("2", "2000-01-03", "Mango", 0.2)]
+    )
+    await db.execute("DELETE FROM dataset WHERE uid IN ('1', '2')")
+    await db.commit()
+
+    res = await db.execute("SELECT crop_type, month, yield_values, days FROM dataset_monthly")
+    assert await res.fetchall() == [("Mango", "2000-01-01", 0.0, 1)]
+
+
+@pytest.mark.asyncio
+async def test_monthly_aggregate_uses_index(setup_database) -> None:
+    """
+    Test whether the days of a month are summed by the monthly aggregate triggers with an index range scan.
+    """
+    db = setup_database
+    query = """
+        SELECT crop_type, strftime('%Y-%m-01', ?), SUM(yield_values), COUNT(*)
+        FROM dataset
+        WHERE crop_type = ? AND date >= strftime('%Y-%m-01', ?) AND date < date(?, 'start of month', '+1 month')
+        GROUP BY crop_type
+    """
+    plan = await query_plan(db, query, ["2000-01-15", "Mango", "2000-01-15", "2000-01-15"])
+
+    assert "USING COVERING INDEX ix_dataset_crop_type_date (crop_type=? AND date>? AND date<?)" in plan
+
+
+@pytest.mark.asyncio
+async def test_crop_revision(setup_database) -> None:
+    """
+    Test whether crop type revisions are bumped by changes to their days and algorithms, but not by no-op updates.
+    """
+    db = setup_database
+    upsert = """
+        INSERT INTO dataset (uid, date, crop_type, yield_values) VALUES (?, ?, ?, ?)
+        ON CONFLICT(uid) DO UPDATE SET date = excluded.date, crop_type = excluded.crop_type,
+        yield_values = excluded.yield_values
+    """
+
+    async def revisions() -> dict:
+        res = await db.execute("SELECT crop_type, revision FROM crop_revision")
+        return dict(await res.fetchall())
+
+    await db.executemany(upsert, [("0", "2000-01-01", "Mango", 1.0), ("1", "2000-01-01", "Avocado", 1.0)])
+    assert await revisions() == {"Mango": 1, "Avocado": 1}
+
+    await db.executemany(upsert, [("0", "2000-01-01", "Mango", 1.0)])
+    assert await revisions() == {"Mango": 1, "Avocado": 1}
+
+    await db.executemany(upsert, [("0", "2000-01-01", "Avocado", 1.0)])
+    await db.execute("DELETE FROM dataset WHERE uid = '1'")
+    await db.execute("INSERT INTO algorithm VALUES ('0', 'SARIMA', 'Mango', '2000-01-01')")
+    assert await revisions() == {"Mango": 3, "Avocado": 3}
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from tropicalia.config import settings
+from tropicalia.database import Database, close_db_connection, create_db_connection
+from tropicalia.manager import DatasetManager, JobManager, RetrainManager
+from tropicalia.models.dataset import DatasetRow
+from tropicalia.scheduler import Scheduler
+
+
+@pytest.fixture
+async def setup_database() -> Database:
+    """
+    Fixture to set up the migrated database
+    """
+    db = await create_db_connection(path=":memory:")
+    yield db
+
+    # TEAR DOWN
+    await close_db_connection()
+
+
+@pytest.mark.asyncio
+async def test_scheduler() -> None:
+    """
+    Test whether the task is run on start, when it is due and when it is notified.
+    """
+    calls = []
+
+    async def task() -> float:
+        calls.append(len(calls))
+        return 0.05 if len(calls) == 1 else 60
+
+    scheduler = Scheduler()
+    scheduler.start(task, poll=60)
+    await asyncio.sleep(0.1)
+    assert calls == [0, 1]
+
+    scheduler.notify()
+    await asyncio.sleep(0.01)
+    assert calls == [0, 1, 2]
+
+    await scheduler.stop()
+    scheduler.notify()
+    assert calls == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_retrain_due(setup_database, monkeypatch) -> None:
+    """
+    Test whether the trained algorithms of the crop types whose data has changed are retrained once it settles,
+    and only once.
+    """
+    db = setup_database
+    scheduled = []
+
+    async def schedule(self, jobs: list) -> None:
+        scheduled.extend(jobs)
+
+    monkeypatch.setattr(JobManager, "schedule", schedule)
+
+    query = "INSERT INTO algorithm (uid, algorithm, crop_type, last_date) VALUES (?, ?, ?, ?)"
+    await db.executemany(
+        query,
+        [
+            ["a", "SARIMA", "Mango", "2000-01-01"],
+            ["b", "SARIMA", "Avocado", "2000-01-01"],
+            ["c", "Unknown", "Mango", "2000-01-01"],
+        ],
+    )
+    row = DatasetRow(uid=None, date=date(2000, 2, 1), crop_type="Mango Kent", yield_values=1)
+    await DatasetManager().upsert(row, "test", db)
+
+    monkeypatch.setattr(settings, "RETRAIN_DEBOUNCE", 3600)
+    assert 3500 < await RetrainManager().retrain_due() <= 3600
+    assert not scheduled
+
+    monkeypatch.setattr(settings, "RETRAIN_DEBOUNCE", 0)
+    assert await RetrainManager().retrain_due() is None
+    assert [(job.algorithm, job.crop_type, job.username) for job in scheduled] == [("SARIMA", "Mango", "scheduler")]
+
+    # The job is still pending, so it will read the new data.
+    await DatasetManager().upsert(row.copy(update={"uid": None}), "test", db)
+    await RetrainManager().retrain_due()
+    assert len(scheduled) == 1
+    assert await (await db.execute("SELECT COUNT(*) FROM retrain_queue")).fetchone() == (0,)
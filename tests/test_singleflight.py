@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from tropicalia.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_coalesce() -> None:
+    """
+    Test whether concurrent identical calls share a single computation, while different ones do not.
+    """
+    flights = SingleFlight()
+    calls = []
+
+    async def compute(key: str) -> str:
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    results = await asyncio.gather(*(flights.do(key, lambda key=key: compute(key)) for key in ["a", "a", "b", "a"]))
+
+    assert results == ["A", "A", "B", "A"]
+    assert calls == ["a", "b"]
+    assert flights.stats().dict() == {"flights": 2, "coalesced": 2, "in_flight": 0}
+
+    assert await flights.do("a", lambda: compute("a")) == "A"
+    assert flights.stats().flights == 3
+
+
+@pytest.mark.asyncio
+async def test_coalesce_error() -> None:
+    """
+    Test whether the error of a computation is raised to every caller sharing it.
+    """
+    flights = SingleFlight()
+
+    async def compute() -> None:
+        await asyncio.sleep(0.01)
+        raise ValueError("Failed")
+
+    results = await asyncio.gather(*(flights.do("a", compute) for _ in range(3)), return_exceptions=True)
+
+    assert [str(result) for result in results] == ["Failed"] * 3
+    assert flights.stats().coalesced == 2
+
+
+@pytest.mark.asyncio
+async def test_coalesce_cancelled() -> None:
+    """
+    Test whether a waiting caller takes over the computation when the caller computing it is cancelled.
+    """
+    flights = SingleFlight()
+    calls = []
+
+    async def compute() -> int:
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    first = asyncio.ensure_future(flights.do("a", compute))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(flights.do("a", compute))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == 2
+    assert first.cancelled()
+    assert flights.stats().dict() == {"flights": 2, "coalesced": 0, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_coalesce_waiter_cancelled() -> None:
+    """
+    Test whether a waiting caller which is cancelled leaves the computation running and is not counted as coalesced.
+    """
+    flights = SingleFlight()
+
+    async def compute() -> int:
+        await asyncio.sleep(0.05)
+        return 1
+
+    first = asyncio.ensure_future(flights.do("a", compute))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(flights.do("a", compute))
+    await asyncio.sleep(0.01)
+    second.cancel()
+
+    assert await first == 1
+    assert second.cancelled()
+    assert flights.stats().dict() == {"flights": 1, "coalesced": 0, "in_flight": 0}
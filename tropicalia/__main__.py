@@ -1,5 +1,12 @@
+import argparse
+import asyncio
+
 from tropicalia.app import run_server
 from tropicalia import __author__, __version__
+from tropicalia.database import close_db_connection, create_db_connection
+from tropicalia.jobs import JobStatus, start_workers, stop_workers
+from tropicalia.manager import AlgorithmManager
+from tropicalia.models.algorithm import BatchTraining
 
 HEADER = "\n".join(
     [
@@ -20,5 +27,44 @@ def cli():
     run_server()
 
 
+async def train_batch(algorithms: list, crop_types: list, refresh: bool) -> BatchTraining:
+    await create_db_connection()
+    await start_workers()
+    try:
+        return await AlgorithmManager().train_batch(algorithms, crop_types, "cli", refresh)
+    finally:
+        await stop_workers()
+        await close_db_connection()
+
+
+def train_cli():
+    """
+    Trains every given algorithm for every given crop type in one pass, as `/algorithm/train/batch`,
+    and prints the outcome of every pair with its timings.
+    """
+    parser = argparse.ArgumentParser(prog="tropicalia-train", description=train_cli.__doc__)
+    parser.add_argument("-a", "--algorithm", action="append", help="algorithm to train, every one by default")
+    parser.add_argument("-c", "--crop-type", action="append", help="crop type to train, every one by default")
+    parser.add_argument("--refresh", action="store_true", help="refresh the trained algorithms with the new data")
+    args = parser.parse_args()
+
+    algorithms = args.algorithm or AlgorithmManager().get_ml_algorithms()
+    unknown = [algorithm for algorithm in algorithms if not AlgorithmManager().get_ml_algorithm(algorithm)]
+    if unknown:
+        parser.error(f"unknown algorithms: {', '.join(unknown)}")
+
+    summary = asyncio.run(train_batch(algorithms, args.crop_type or [], args.refresh))
+
+    for pair in summary.pairs:
+        fit = f"{pair.fit_seconds:8.2f} s" if pair.fit_seconds is not None else " " * 10
+        upload = f"{pair.upload_seconds:8.2f} s" if pair.upload_seconds is not None else " " * 10
+        outcome = pair.algorithm_uid if pair.status == JobStatus.DONE.value else pair.detail
+        print(f"{pair.algorithm:12}{pair.crop_type:24}{pair.status:8}{fit}{upload}  {outcome}")
+    print(
+        f"load: {summary.load_seconds:.2f} s  fit: {summary.fit_seconds:.2f} s  "
+        f"upload: {summary.upload_seconds:.2f} s  total: {summary.total_seconds:.2f} s"
+    )
+
+
 if __name__ == "__main__":
     cli()
@@ -1,21 +1,33 @@
 from __future__ import annotations
 
+import os
+import pickle
 import warnings
 from enum import Enum
+from functools import partial
 from itertools import product
-from typing import List
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Type
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 from fbprophet import Prophet as pr
 from statsmodels.tools.sm_exceptions import ConvergenceWarning
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from statsmodels.tsa.seasonal import STL
 from statsmodels.tsa.statespace.sarimax import SARIMAX
+from statsmodels.tsa.stattools import kpss
 
+from tropicalia.config import settings
+from tropicalia.jobs import ProcessMap
 from tropicalia.logger import get_logger
 
 logger = get_logger(__name__)
 warnings.simplefilter("ignore", ConvergenceWarning)
 
+# Entry point group of the algorithms provided by other packages.
+ENTRY_POINTS = "tropicalia.algorithms"
+
 
 class AlgorithmStack(Enum):
     """
@@ -24,6 +36,18 @@ class AlgorithmStack(Enum):
 
     SARIMA = "SARIMA"
     Prophet = "Prophet"
+    SeasonalNaive = "SeasonalNaive"
+    SeasonalMean = "SeasonalMean"
+    HoltWinters = "HoltWinters"
+
+
+class SearchStrategy(Enum):
+    """
+    Enumeration of the parameter search strategies of SARIMA
+    """
+
+    GRID = "grid"
+    STEPWISE = "stepwise"
 
 
 class MLAlgorithm:
@@ -31,6 +55,9 @@ class MLAlgorithm:
     Class representing the Machine Learning Algorithms
     """
 
+    # Whether `fit_values` fits many series at once, given as the rows of a 2-D array (series x months).
+    VECTORIZED = False
+
     def train(self, df: DataFrame) -> MLAlgorithm:
         pass
 
@@ -40,24 +67,129 @@ class MLAlgorithm:
     def forecast(self, df: DataFrame) -> tuple(DataFrame, DataFrame):
         pass
 
+    def refresh(self, df: DataFrame, ml_model) -> Optional[MLAlgorithm]:
+        """
+        Algorithms which cannot be refreshed with new data are always trained from scratch.
+        """
+        return None
+
+    def new_months(self, history: np.ndarray, df: DataFrame) -> Optional[int]:
+        """
+        Given the values a model was trained with and the current data, returns the number of months added since.
+        Returns None if a full training is due instead, because past months have changed or too many were added.
+        """
+        values = df["yield_values"].to_numpy(dtype=float)
+
+        if len(values) < len(history) or not np.allclose(values[: len(history)], history):
+            logger.debug("Past data has changed since the model was trained")
+            return None
+        if len(values) - len(history) > settings.REFRESH_MAX_MONTHS:
+            logger.debug(f"More than {settings.REFRESH_MAX_MONTHS} months were added since the model was trained")
+            return None
+
+        return len(values) - len(history)
+
+    def model_config(self, ml_model) -> Any:
+        """
+        Given a fitted model, returns the hyperparameters it was fitted with, so that other data can be fitted
+        with them through `fit_config` without searching them again.
+        """
+        return None
+
+    def search_config(self, df: DataFrame) -> Any:
+        """
+        Returns the best hyperparameters for the given data.
+        """
+        return None
+
+    def fit_config(self, df: DataFrame, config: Any):
+        """
+        Fits a model for the given data with the given hyperparameters.
+        Algorithms without hyperparameters to search are trained as usual.
+        """
+        return self.train(df)
+
+    def forecast_values(self, ml_model, steps: int) -> np.ndarray:
+        """
+        Returns the values forecast by a fitted model for the given number of months after its data.
+        """
+        raise NotImplementedError
+
 
+ALGORITHMS: Dict[str, Type[MLAlgorithm]] = {}
+
+
+def register(name: str) -> Callable[[Type[MLAlgorithm]], Type[MLAlgorithm]]:
+    """
+    Class decorator which registers an algorithm under the given name, so that it can be trained and predicted with.
+    """
+
+    def decorator(cls: Type[MLAlgorithm]) -> Type[MLAlgorithm]:
+        if name in ALGORITHMS and ALGORITHMS[name] is not cls:
+            logger.warning(f"Algorithm {name} is already registered, it is replaced by {cls.__name__}")
+        ALGORITHMS[name] = cls
+        return cls
+
+    return decorator
+
+
+def load_plugins() -> None:
+    """
+    Registers the algorithms of the installed packages, declared as `MLAlgorithm` subclasses in entry points
+    of the `tropicalia.algorithms` group, named after the algorithm.
+    """
+    try:
+        from pkg_resources import iter_entry_points
+    except ImportError:
+        return
+
+    for entry_point in iter_entry_points(ENTRY_POINTS):
+        try:
+            register(entry_point.name)(entry_point.load())
+        except Exception as err:
+            logger.warning(f"Algorithm {entry_point.name} could not be loaded")
+            logger.exception(err)
+
+
+@register(AlgorithmStack.SARIMA.value)
 class SARIMA(MLAlgorithm):
     """
     Class representing the Seasonal AutoRegressive Integrated Moving Average algorithm from statsmodels
     """
 
+    # Upper bounds of the (p, d, q, P, D, Q) parameters searched.
+    MAX_ORDER = (2, 1, 3, 2, 1, 3)
+
+    def __init__(self, search: Optional[str] = None):
+        self.search = search or settings.SARIMA_SEARCH
+
     def train(self, df: DataFrame):
         """
         Trains a SARIMA model with the best parameter configuration for the given data.
 
         Returns the fitted model.
         """
-        configs = self.configs()
-        best_config = self.evaluate_models(df, configs)
-        fit_model = self.fit(df, best_config)
+        fit_model = self.fit(df, self.search_config(df))
 
         return fit_model
 
+    def search_config(self, df: DataFrame) -> List[tuple]:
+        """
+        Searches the parameters of SARIMA for the given data with the selected search strategy.
+
+        Returns the best parameter selection, as [order, seasonal order].
+        """
+        return self.best_config(self.search_models(df))
+
+    def model_config(self, ml_model) -> List[tuple]:
+        return [ml_model.model.order, ml_model.model.seasonal_order]
+
+    def fit_config(self, df: DataFrame, config: List[tuple]):
+        return self.fit(df, config)
+
+    def forecast_values(self, ml_model, steps: int) -> np.ndarray:
+        return np.asarray(ml_model.forecast(steps), dtype=float)
+
     def predict(self, df: DataFrame, ml_model) -> DataFrame:
         """
         Given a fitted model and the data, it performs a prediction to obtain validation data
@@ -92,6 +224,33 @@ class SARIMA(MLAlgorithm):
 
         return (df[["date", "yield_values"]].iloc[-36:], forecast)
 
+    def refresh(self, df: DataFrame, ml_model):
+        """
+        Extends a fitted model with the months added since it was trained: its parameter configuration is kept
+        and its coefficients are re-estimated starting from the previous ones, so no search is needed.
+
+        Returns the refreshed model, or None if a full training is due, because past months have changed,
+        too many months were added or the new months drift away from the model's forecast.
+        """
+        n_new = self.new_months(np.asarray(ml_model.model.data.orig_endog, dtype=float), df)
+        if n_new is None:
+            return None
+        if n_new == 0:
+            return ml_model
+
+        new_data = df["yield_values"].iloc[-n_new:]
+        forecast = ml_model.get_forecast(steps=n_new)
+        errors = (new_data.to_numpy() - forecast.predicted_mean.to_numpy()) / np.sqrt(forecast.var_pred_mean.to_numpy())
+        if np.abs(errors).max() > settings.REFRESH_DRIFT_THRESHOLD:
+            logger.debug("New data drifts away from the forecast of the model")
+            return None
+
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            fit_model = ml_model.append(new_data, refit=True, fit_kwargs={"disp": False})
+
+        return fit_model
+
     def fit(self, df: DataFrame, config: List[tuple]):
         """
         Method to train SARIMA given data and its parameters.
@@ -119,47 +278,143 @@ class SARIMA(MLAlgorithm):
 
         Returns a list of tuples with parameters
         """
-        # p_params = [0, 1, 2]
-        # d_params = [0, 1]
-        # q_params = [0, 1, 2, 3]
-        # P_params = [0, 1, 2]
-        # D_params = [0, 1]
-        # Q_params = [0, 1, 2, 3]
-
-        p_params = [0]
-        d_params = [0]
-        q_params = [0]
-        P_params = [0]
-        D_params = [0, 1]
-        Q_params = [0]
+        params = [range(max_order + 1) for max_order in self.MAX_ORDER]
 
-        configs = product(p_params, d_params, q_params, P_params, D_params, Q_params, [seasonality])
+        configs = product(*params, [seasonality])
 
         return configs
 
-    def evaluate_models(self, df: DataFrame, configs: List[tuple]) -> List[tuple]:
+    def search_models(self, df: DataFrame, seasonality: int = 12) -> Dict[tuple, float]:
         """
-        Evaluates all possible SARIMA parameters.
+        Evaluates SARIMA parameters with the selected search strategy, in worker processes.
 
-        Returns the best parameter selection.
+        Returns the AIC coefficient of every evaluated configuration.
         """
-        best_score, best_cfg = float("inf"), None
+        with ProcessMap(partial(self.evaluate_config, df), self.grid_workers(), settings.GRID_FIT_TIMEOUT) as pool:
+            if self.search == SearchStrategy.STEPWISE.value:
+                return self.stepwise(df, pool, seasonality)
+            return self.score(pool, self.configs(seasonality))
+
+    def score(self, pool: ProcessMap, configs: List[tuple]) -> Dict[tuple, float]:
+        """
+        Evaluates the given configurations in a pool of processes. Configurations whose fit raises an error or takes
+        longer than `GRID_FIT_TIMEOUT` seconds, as they usually diverge, are given an infinite AIC coefficient.
 
-        for config in configs:
-            p, d, q, P_value, D_value, Q_value, seasonality = config
-            order = (p, d, q)
-            s_order = (P_value, D_value, Q_value, seasonality)
-            try:
-                aic = self.evaluate_sarima_model(df, order, s_order)
-                if aic < best_score:
-                    best_score, best_cfg = aic, [order, s_order]
-            except Exception as err:
+        Returns the AIC coefficient of every configuration.
+        """
+        configs = list(configs)
+        scores = {}
+
+        for config, (aic, error) in zip(configs, pool.map(configs)):
+            if error:
                 logger.debug(f"SARIMA config {config} has raised an error.")
-                logger.debug(err)
-                continue
+                logger.debug(error)
+                aic = float("inf")
+            scores[config] = aic
+
+        return scores
+
+    def best_config(self, scores: Dict[tuple, float]) -> List[tuple]:
+        """
+        Returns the parameter selection with the lowest AIC coefficient, as [order, seasonal order].
+        """
+        best_score, best_cfg = float("inf"), None
+
+        for config, aic in scores.items():
+            if aic < best_score:
+                p, d, q, P_value, D_value, Q_value, seasonality = config
+                best_score, best_cfg = aic, [(p, d, q), (P_value, D_value, Q_value, seasonality)]
 
         return best_cfg
 
+    def stepwise(self, df: DataFrame, pool: ProcessMap, seasonality: int = 12) -> Dict[tuple, float]:
+        """
+        Stepwise search of Hyndman and Khandakar: it starts from a few seed configurations, with the differencing
+        orders given by unit root tests, and moves to the best neighbouring configuration while the AIC improves.
+        Configurations not within `STEPWISE_AIC_MARGIN` of the best AIC are pruned, that is, their neighbours
+        are not evaluated. A margin of 0 is the classic greedy search, wider margins explore more.
+
+        Returns the AIC coefficient of every evaluated configuration.
+        """
+        d, D = self.differences(df, seasonality)
+        seeds = [(2, d, 2, 1, D, 1), (0, d, 0, 0, D, 0), (1, d, 0, 1, D, 0), (0, d, 1, 0, D, 1)]
+
+        candidates = {tuple(map(min, seed, self.MAX_ORDER)) + (seasonality,) for seed in seeds}
+        scores: Dict[tuple, float] = {}
+        expanded = set()
+
+        while candidates:
+            scores.update(self.score(pool, sorted(candidates)))
+            best = min(scores, key=scores.get)
+
+            frontier = {config for config, aic in scores.items() if aic < scores[best] + settings.STEPWISE_AIC_MARGIN}
+            frontier = {config for config in frontier | {best} if scores[config] < float("inf")} - expanded
+            expanded.update(frontier)
+            candidates = {neighbour for config in frontier for neighbour in self.neighbours(config)} - scores.keys()
+
+        logger.debug(f"Stepwise search has evaluated {len(scores)} SARIMA configs")
+
+        return scores
+
+    def neighbours(self, config: tuple) -> Iterator[tuple]:
+        """
+        Yields the configurations with one of p, q, P and Q, or both p and q, or both P and Q, one above or below.
+        The differencing orders d and D are kept, as the AIC of models with different differencing is not comparable.
+        """
+        order, seasonality = config[:-1], config[-1]
+        moves = [tuple(int(i == j) for j in range(len(order))) for i in (0, 2, 3, 5)]
+        moves += [(1, 0, 1, 0, 0, 0), (0, 0, 0, 1, 0, 1)]
+
+        for move in moves:
+            for sign in (1, -1):
+                neighbour = tuple(value + sign * step for value, step in zip(order, move))
+                if all(0 <= value <= max_order for value, max_order in zip(neighbour, self.MAX_ORDER)):
+                    yield neighbour + (seasonality,)
+
+    def differences(self, df: DataFrame, seasonality: int = 12) -> Tuple[int, int]:
+        """
+        Chooses the seasonal differencing order by the strength of the STL seasonal component,
+        and then the differencing order by the KPSS unit root test.
+
+        Returns the (d, D) differencing orders.
+        """
+        values = df["yield_values"].to_numpy(dtype=float)
+        d = D = 0
+
+        try:
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore")
+                if len(values) >= 2 * seasonality:
+                    stl = STL(values, period=seasonality).fit()
+                    strength = 1 - np.var(stl.resid) / np.var(stl.seasonal + stl.resid)
+                    if strength > 0.64:
+                        D = 1
+                        values = values[seasonality:] - values[:-seasonality]
+                d = int(kpss(values, regression="c", nlags="auto")[1] < 0.05)
+        except Exception as err:
+            logger.debug(err)
+
+        return min(d, self.MAX_ORDER[1]), min(D, self.MAX_ORDER[4])
+
+    def grid_workers(self) -> int:
+        """
+        Number of processes to evaluate the parameters with. Unless set, the cores are split among the training jobs.
+        """
+        if settings.GRID_WORKERS > 0:
+            return settings.GRID_WORKERS
+
+        return max((os.cpu_count() or 1) // settings.TRAIN_WORKERS, 1)
+
+    def evaluate_config(self, df: DataFrame, config: tuple) -> float:
+        """
+        Evaluates a (p, d, q, P, D, Q, seasonality) configuration of parameters.
+
+        Returns the AIC coefficient as a float value.
+        """
+        p, d, q, P_value, D_value, Q_value, seasonality = config
+
+        return self.evaluate_sarima_model(df, (p, d, q), (P_value, D_value, Q_value, seasonality))
+
     def evaluate_sarima_model(self, df: DataFrame, order: tuple, s_order: tuple) -> float:
         """
         Evaluates the SARIMA model given certain parameters using the Akaike Information Criterion.
@@ -167,20 +422,23 @@ class SARIMA(MLAlgorithm):
         Returns the AIC coefficient as a float value.
         """
         try:
-            model = SARIMAX(
-                endog=df["yield_values"],
-                order=order,
-                seasonal_order=s_order,
-                enforce_stationarity=False,
-                enforce_invertibility=False,
-            )
-            results = model.fit(disp=False)
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore")
+                model = SARIMAX(
+                    endog=df["yield_values"],
+                    order=order,
+                    seasonal_order=s_order,
+                    enforce_stationarity=False,
+                    enforce_invertibility=False,
+                )
+                results = model.fit(disp=False)
             return results.aic
         except Exception as err:
             logger.debug(err)
             return float("inf")
 
 
+@register(AlgorithmStack.Prophet.value)
 class Prophet(MLAlgorithm):
     """
     Class representing the Prophet algorithm from fbprophet.
@@ -202,6 +460,30 @@ class Prophet(MLAlgorithm):
 
         return fit_model
 
+    def refresh(self, df: DataFrame, ml_model):
+        """
+        Fits a Prophet model for the data, warm-starting the optimization from the parameters of the given fit.
+
+        Returns the fitted model, or None if a full training is due, because past months have changed
+        or too many months were added.
+        """
+        n_new = self.new_months(ml_model.history["y"].to_numpy(dtype=float), df)
+        if n_new is None:
+            return None
+        if n_new == 0:
+            return ml_model
+
+        init = {name: ml_model.params[name][0][0] for name in ["k", "m", "sigma_obs"]}
+        init.update({name: ml_model.params[name][0] for name in ["delta", "beta"]})
+
+        df_prophet = df.reset_index().rename(columns={"date": "ds", "yield_values": "y"})
+        model = pr(seasonality_mode="multiplicative")
+        model.stan_backend.logger = None
+
+        fit_model = model.fit(df_prophet, init=init)
+
+        return fit_model
+
     def predict(self, df: DataFrame, ml_model) -> DataFrame:
         """
         Given a fitted model and the data, it performs a prediction to obtain validation data
@@ -217,6 +499,11 @@ class Prophet(MLAlgorithm):
 
         return prediction
 
+    def forecast_values(self, ml_model, steps: int) -> np.ndarray:
+        future = ml_model.make_future_dataframe(periods=steps, freq="MS", include_history=False)
+
+        return ml_model.predict(future)["yhat"].to_numpy(dtype=float)
+
     def forecast(self, df: DataFrame, is_monthly: bool, ml_model) -> tuple(DataFrame, DataFrame):
         """
         Given a fitted model, it performs a forecast for the next harvesting year.
@@ -234,3 +521,191 @@ class Prophet(MLAlgorithm):
             return (df[["date", "yield_values"]].iloc[[-12]], forecast.iloc[[-12]])
 
         return (df[["date", "yield_values"]].iloc[-36:], forecast)
+
+
+class SeriesFit(NamedTuple):
+    """
+    Model fitted by the baseline algorithms: the last month of its data, the one-step-ahead predictions
+    of every month, NaN where there are none, and the state its forecasts are computed from.
+    """
+
+    last_date: pd.Timestamp
+    fitted: np.ndarray
+    state: Any
+
+
+class BaselineAlgorithm(MLAlgorithm):
+    """
+    Class representing the cheap algorithms fitted to the monthly values alone, in milliseconds.
+    """
+
+    # Shortest data the algorithm can be fitted with.
+    MIN_MONTHS = 12
+
+    def train(self, df: DataFrame) -> SeriesFit:
+        """
+        Fits the algorithm to the monthly values of the given data.
+
+        Returns the fitted model.
+        """
+        values = df["yield_values"].to_numpy(dtype=float)
+        if len(values) < self.MIN_MONTHS:
+            raise ValueError(f"{type(self).__name__} requires at least {self.MIN_MONTHS} months of data")
+
+        fitted, state = self.fit_values(values)
+
+        return SeriesFit(last_date=pd.Timestamp(df.index[-1]), fitted=fitted, state=state)
+
+    def fit_values(self, values: np.ndarray) -> Tuple[np.ndarray, Any]:
+        """
+        Given monthly values, returns their one-step-ahead predictions and the state to forecast them with.
+        Vectorized algorithms are also given many series at once, as a 2-D array, NaN before the start of each one.
+        """
+        raise NotImplementedError
+
+    def refresh(self, df: DataFrame, ml_model: SeriesFit) -> SeriesFit:
+        """
+        Fitting is cheap enough to be done again with the new data.
+        """
+        return self.train(df)
+
+    def predict(self, df: DataFrame, ml_model: SeriesFit) -> DataFrame:
+        """
+        Given a fitted model, returns the one-step-ahead predictions of the last 3 years of harvesting
+        as validation data, leaving out the months without predictions.
+        """
+        dates = pd.date_range(end=ml_model.last_date, periods=len(ml_model.fitted), freq="MS")
+        prediction = pd.DataFrame({"date": dates, "yield_values": ml_model.fitted}).iloc[-36:]
+
+        return prediction.dropna()
+
+    def forecast(self, df: DataFrame, is_monthly: bool, ml_model: SeriesFit) -> tuple(DataFrame, DataFrame):
+        """
+        Given a fitted model, it performs a forecast for the next harvesting year.
+
+        Returns a tuple of pandas DataFrame: (last year values, forecasted values).
+        """
+        steps = 1 if is_monthly else 12
+        dates = pd.date_range(ml_model.last_date + pd.DateOffset(months=1), periods=steps, freq="MS")
+        forecast = pd.DataFrame({"date": dates, "yield_values": self.forecast_values(ml_model, steps)})
+
+        if is_monthly:
+            return (df[["date", "yield_values"]].iloc[[-12]], forecast)
+
+        return (df[["date", "yield_values"]].iloc[-36:], forecast)
+
+
+def repeat_season(season: np.ndarray, steps: int) -> np.ndarray:
+    """
+    Given the values of a season, as an array whose last axis are its months, repeats them for the given months.
+    """
+    return np.take(season, np.arange(steps) % season.shape[-1], axis=-1)
+
+
+def seasonal_means(values: np.ndarray, seasonality: int = 12) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Given monthly values, as an array whose last axis is time, so that many series are computed at once,
+    returns the mean of the previous values of each month, NaN for the first season, and the mean of every month
+    of the season to come.
+    """
+    pad = -values.shape[-1] % seasonality
+    padded = np.concatenate([np.full(values.shape[:-1] + (pad,), np.nan), values], axis=-1)
+    seasons = padded.reshape(values.shape[:-1] + (-1, seasonality))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.nancumsum(seasons, axis=-2) / np.cumsum(~np.isnan(seasons), axis=-2)
+
+    previous = np.concatenate([np.full_like(means[..., :1, :], np.nan), means[..., :-1, :]], axis=-2)
+    fitted = previous.reshape(values.shape[:-1] + (-1,))[..., pad:]
+
+    return fitted, means[..., -1, :]
+
+
+@register(AlgorithmStack.SeasonalNaive.value)
+class SeasonalNaive(BaselineAlgorithm):
+    """
+    Class representing the seasonal naive algorithm: every month is forecast as the same month of the last year.
+    """
+
+    VECTORIZED = True
+
+    def fit_values(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        fitted = np.concatenate([np.full(values.shape[:-1] + (12,), np.nan), values[..., :-12]], axis=-1)
+
+        return fitted, values[..., -12:]
+
+    def forecast_values(self, ml_model: SeriesFit, steps: int) -> np.ndarray:
+        return repeat_season(ml_model.state, steps)
+
+
+@register(AlgorithmStack.SeasonalMean.value)
+class SeasonalMean(BaselineAlgorithm):
+    """
+    Class representing the seasonal mean algorithm: every month is forecast as the mean of the same month
+    over every year.
+    """
+
+    VECTORIZED = True
+
+    def fit_values(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return seasonal_means(values)
+
+    def forecast_values(self, ml_model: SeriesFit, steps: int) -> np.ndarray:
+        return repeat_season(ml_model.state, steps)
+
+
+@register(AlgorithmStack.HoltWinters.value)
+class HoltWinters(BaselineAlgorithm):
+    """
+    Class representing the Holt-Winters exponential smoothing algorithm from statsmodels,
+    with additive seasonality and damped additive trend, as crops may lack yield in some months.
+    """
+
+    MIN_MONTHS = 24
+
+    def fit_values(self, values: np.ndarray) -> Tuple[np.ndarray, Any]:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            model = ExponentialSmoothing(
+                values,
+                trend="add",
+                damped_trend=True,
+                seasonal="add",
+                seasonal_periods=12,
+                initialization_method="estimated",
+            )
+            model_fit = model.fit()
+
+        return np.asarray(model_fit.fittedvalues, dtype=float), model_fit
+
+    def forecast_values(self, ml_model: SeriesFit, steps: int) -> np.ndarray:
+        return np.asarray(ml_model.state.forecast(steps), dtype=float)
+
+
+load_plugins()
+
+
+def train_algorithm(algorithm: str, df: DataFrame) -> bytes:
+    """
+    Trains the given algorithm for the data. It is meant to be run in a worker process.
+
+    Returns the pickled fitted model.
+    """
+    fit_model = ALGORITHMS[algorithm]().train(df)
+
+    return pickle.dumps(fit_model)
+
+
+def refresh_algorithm(algorithm: str, df: DataFrame, alg_obj: bytes) -> Tuple[bytes, bool]:
+    """
+    Refreshes a pickled trained algorithm with the new data, or trains it from scratch if it cannot be refreshed.
+    It is meant to be run in a worker process.
+
+    Returns the pickled fitted model and whether it was refreshed.
+    """
+    fit_model = ALGORITHMS[algorithm]().refresh(df, pickle.loads(alg_obj))
+
+    if fit_model is None:
+        return train_algorithm(algorithm, df), False
+
+    return pickle.dumps(fit_model), True
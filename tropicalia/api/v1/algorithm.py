@@ -1,10 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from tropicalia.auth import get_current_user
-from tropicalia.database import Database, get_connection
+from tropicalia.database import Database, get_connection, get_write_connection
+from tropicalia.etag import is_fresh, make_etag
+from tropicalia.formats import (
+    ARROW_STREAM,
+    COLUMNAR_JSON,
+    CSV,
+    PARQUET,
+    PREDICTION_COLUMNS,
+    batch_prediction_columns,
+    export_response,
+    negotiate,
+    pa,
+    prediction_arrow,
+    prediction_columns,
+    prediction_rows,
+)
 from tropicalia.logger import get_logger
-from tropicalia.manager import AlgorithmManager
-from tropicalia.models.algorithm import Algorithm, AlgorithmPrediction
+from tropicalia.manager import AlgorithmManager, BacktestManager, DatasetManager, JobManager
+from tropicalia.models.algorithm import (
+    Algorithm,
+    AlgorithmFlights,
+    AlgorithmMetrics,
+    AlgorithmPrediction,
+    BatchTraining,
+    Job,
+)
 from tropicalia.models.user import UserInDB
 
 logger = get_logger(__name__)
@@ -42,43 +67,268 @@ async def check(
     tags=["algorithm"],
     response_model=AlgorithmPrediction,
     response_description="Algorithm prediction",
+    responses={200: {"content": {COLUMNAR_JSON: {}, ARROW_STREAM: {}}}},
 )
 async def predict(
+    response: Response,
     algorithm: str,
     crop_type: str,
     is_monthly: bool = False,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
     current_user: UserInDB = Depends(get_current_user),
     db: Database = Depends(get_connection),
 ) -> AlgorithmPrediction:
     """
     The specified algorithm makes a prediction for a year or a month for the given crop type.
+    Each series can also be laid out by columns, either as JSON or as an Arrow IPC stream, through the `Accept` header.
+    Responses carry an ETag, and `304 Not Modified` is answered if neither the data nor the trained algorithms
+    of the crop type have changed since, without loading the algorithm.
     """
-    data = await AlgorithmManager().predict(algorithm, crop_type, is_monthly, current_user.username, db)
+    media_type = negotiate(accept)
+    if media_type == ARROW_STREAM and pa is None:
+        raise HTTPException(status_code=406, detail="Arrow is not available")
+
+    # Predictions are made from the monthly sums of every crop type starting with the given one.
+    revision = await DatasetManager().get_revision(crop_type, db)
+    etag = make_etag(revision, algorithm, crop_type, is_monthly, media_type)
+    if is_fresh(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if media_type:
+        frames = await AlgorithmManager().predict_frames(
+            algorithm, crop_type, is_monthly, current_user.username, db, revision
+        )
+        if not frames:
+            raise HTTPException(status_code=404, detail="Data prediction failed")
+
+        trained_alg, last_year_data, pred, forecast = frames
+        headers = {"ETag": etag}
+        if media_type == ARROW_STREAM:
+            content = prediction_arrow(last_year_data, pred, forecast, trained_alg)
+            return Response(content, media_type=ARROW_STREAM, headers=headers)
+        content = prediction_columns(last_year_data, pred, forecast, trained_alg)
+        return JSONResponse(content, media_type=COLUMNAR_JSON, headers=headers)
+
+    data = await AlgorithmManager().predict(algorithm, crop_type, is_monthly, current_user.username, db, revision)
 
     if not data:
         raise HTTPException(status_code=404, detail="Data prediction failed")
 
+    response.headers["ETag"] = etag
+
     return data
 
 
+@router.get(
+    "/predict/export",
+    summary="Algorithm prediction export",
+    tags=["algorithm"],
+    response_class=StreamingResponse,
+    response_description="Algorithm prediction file",
+    responses={200: {"content": {CSV: {}, PARQUET: {}}}},
+)
+async def predict_export(
+    algorithm: str,
+    crop_type: str,
+    is_monthly: bool = False,
+    file_format: str = Query("csv", alias="format", regex="^(csv|parquet)$"),
+    current_user: UserInDB = Depends(get_current_user),
+    db: Database = Depends(get_connection),
+) -> StreamingResponse:
+    """
+    Exports a prediction of the specified algorithm as a CSV or Parquet file, with a row per date of each series.
+    """
+    if file_format == "parquet" and pa is None:
+        raise HTTPException(status_code=406, detail="Parquet is not available")
+
+    frames = await AlgorithmManager().predict_frames(algorithm, crop_type, is_monthly, current_user.username, db)
+    if not frames:
+        raise HTTPException(status_code=404, detail="Data prediction failed")
+
+    _, last_year_data, pred, forecast = frames
+
+    async def chunks():
+        yield prediction_rows(last_year_data, pred, forecast)
+
+    return export_response(PREDICTION_COLUMNS, chunks(), file_format, "prediction")
+
+
+@router.get(
+    "/predict/batch",
+    summary="Batch algorithm prediction",
+    tags=["algorithm"],
+    response_model=List[AlgorithmPrediction],
+    response_description="Algorithm predictions",
+    responses={200: {"content": {COLUMNAR_JSON: {}}}},
+)
+async def predict_batch(
+    algorithm: str,
+    crop_type: List[str] = Query(None),
+    is_monthly: bool = False,
+    accept: Optional[str] = Header(None),
+    current_user: UserInDB = Depends(get_current_user),
+    db: Database = Depends(get_connection),
+) -> List[AlgorithmPrediction]:
+    """
+    The specified algorithm makes a prediction for a year or a month for every given crop type, by default every
+    crop type with data. Unlike `/predict`, nothing has to be trained beforehand: the algorithm is fitted to every
+    crop type at once, so only vectorized algorithms, such as `SeasonalNaive` and `SeasonalMean`, are supported.
+    Each series can also be laid out by columns as JSON through the `Accept` header, which is much faster
+    for many crop types.
+    """
+    ml_algorithm = AlgorithmManager().get_ml_algorithm(algorithm)
+    if not ml_algorithm:
+        raise HTTPException(status_code=404, detail="Algorithm not found")
+    if not ml_algorithm.VECTORIZED:
+        raise HTTPException(status_code=400, detail="Algorithm cannot predict many crop types at once")
+
+    if negotiate(accept) == COLUMNAR_JSON:
+        batch = await AlgorithmManager().predict_batch_series(
+            algorithm, crop_type or [], is_monthly, current_user.username, db
+        )
+        content = [batch_prediction_columns(trained_alg, series) for trained_alg, series in batch]
+        return JSONResponse(content, media_type=COLUMNAR_JSON)
+
+    return await AlgorithmManager().predict_batch(algorithm, crop_type or [], is_monthly, current_user.username, db)
+
+
 @router.get(
     "/train",
     summary="Algorithm training",
     tags=["algorithm"],
-    response_description="Algorithm training",
+    status_code=202,
+    response_model=Job,
+    response_description="Algorithm training job",
 )
 async def train(
     algorithm: str,
     crop_type: str,
+    refresh: bool = False,
     current_user: UserInDB = Depends(get_current_user),
-    db: Database = Depends(get_connection),
-) -> Algorithm:
+    db: Database = Depends(get_write_connection),
+) -> Job:
     """
     User request for a specific algorithm to be trained for a given crop type data.
+    Training runs in the background: the returned job is to be polled at `/jobs/{uid}` until it is done.
+    With `refresh`, the previously trained algorithm is extended with the months added since, instead of
+    searching its parameters again, unless the data has drifted or too many months have piled up.
     """
-    data = await AlgorithmManager().train(algorithm, crop_type, current_user.username, db)
+    if not AlgorithmManager().get_ml_algorithm(algorithm):
+        raise HTTPException(status_code=404, detail="Algorithm not found")
 
-    if not data:
-        raise HTTPException(status_code=404, detail="Algorithm training failed")
+    job = await JobManager().submit(algorithm, crop_type, current_user.username, db, refresh)
 
-    return data
+    return job
+
+
+@router.post(
+    "/train/batch",
+    summary="Batch algorithm training",
+    tags=["algorithm"],
+    response_model=BatchTraining,
+    response_description="Summary of the trainings",
+)
+async def train_batch(
+    algorithm: List[str] = Query(None),
+    crop_type: List[str] = Query(None),
+    refresh: bool = False,
+    current_user: UserInDB = Depends(get_current_user),
+) -> BatchTraining:
+    """
+    Trains every given algorithm for every given crop type in one pass, by default every algorithm for every
+    crop type with data, as after loading the data of a month. Unlike `/train`, the request waits for the trainings
+    to finish and returns the outcome of every algorithm / crop type pair with its timings.
+    """
+    algorithms = algorithm or AlgorithmManager().get_ml_algorithms()
+    if not all(AlgorithmManager().get_ml_algorithm(name) for name in algorithms):
+        raise HTTPException(status_code=404, detail="Algorithm not found")
+
+    summary = await AlgorithmManager().train_batch(algorithms, crop_type or [], current_user.username, refresh)
+
+    return summary
+
+
+@router.post(
+    "/backtest",
+    summary="Algorithm backtesting",
+    tags=["algorithm"],
+    response_model=List[AlgorithmMetrics],
+    response_description="Accuracy metrics",
+)
+async def backtest(
+    algorithm: List[str] = Query(None),
+    crop_type: List[str] = Query(None),
+    current_user: UserInDB = Depends(get_current_user),
+) -> List[AlgorithmMetrics]:
+    """
+    Evaluates every given algorithm for every given crop type, by default every algorithm for every crop type
+    with data, with rolling-origin backtesting: the algorithm is fitted with the data up to several cutoffs
+    and its forecasts of the next month and the next year are compared with the actual data.
+    MAE, MAPE and RMSE are stored, to be read at `/metrics`.
+    """
+    algorithms = algorithm or AlgorithmManager().get_ml_algorithms()
+    if not all(AlgorithmManager().get_ml_algorithm(name) for name in algorithms):
+        raise HTTPException(status_code=404, detail="Algorithm not found")
+
+    metrics = await BacktestManager().backtest(algorithms, crop_type or [], current_user.username)
+
+    return metrics
+
+
+@router.get(
+    "/metrics",
+    summary="Algorithm accuracy metrics",
+    tags=["algorithm"],
+    response_model=List[AlgorithmMetrics],
+    response_description="Accuracy metrics",
+)
+async def metrics(
+    algorithm: Optional[str] = None,
+    crop_type: Optional[str] = None,
+    current_user: UserInDB = Depends(get_current_user),
+    db: Database = Depends(get_connection),
+) -> List[AlgorithmMetrics]:
+    """
+    Returns the accuracy metrics of the latest backtests, optionally of a given algorithm or crop type.
+    For each crop type and horizon, the most accurate algorithm is listed first.
+    """
+    return await BacktestManager().get(algorithm, crop_type, current_user.username, db)
+
+
+@router.get(
+    "/jobs/{uid}",
+    summary="Training job status",
+    tags=["algorithm"],
+    response_model=Job,
+    response_description="Training job status",
+)
+async def get_job(
+    uid: str,
+    current_user: UserInDB = Depends(get_current_user),
+    db: Database = Depends(get_connection),
+) -> Job:
+    """
+    Returns the status of a training job and, once it is done, the uid of the trained algorithm.
+    """
+    job = await JobManager().get(uid, db)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+@router.get(
+    "/flights",
+    summary="Get training and prediction stats",
+    tags=["algorithm"],
+    response_model=AlgorithmFlights,
+    response_description="Training and prediction stats",
+)
+async def flights(current_user: UserInDB = Depends(get_current_user)) -> AlgorithmFlights:
+    """
+    Returns how many trainings and predictions have been computed, how many are in flight and how many
+    concurrent identical requests have shared the result of another one instead of computing it again.
+    """
+    return AlgorithmManager().flight_stats()
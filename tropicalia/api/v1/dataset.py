@@ -1,18 +1,37 @@
-from typing import List, Union
+from datetime import date
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from tropicalia.auth import get_current_user
-from tropicalia.database import Database, get_connection
+from tropicalia.cache import table_cache
+from tropicalia.database import Database, fold_case, get_connection, get_write_connection
+from tropicalia.etag import is_fresh, make_etag
+from tropicalia.formats import (
+    ARROW_STREAM,
+    COLUMNAR_JSON,
+    CSV,
+    DATASET_COLUMNS,
+    PARQUET,
+    export_response,
+    negotiate,
+    pa,
+    table_arrow,
+    table_columns,
+)
 from tropicalia.logger import get_logger
 from tropicalia.manager import DatasetManager
-from tropicalia.models.dataset import TableDataset, DatasetRow
+from tropicalia.models.dataset import CacheStats, TableDataset, DatasetRow, ImportReport
 from tropicalia.models.user import UserInDB
 
 logger = get_logger(__name__)
 
 router = APIRouter()
 
+NDJSON = "application/x-ndjson"
+
 
 @router.get(
     "/get",
@@ -20,21 +39,128 @@ router = APIRouter()
     tags=["data"],
     response_model=TableDataset,
     response_description="Updated dataset from DB",
+    responses={200: {"content": {NDJSON: {}, COLUMNAR_JSON: {}, ARROW_STREAM: {}}}},
 )
 async def get(
-    crop_type: str = "", current_user: UserInDB = Depends(get_current_user), db: Database = Depends(get_connection)
+    crop_type: str = "",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: Optional[int] = Query(None, gt=0),
+    after_crop_type: Optional[str] = None,
+    after_date: Optional[date] = None,
+    after_uid: Optional[str] = None,
+    stream: bool = False,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    current_user: UserInDB = Depends(get_current_user),
+    db: Database = Depends(get_connection),
 ) -> TableDataset:
     """
     Retrieves data from the Dataset based on the crop type.
+    Days can be bounded to a date range and paged with `limit`. The next page starts after the crop type,
+    date and uid of the last day of the previous one, given as `after_crop_type`, `after_date` and `after_uid`.
+    With `stream` or an `Accept: application/x-ndjson` header, months are streamed as newline-delimited JSON.
+    The table can also be laid out by columns, either as JSON or as an Arrow IPC stream, through the `Accept` header.
+    Responses carry an ETag, and `304 Not Modified` is answered if the crop types have not changed since.
+    Computed tables are cached until any of their crop types changes.
+    """
+    cursor = [after_crop_type, after_date, after_uid]
+    if any(cursor) and not all(cursor):
+        raise HTTPException(status_code=422, detail="Incomplete cursor: after_crop_type, after_date, after_uid")
+
+    media_type = NDJSON if stream or (accept and NDJSON in accept) else negotiate(accept)
+    if media_type == ARROW_STREAM and pa is None:
+        raise HTTPException(status_code=406, detail="Arrow is not available")
+
+    revision = await DatasetManager().get_revision(crop_type, db)
+    etag = make_etag(revision, crop_type, start_date, end_date, limit, *cursor, media_type)
+    if is_fresh(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if media_type == NDJSON:
+        lines = DatasetManager().stream_table(crop_type, current_user.username, db, start_date, end_date)
+        return StreamingResponse(lines, media_type=NDJSON, headers={"ETag": etag})
+
+    # Prefixes differing only in case match the same crop types, so they share their cached tables.
+    prefix = fold_case(crop_type)
+    params = (start_date, end_date, limit, *cursor, media_type)
+    cached = table_cache.get(prefix, params, revision)
+    if cached:
+        return Response(cached.content, media_type=cached.media_type, headers={"ETag": etag})
+
+    if media_type:
+        df_daily = await DatasetManager().get_frame(
+            crop_type, current_user.username, db, start_date, end_date, limit, after_crop_type, after_date, after_uid
+        )
+        df_monthly = await DatasetManager().get_monthly_frame(
+            crop_type, current_user.username, db, start_date=start_date, end_date=end_date
+        )
+
+        if media_type == ARROW_STREAM:
+            response = Response(table_arrow(df_daily, df_monthly), media_type=ARROW_STREAM)
+        else:
+            response = JSONResponse(table_columns(df_daily, df_monthly), media_type=COLUMNAR_JSON)
+    else:
+        daily_data = await DatasetManager().get(
+            crop_type, current_user.username, db, start_date, end_date, limit, after_crop_type, after_date, after_uid
+        )
+        monthly_data = await DatasetManager().get_monthly(
+            crop_type, current_user.username, db, start_date=start_date, end_date=end_date
+        )
+
+        data = DatasetManager().get_table(daily_data, monthly_data)
+
+        if not data:
+            raise HTTPException(status_code=404, detail="Specified data not found")
+
+        response = JSONResponse(jsonable_encoder(data))
+
+    table_cache.put(prefix, params, revision, response.body, response.media_type)
+    response.headers["ETag"] = etag
+
+    return response
+
+
+@router.get(
+    "/cache",
+    summary="Get data cache stats",
+    tags=["data"],
+    response_model=CacheStats,
+    response_description="Data cache stats",
+)
+async def cache(current_user: UserInDB = Depends(get_current_user)) -> CacheStats:
     """
-    daily_data = await DatasetManager().get(crop_type, current_user.username, db)
+    Retrieves the size and the hit, miss, eviction and invalidation counters of the data table cache.
+    """
+    return table_cache.stats()
 
-    data = DatasetManager().get_table(daily_data)
 
-    if not data:
-        raise HTTPException(status_code=404, detail="Specified data not found")
+@router.get(
+    "/export",
+    summary="Export dataset from DB",
+    tags=["data"],
+    response_class=StreamingResponse,
+    response_description="Dataset file from DB",
+    responses={200: {"content": {CSV: {}, PARQUET: {}}}},
+)
+async def export(
+    crop_type: str = "",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    file_format: str = Query("csv", alias="format", regex="^(csv|parquet)$"),
+    current_user: UserInDB = Depends(get_current_user),
+    db: Database = Depends(get_connection),
+) -> StreamingResponse:
+    """
+    Exports the days of the Dataset based on the crop type as a CSV or Parquet file, with a row per day.
+    Days can be bounded to a date range. The file is streamed as it is read from the DB.
+    """
+    if file_format == "parquet" and pa is None:
+        raise HTTPException(status_code=406, detail="Parquet is not available")
+
+    chunks = DatasetManager().export_chunks(crop_type, current_user.username, db, start_date, end_date)
 
-    return data
+    return export_response(DATASET_COLUMNS, chunks, file_format, "dataset")
 
 
 @router.post(
@@ -47,16 +173,15 @@ async def get(
 async def upsert(
     rows: Union[List[DatasetRow], DatasetRow],
     current_user: UserInDB = Depends(get_current_user),
-    db: Database = Depends(get_connection),
+    db: Database = Depends(get_write_connection),
 ) -> Union[List[DatasetRow], DatasetRow]:
     """
     Inserts or updates existing row in the DB.
     """
     if isinstance(rows, list):
-        upsert_rows = [await DatasetManager().upsert(row, current_user.username, db, commit=False) for row in rows]
-        if None in upsert_rows:
+        upsert_rows = await DatasetManager().upsert_many(rows, current_user.username, db)
+        if upsert_rows is None:
             raise HTTPException(status_code=404, detail="Upsert data error")
-        await DatasetManager().commit(db)
     else:
         upsert_rows = await DatasetManager().upsert(rows, current_user.username, db)
         if not upsert_rows:
@@ -65,6 +190,37 @@ async def upsert(
     return upsert_rows
 
 
+@router.post(
+    "/import",
+    summary="Import data file to DB",
+    tags=["data"],
+    response_model=ImportReport,
+    response_description="Import data file to DB",
+)
+async def import_file(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Query(None, alias="format", regex="^(csv|parquet)$"),
+    current_user: UserInDB = Depends(get_current_user),
+    db: Database = Depends(get_write_connection),
+) -> ImportReport:
+    """
+    Inserts or updates the rows of a CSV or Parquet file, with `uid`, `date`, `crop_type` and `yield_values` columns.
+    The format is taken from the file extension unless given. The file is imported as a whole or not at all.
+    """
+    if not file_format:
+        file_format = "parquet" if (file.filename or "").lower().endswith((".parquet", ".pq")) else "csv"
+
+    try:
+        report = await DatasetManager().import_file(file.file, file_format, current_user.username, db)
+    except ValueError as err:
+        raise HTTPException(status_code=422, detail=str(err))
+
+    if not report:
+        raise HTTPException(status_code=404, detail="Import data error")
+
+    return report
+
+
 @router.delete(
     "/delete",
     summary="Delete row from DB",
@@ -73,7 +229,7 @@ async def upsert(
     response_description="Delete row from DB",
 )
 async def delete(
-    row: DatasetRow, current_user: UserInDB = Depends(get_current_user), db: Database = Depends(get_connection)
+    row: DatasetRow, current_user: UserInDB = Depends(get_current_user), db: Database = Depends(get_write_connection)
 ) -> DatasetRow:
     """
     Deletes given row from the DB.
@@ -96,21 +252,26 @@ async def delete(
 async def apply(
     changes: List[List[DatasetRow]],
     current_user: UserInDB = Depends(get_current_user),
-    db: Database = Depends(get_connection),
+    db: Database = Depends(get_write_connection),
 ) -> List[List[DatasetRow]]:
     """
     Applies changes to rows in the DB.
+    Changes are applied as a whole: if any of them fails, none is kept.
     """
     upsert_rows, delete_rows = changes
 
-    upserted_rows = [await DatasetManager().upsert(row, current_user.username, db, commit=False) for row in upsert_rows]
-    if None in upserted_rows:
+    # HTTP errors are handled before the writer connection is released, which would commit the transaction,
+    # so it is rolled back beforehand.
+    upserted_rows = await DatasetManager().upsert_many(upsert_rows, current_user.username, db, commit=False)
+    if upserted_rows is None:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Upsert data error")
 
-    deleted_rows = [await DatasetManager().delete(row, current_user.username, db, commit=False) for row in delete_rows]
-    if None in deleted_rows:
+    deleted_rows = await DatasetManager().delete_many(delete_rows, current_user.username, db, commit=False)
+    if deleted_rows is None or {row.uid for row in deleted_rows} != {row.uid for row in delete_rows}:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Delete data error")
 
     await DatasetManager().commit(db)
 
-    return [upsert_rows, deleted_rows]
+    return [upserted_rows, deleted_rows]
@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette.status import HTTP_401_UNAUTHORIZED, HTTP_409_CONFLICT
 
-from tropicalia.database import Database, get_connection
+from tropicalia.database import Database, get_connection, get_write_connection
 from tropicalia.models.user import UserCreateRequest, UserInDB, Token
 from tropicalia.auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
@@ -25,7 +25,7 @@ router = APIRouter()
     response_model=UserInDB,
     response_description="User model from database",
 )
-async def register_to_system(user: UserCreateRequest, db: Database = Depends(get_connection)):
+async def register_to_system(user: UserCreateRequest, db: Database = Depends(get_write_connection)):
     user_by_email = await get_user_by_email(user.email, db)
     if user_by_email:
         raise HTTPException(
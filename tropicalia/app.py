@@ -5,12 +5,21 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from tropicalia.database import close_db_connection, create_db_connection
 from tropicalia.config import settings
+from tropicalia.jobs import start_workers, stop_workers
+from tropicalia.manager import JobManager, RetrainManager
+from tropicalia.scheduler import stop_scheduler
 from tropicalia.api.v1 import user, dataset, algorithm
 
 app = FastAPI()
 
 
 app.add_event_handler("startup", create_db_connection)
+app.add_event_handler("startup", start_workers)
+app.add_event_handler("startup", JobManager().resume)
+app.add_event_handler("startup", RetrainManager().start)
+# Jobs are stopped before the DB is closed, so that they can roll back.
+app.add_event_handler("shutdown", stop_scheduler)
+app.add_event_handler("shutdown", stop_workers)
 app.add_event_handler("shutdown", close_db_connection)
 
 app.include_router(user.router, prefix="/api/v1/auth")
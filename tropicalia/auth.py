@@ -6,7 +6,7 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from starlette.status import HTTP_401_UNAUTHORIZED
 
-from tropicalia.database import Database, get_connection
+from tropicalia.database import Database, get_connection, row_factory
 from tropicalia.models.user import UserInDB, UserCreateRequest
 
 SECRET_KEY = "b91a61d721b88f7e9fe8618e2e7e604663dc36ced6001d6a157bd391f604e07b"
@@ -29,8 +29,7 @@ async def get_user_by_username(username: str, db: Database) -> UserInDB:
     user = await res.fetchall()
 
     if user:
-        user_dict = {key: user[0][i] for i, key in enumerate(UserInDB.__fields__.keys())}
-        return UserInDB(**user_dict)
+        return row_factory(UserInDB)(user[0])
 
 
 async def get_user_by_email(email: str, db: Database) -> UserInDB:
@@ -46,8 +45,7 @@ async def get_user_by_email(email: str, db: Database) -> UserInDB:
     user = await res.fetchall()
 
     if user:
-        user_dict = {key: user[0][i] for i, key in enumerate(UserInDB.__fields__.keys())}
-        return UserInDB(**user_dict)
+        return row_factory(UserInDB)(user[0])
 
 
 async def register_user(user: UserCreateRequest, db: Database) -> UserInDB:
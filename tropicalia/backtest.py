@@ -0,0 +1,89 @@
+import pickle
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from pandas import DataFrame
+
+from tropicalia.algorithm import ALGORITHMS
+
+# Months ahead evaluated: the next month, as monthly predictions, and the next year, as yearly ones.
+HORIZONS = (1, 12)
+
+# Shortest data a fold is trained with, three seasons.
+MIN_TRAIN_MONTHS = 36
+
+
+class Score(NamedTuple):
+    folds: int
+    mae: float
+    mape: Optional[float]
+    rmse: float
+
+
+def cutoffs(n_months: int, folds: int, step: int) -> List[int]:
+    """
+    Returns the cutoffs of rolling-origin backtesting, oldest first: each fold is trained with the months
+    before its cutoff and forecasts the following ones. Windows expand by `step` months from fold to fold,
+    and the last one leaves out as many months as the longest horizon.
+    """
+    last = n_months - max(HORIZONS)
+
+    return [last - k * step for k in reversed(range(folds)) if last - k * step >= MIN_TRAIN_MONTHS]
+
+
+def pair_config(algorithm: str, df: DataFrame, trained: Optional[bytes]) -> Any:
+    """
+    Returns the hyperparameters every fold of an algorithm is fitted with: those of its trained model if any,
+    or those searched for the given data otherwise. It is meant to be run in a worker process.
+    """
+    alg = ALGORITHMS[algorithm]()
+
+    if trained:
+        return alg.model_config(pickle.loads(trained))
+
+    return alg.search_config(df)
+
+
+def fold_forecast(fold: Tuple[str, Any, DataFrame]) -> np.ndarray:
+    """
+    Given an (algorithm, hyperparameters, data) fold, fits the algorithm and forecasts the longest horizon.
+    It is meant to be run in a worker process.
+    """
+    algorithm, config, df = fold
+    alg = ALGORITHMS[algorithm]()
+
+    return alg.forecast_values(alg.fit_config(df, config), max(HORIZONS))
+
+
+def score(values: np.ndarray, fold_cutoffs: List[int], forecasts: List[Optional[np.ndarray]]) -> Dict[int, Score]:
+    """
+    Given the monthly values of a crop type and the forecasts of its folds, None for the folds that failed,
+    returns the errors of every horizon over the months ahead of each cutoff within it.
+    MAPE leaves out the months without yield, and it is None if every month lacks it.
+    """
+    scores = {}
+
+    for horizon in HORIZONS:
+        actual, predicted = [], []
+        for cutoff, forecast in zip(fold_cutoffs, forecasts):
+            if forecast is None or not np.isfinite(forecast[:horizon]).all():
+                continue
+            actual.append(values[cutoff : cutoff + horizon])
+            predicted.append(forecast[:horizon])
+
+        if not actual:
+            continue
+
+        errors = np.concatenate(actual) - np.concatenate(predicted)
+        actual_values = np.concatenate(actual)
+        nonzero = actual_values != 0
+        mape = float(np.mean(np.abs(errors[nonzero] / actual_values[nonzero])) * 100) if nonzero.any() else None
+
+        scores[horizon] = Score(
+            folds=len(actual),
+            mae=float(np.mean(np.abs(errors))),
+            mape=mape,
+            rmse=float(np.sqrt(np.mean(errors**2))),
+        )
+
+    return scores
@@ -0,0 +1,109 @@
+import time
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional
+
+from tropicalia.config import settings
+from tropicalia.database import has_prefix
+from tropicalia.models.dataset import CacheStats
+
+
+class CacheEntry(NamedTuple):
+    revision: str
+    content: bytes
+    media_type: str
+    expires: float
+
+
+class ResultCache:
+    """
+    In-process LRU cache of serialized responses, bounded by number of entries, total size and time to live.
+
+    Entries are keyed by crop type prefix and request parameters, and hold the revision of the prefix they
+    were computed from. An entry is only served while the revision is unchanged, so that writes made by
+    other processes are honoured too. Writes from this process also invalidate the entries right away.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, prefix: str, params: tuple, revision: str) -> Optional[CacheEntry]:
+        """
+        Returns the entry of the given prefix and parameters, if it is cached for the given revision.
+        """
+        key = (prefix, params)
+        entry = self.entries.get(key)
+
+        if entry is None or entry.revision != revision or entry.expires < time.monotonic():
+            if entry is not None:
+                self.remove(key)
+            self.misses += 1
+            return
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, prefix: str, params: tuple, revision: str, content: bytes, media_type: str) -> None:
+        """
+        Caches the content computed for the given prefix, parameters and revision, evicting the least
+        recently used entries to make room for it.
+        """
+        if len(content) > self.max_bytes or self.max_entries < 1:
+            return
+
+        key = (prefix, params)
+        if key in self.entries:
+            self.remove(key)
+
+        self.entries[key] = CacheEntry(revision, content, media_type, time.monotonic() + self.ttl)
+        self.size += len(content)
+
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def invalidate(self, crop_types: Iterable[str]) -> None:
+        """
+        Removes the entries of every prefix matching any of the given crop types.
+        """
+        crop_types = set(crop_types)
+        keys = [key for key in self.entries if any(has_prefix(crop, key[0]) for crop in crop_types)]
+
+        for key in keys:
+            self.remove(key)
+        self.invalidations += len(keys)
+
+    def remove(self, key: tuple) -> None:
+        """
+        Removes an entry given its key.
+        """
+        entry = self.entries.pop(key)
+        self.size -= len(entry.content)
+
+    def clear(self) -> None:
+        """
+        Removes every entry.
+        """
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self) -> CacheStats:
+        """
+        Returns the size and the counters of the cache.
+        """
+        return CacheStats(
+            entries=len(self.entries),
+            bytes=self.size,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            invalidations=self.invalidations,
+        )
+
+
+table_cache = ResultCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_MAX_BYTES, settings.CACHE_TTL)
@@ -21,6 +21,34 @@ class _Settings(BaseSettings):
 
     # Database settings
     DB_PATH = str(Path.home()) + "/.tropicalia/db.sqlite3"
+    DB_POOL_SIZE: int = 4
+    DB_BUSY_TIMEOUT: int = 5000
+    DB_CACHE_SIZE: int = 65536  # KiB of page cache of the writer connection
+
+    # Result cache settings
+    CACHE_MAX_ENTRIES: int = 256
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_TTL: int = 300  # seconds
+
+    # Training jobs settings
+    TRAIN_WORKERS: int = 2  # worker processes, that is, jobs training at once
+    GRID_WORKERS: int = 0  # processes of a SARIMA parameter search, 0 splits the cores among the training workers
+    GRID_FIT_TIMEOUT: float = 60  # seconds
+    SARIMA_SEARCH: str = "stepwise"  # or "grid"
+    STEPWISE_AIC_MARGIN: float = 0
+    REFRESH_MAX_MONTHS: int = 12  # new months a trained model is refreshed with, beyond them it is trained again
+    REFRESH_DRIFT_THRESHOLD: float = 3  # standard errors of the new months from the forecast deemed a drift
+
+    # Backtesting settings
+    BACKTEST_FOLDS: int = 12  # cutoffs evaluated per algorithm / crop type
+    BACKTEST_STEP: int = 1  # months between cutoffs
+    BACKTEST_WORKERS: int = 0  # processes fitting the folds, 0 for one per core
+
+    # Retraining scheduler settings
+    RETRAIN_ENABLED: bool = True  # retrain the trained algorithms of the crop types whose data changes
+    RETRAIN_DEBOUNCE: float = 300  # seconds without changes to the data of a crop type before retraining
+    RETRAIN_MAX_DELAY: float = 3600  # seconds a crop type whose data keeps changing waits at most
+    RETRAIN_REFRESH: bool = True  # refresh the trained algorithms instead of training them from scratch
 
     # DFS
     MINIO_HOST: str = "localhost"
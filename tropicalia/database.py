@@ -1,31 +1,224 @@
+import asyncio
+import re
+import string
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from functools import lru_cache
+from typing import AsyncIterator, Callable, List, Pattern, Sequence, Tuple, Type
+
 import aiosqlite
+from pydantic import BaseModel
 
 from tropicalia.config import settings
 from tropicalia.logger import get_logger
+from tropicalia.migrations import migrate
 
 logger = get_logger(__name__)
 
 
 class Database:
+    """
+    SQLite connection manager. It keeps a single writer connection, whose transactions are serialized,
+    and a pool of read-only connections which, thanks to WAL mode, do not block on the writer.
+    In-memory databases cannot be shared among connections, so the writer is used for reading too.
+    """
+
     client: aiosqlite.Connection = None
+    readers: asyncio.Queue = None
+    write_lock: asyncio.Lock = None
+
+    def __init__(self):
+        self.pool: List[aiosqlite.Connection] = []
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Borrows a read-only connection from the pool. Queries within the block read from the same snapshot.
+        """
+        if self.readers is None:
+            yield self.client
+            return
+
+        connection = await self.readers.get()
+        try:
+            await connection.execute("BEGIN")
+            yield connection
+        finally:
+            await connection.rollback()
+            self.readers.put_nowait(connection)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Acquires the writer connection. The block runs within its own transaction, which is committed
+        when the block succeeds and rolled back otherwise.
+        """
+        async with self.write_lock:
+            try:
+                yield self.client
+            except BaseException:
+                await self.client.rollback()
+                raise
+            else:
+                await self.client.commit()
 
 
 db = Database()
 
 
-async def create_db_connection(path: str = settings.DB_PATH) -> Database:
+async def connect(path: str, read_only: bool = False) -> aiosqlite.Connection:
+    """
+    Opens and configures a connection to the database.
+    """
+    connection = await aiosqlite.connect(path)
+    await connection.execute(f"PRAGMA busy_timeout = {settings.DB_BUSY_TIMEOUT}")
+    if read_only:
+        await connection.execute("PRAGMA query_only = ON")
+    return connection
+
+
+async def create_db_connection(path: str = settings.DB_PATH, pool_size: int = settings.DB_POOL_SIZE) -> Database:
     logger.debug("Connecting to the Database.")
-    db.client = await aiosqlite.connect(path)
+    db.client = await connect(path)
+    db.write_lock = asyncio.Lock()
+    # Bulk writes touch pages all over the uid index, which would not fit in the default 2 MiB cache.
+    await db.client.execute(f"PRAGMA cache_size = -{settings.DB_CACHE_SIZE}")
+
+    shared = path == ":memory:" or pool_size < 1
+    if not shared:
+        await db.client.execute("PRAGMA journal_mode = WAL")
+        await db.client.execute("PRAGMA synchronous = NORMAL")
+
+    await migrate(db.client)
+
+    if shared:
+        db.readers = None
+    else:
+        db.pool = [await connect(path, read_only=True) for _ in range(pool_size)]
+        db.readers = asyncio.Queue()
+        for connection in db.pool:
+            db.readers.put_nowait(connection)
+
     return db.client
 
 
 async def close_db_connection() -> None:
     logger.debug("Closing Database connection")
+    for connection in db.pool:
+        await connection.close()
     await db.client.close()
 
+    db.pool = []
+    db.readers = None
+    db.client = None
+
 
-async def get_connection() -> Database:
+async def get_connection() -> AsyncIterator[Database]:
+    """
+    Dependency providing a read-only connection from the pool for the duration of the request.
+    """
     if not db.client:
         logger.debug("Client not connected")
         await create_db_connection()
-    return db.client
+    async with db.read() as connection:
+        yield connection
+
+
+async def get_write_connection() -> AsyncIterator[Database]:
+    """
+    Dependency providing the writer connection for the duration of the request.
+    Writing requests are serialized and each one runs within its own transaction.
+    """
+    if not db.client:
+        logger.debug("Client not connected")
+        await create_db_connection()
+    async with db.write() as connection:
+        yield connection
+
+
+def prefix_range(column: str, prefix: str) -> Tuple[str, List[str]]:
+    """
+    Given a column and a prefix, returns the SQL predicate matching values starting with the prefix and its parameters.
+    As with `LIKE`, the case of ASCII letters is ignored and `%` and `_` are wildcards. SQLite answers the predicate
+    with an index range scan as long as the column has an index with the NOCASE collation.
+    """
+    if not prefix:
+        return "1 = 1", []
+
+    return f"{column} LIKE ?", [prefix + "%"]
+
+
+ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def fold_case(value: str) -> str:
+    """
+    Lowercases the ASCII letters of a value, the only ones whose case is ignored by `prefix_range`.
+    """
+    return value.translate(ASCII_LOWERCASE)
+
+
+@lru_cache(maxsize=1024)
+def prefix_pattern(prefix: str) -> Pattern:
+    """
+    Given a prefix, returns the regular expression matching the same values as `prefix_range`.
+    """
+    pattern = "".join(".*" if char == "%" else "." if char == "_" else re.escape(char) for char in prefix)
+    return re.compile(pattern, re.ASCII | re.IGNORECASE | re.DOTALL)
+
+
+def has_prefix(value: str, prefix: str) -> bool:
+    """
+    Whether the value starts with the prefix, as matched by `prefix_range`.
+    """
+    return prefix_pattern(prefix).match(value) is not None
+
+
+class PrefixIndex:
+    """
+    Looks up the values starting with a prefix, as matched by `prefix_range`. Values are sorted ignoring the case
+    of ASCII letters, so that those starting with a prefix without wildcards are found with a binary search.
+    """
+
+    def __init__(self, values: Sequence[str]):
+        self.values = list(values)
+        self.keys, self.positions = [], []
+        for key, position in sorted((fold_case(value), i) for i, value in enumerate(self.values)):
+            self.keys.append(key)
+            self.positions.append(position)
+
+    def find(self, prefix: str) -> List[int]:
+        """
+        Returns the positions of the values starting with the prefix, in order.
+        """
+        if "%" in prefix or "_" in prefix:
+            return [i for i, value in enumerate(self.values) if has_prefix(value, prefix)]
+        if not prefix:
+            return list(range(len(self.values)))
+
+        key = fold_case(prefix)
+        upper = key[:-1] + chr(ord(key[-1]) + 1)
+
+        return sorted(self.positions[bisect_left(self.keys, key) : bisect_left(self.keys, upper)])
+
+
+@lru_cache(maxsize=None)
+def row_factory(model: Type[BaseModel]) -> Callable[[Sequence], BaseModel]:
+    """
+    Given a model, returns a function building its instances from database rows, whose columns match the model
+    fields by position. Rows come from our own schema, so they are trusted: instances are built with `construct()`,
+    skipping validation, and only the ISO formatted dates and datetimes are parsed.
+    """
+    parsers = {date: date.fromisoformat, datetime: datetime.fromisoformat, bool: bool}
+    names = list(model.__fields__.keys())
+    dates = [(name, parsers[field.type_]) for name, field in model.__fields__.items() if field.type_ in parsers]
+
+    def build(row: Sequence) -> BaseModel:
+        values = dict(zip(names, row))
+        for name, parse in dates:
+            if values[name] is not None:
+                values[name] = parse(values[name])
+        return model.construct(**values)
+
+    return build
@@ -0,0 +1,24 @@
+import hashlib
+from typing import Optional
+
+
+def make_etag(revision: str, *params) -> str:
+    """
+    Given the revision of the data behind a response and the parameters of the request, returns the response ETag.
+    """
+    digest = hashlib.sha1(repr((revision,) + params).encode()).hexdigest()
+
+    return f'"{digest}"'
+
+
+def is_fresh(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Given the `If-None-Match` header of a request, returns whether the client already holds the response.
+    Tags are compared weakly, as for any `If-None-Match`.
+    """
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
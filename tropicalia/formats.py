@@ -0,0 +1,304 @@
+import csv
+import io
+from datetime import date
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import StreamingResponse
+from pandas import DataFrame
+
+from tropicalia.models.algorithm import Algorithm
+
+try:
+    import pyarrow as pa
+    from pyarrow import parquet
+except ImportError:
+    pa = parquet = None
+
+COLUMNAR_JSON = "application/vnd.tropicalia.columnar+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+CSV = "text/csv"
+PARQUET = "application/vnd.apache.parquet"
+
+DATASET_COLUMNS = ["uid", "date", "crop_type", "yield_values"]
+PREDICTION_COLUMNS = ["series", "date", "yield_values"]
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Given the `Accept` header of a request, returns the columnar media type it asks for, if any.
+    """
+    if not accept:
+        return
+    if ARROW_STREAM in accept:
+        return ARROW_STREAM
+    if COLUMNAR_JSON in accept:
+        return COLUMNAR_JSON
+
+
+def iso_dates(dates: pd.Series) -> List[str]:
+    """
+    Given a series of dates, either as strings or timestamps, returns them as ISO formatted strings.
+    """
+    return pd.to_datetime(dates).dt.strftime("%Y-%m-%d").tolist()
+
+
+def table_frames(df_daily: DataFrame, df_monthly: DataFrame) -> Tuple[DataFrame, DataFrame, List[int]]:
+    """
+    Given the daily rows and the monthly sums frames, lays out the data table as in `DatasetManager.get_table`.
+
+    Returns the months with any day, ordered by date, the days of every month one after another
+    and the offsets where the days of each month start and end.
+    """
+    df_daily = df_daily.assign(month=pd.to_datetime(df_daily["date"]).dt.strftime("%Y-%m"))
+    df_monthly = df_monthly.assign(month=pd.to_datetime(df_monthly["date"]).dt.strftime("%Y-%m"))
+    days_in_month = dict(iter(df_daily.groupby(["crop_type", "month"], sort=False)))
+
+    # Months outside of a page of daily data are left out.
+    df_monthly = df_monthly.sort_values("date", kind="mergesort")
+    df_monthly = df_monthly.loc[[key in days_in_month for key in zip(df_monthly["crop_type"], df_monthly["month"])]]
+
+    children = [days_in_month[key] for key in zip(df_monthly["crop_type"], df_monthly["month"])]
+    offsets = [0]
+    for days in children:
+        offsets.append(offsets[-1] + len(days))
+    df_days = pd.concat(children) if children else df_daily.iloc[0:0]
+
+    return df_monthly, df_days, offsets
+
+
+def table_columns(df_daily: DataFrame, df_monthly: DataFrame) -> dict:
+    """
+    Given the daily rows and the monthly sums frames, returns the data table laid out by columns.
+    The days of each month are laid out by columns too.
+    """
+    df_monthly, df_days, offsets = table_frames(df_daily, df_monthly)
+
+    uids, dates, yield_values = df_days["uid"].tolist(), iso_dates(df_days["date"]), df_days["yield_values"].tolist()
+    children = [
+        {"uid": uids[start:end], "date": dates[start:end], "yield_values": yield_values[start:end]}
+        for start, end in zip(offsets, offsets[1:])
+    ]
+
+    return {
+        "date": iso_dates(df_monthly["date"]),
+        "crop_type": df_monthly["crop_type"].tolist(),
+        "yield_values": df_monthly["yield_values"].tolist(),
+        "children": children,
+    }
+
+
+def table_arrow(df_daily: DataFrame, df_monthly: DataFrame) -> bytes:
+    """
+    Given the daily rows and the monthly sums frames, returns the data table as an Arrow IPC stream.
+    The days of each month are a list of structs.
+    """
+    df_monthly, df_days, offsets = table_frames(df_daily, df_monthly)
+
+    days = pa.StructArray.from_arrays(
+        [
+            pa.array(df_days["uid"].tolist(), type=pa.string()),
+            pa.array(pd.to_datetime(df_days["date"]).dt.date.tolist(), type=pa.date32()),
+            pa.array(df_days["yield_values"].tolist(), type=pa.float64()),
+        ],
+        names=["uid", "date", "yield_values"],
+    )
+    table = pa.table(
+        {
+            "date": pa.array(pd.to_datetime(df_monthly["date"]).dt.date.tolist(), type=pa.date32()),
+            "crop_type": pa.array(df_monthly["crop_type"].tolist(), type=pa.string()),
+            "yield_values": pa.array(df_monthly["yield_values"].tolist(), type=pa.float64()),
+            "children": pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()), days),
+        }
+    )
+
+    return to_ipc(table)
+
+
+def series_columns(df: DataFrame) -> dict:
+    """
+    Given a series frame, with the dates and the yield values as its first two columns, returns it laid out by columns.
+    """
+    return {"date": iso_dates(df.iloc[:, 0]), "yield_values": df.iloc[:, 1].astype(float).tolist()}
+
+
+def prediction_columns(ly_data: DataFrame, pred: DataFrame, fc: DataFrame, algorithm: Algorithm) -> dict:
+    """
+    Given the frames of a prediction, returns it as in `AlgorithmManager.df_to_model`,
+    with each series laid out by columns.
+    """
+    return {
+        "uid": algorithm.uid,
+        "algorithm": algorithm.algorithm,
+        "crop_type": algorithm.crop_type,
+        "last_date": str(algorithm.last_date),
+        "last_year_data": series_columns(ly_data),
+        "prediction": series_columns(pred),
+        "forecast": series_columns(fc),
+    }
+
+
+def batch_prediction_columns(algorithm: Algorithm, series: Dict[str, Tuple[List[date], List[float]]]) -> dict:
+    """
+    Given a prediction of `AlgorithmManager.predict_batch_series`, returns it as `prediction_columns` does.
+    """
+    columns = {
+        name: {"date": [row_date.isoformat() for row_date in dates], "yield_values": values}
+        for name, (dates, values) in series.items()
+    }
+
+    return {
+        "uid": algorithm.uid,
+        "algorithm": algorithm.algorithm,
+        "crop_type": algorithm.crop_type,
+        "last_date": str(algorithm.last_date),
+        **columns,
+    }
+
+
+def prediction_rows(ly_data: DataFrame, pred: DataFrame, fc: DataFrame) -> List[tuple]:
+    """
+    Given the frames of a prediction, returns a (series, date, yield_values) row per date of each series.
+    """
+    series = {"last_year_data": ly_data, "prediction": pred, "forecast": fc}
+
+    rows = []
+    for name, df in series.items():
+        dates = pd.to_datetime(df.iloc[:, 0]).dt.date.tolist()
+        rows += zip([name] * len(df), dates, df.iloc[:, 1].astype(float).tolist())
+
+    return rows
+
+
+def prediction_arrow(ly_data: DataFrame, pred: DataFrame, fc: DataFrame, algorithm: Algorithm) -> bytes:
+    """
+    Given the frames of a prediction, returns it as an Arrow IPC stream with a row per date of each series,
+    which is named in the `series` column. The algorithm info is stored in the schema metadata.
+    """
+    schema = arrow_schema(PREDICTION_COLUMNS)
+    table = rows_to_table(prediction_rows(ly_data, pred, fc), schema)
+    table = table.replace_schema_metadata(
+        {
+            "uid": algorithm.uid,
+            "algorithm": algorithm.algorithm,
+            "crop_type": algorithm.crop_type,
+            "last_date": str(algorithm.last_date),
+        }
+    )
+
+    return to_ipc(table)
+
+
+def to_ipc(table: "pa.Table") -> bytes:
+    """
+    Serializes an Arrow table as an IPC stream.
+    """
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_schema(columns: List[str]) -> "pa.Schema":
+    """
+    Given the exported columns, returns their Arrow schema.
+    """
+    types = {"date": pa.date32(), "yield_values": pa.float64()}
+
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+
+def rows_to_table(rows: List[tuple], schema: "pa.Schema") -> "pa.Table":
+    """
+    Given a list of rows, returns them as an Arrow table. Dates may be either ISO formatted strings or dates.
+    """
+    columns = list(zip(*rows)) or [[] for _ in schema]
+    arrays = [
+        pa.array(np.array(values, dtype="datetime64[D]") if field.type == pa.date32() else values, type=field.type)
+        for field, values in zip(schema, columns)
+    ]
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ChunkSink:
+    """
+    Write-only file which holds what is written to it until it is popped, so that a file can be streamed
+    while it is being written.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def csv_stream(columns: List[str], chunks: AsyncIterator[List[tuple]]) -> AsyncIterator[bytes]:
+    """
+    Given the columns and the chunks of rows of a table, streams it as CSV, a chunk at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    async for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Only the header is left when there are no rows.
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def parquet_stream(columns: List[str], chunks: AsyncIterator[List[tuple]]) -> AsyncIterator[bytes]:
+    """
+    Given the columns and the chunks of rows of a table, streams it as Parquet, with a row group per chunk.
+    """
+    schema = arrow_schema(columns)
+    sink = ChunkSink()
+
+    with pa.PythonFile(sink, mode="w") as file, parquet.ParquetWriter(file, schema) as writer:
+        async for rows in chunks:
+            writer.write_table(rows_to_table(rows, schema))
+            yield sink.pop()
+
+    yield sink.pop()
+
+
+def export_response(
+    columns: List[str], chunks: AsyncIterator[List[tuple]], file_format: str, filename: str
+) -> StreamingResponse:
+    """
+    Given the columns and the chunks of rows of a table, returns a response streaming it as a CSV or Parquet file.
+    """
+    if file_format == "parquet":
+        content, media_type = parquet_stream(columns, chunks), PARQUET
+    else:
+        content, media_type = csv_stream(columns, chunks), CSV
+
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{file_format}"'}
+
+    return StreamingResponse(content, media_type=media_type, headers=headers)
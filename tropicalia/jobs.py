@@ -0,0 +1,280 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from enum import Enum
+from multiprocessing.connection import Connection, wait
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from tropicalia.config import settings
+from tropicalia.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Environment variables bounding the threads of the BLAS / OpenMP runtimes numpy and scipy may be linked against.
+BLAS_THREADS_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+
+class JobStatus(Enum):
+    """
+    Enumeration of the states of a training job
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Workers:
+    """
+    Pool of worker processes where models are fitted, so that training does not block the event loop.
+    Jobs take a slot before running, so at most as many jobs as workers run at once and the rest wait as pending.
+    Workers are spawned rather than forked, as the API process holds the threads of the database connections.
+    """
+
+    executor: ProcessPoolExecutor = None
+    slots: asyncio.Semaphore = None
+
+    def __init__(self):
+        self.size = 0
+        self.tasks: Set[asyncio.Future] = set()
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        Runs a picklable function in a worker process. If the workers are not started, it runs in a thread instead.
+        A pool whose worker died abruptly (e.g. killed for running out of memory) cannot be used anymore,
+        so it is replaced before raising.
+        """
+        loop = asyncio.get_event_loop()
+        executor = self.executor
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            if executor is not None and executor is self.executor:
+                logger.warning("A training worker died abruptly, restarting the pool of workers")
+                executor.shutdown(wait=False)
+                self.executor = self.new_executor()
+            raise
+
+    def new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.size, mp_context=multiprocessing.get_context("spawn"))
+
+    def spawn(self, job: Awaitable) -> asyncio.Future:
+        """
+        Runs a job in the background, keeping a reference to it until it is done.
+        """
+        task = asyncio.ensure_future(job)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+
+workers = Workers()
+
+
+async def start_workers(size: int = settings.TRAIN_WORKERS) -> Optional[ProcessPoolExecutor]:
+    logger.debug(f"Starting {size} training workers.")
+    workers.size = size
+    workers.executor = workers.new_executor()
+    workers.slots = asyncio.Semaphore(size)
+
+    return workers.executor
+
+
+async def stop_workers() -> None:
+    """
+    Cancels the running jobs, which are left unfinished in the DB to be resumed on the next startup.
+    """
+    logger.debug("Stopping training workers")
+    for task in list(workers.tasks):
+        task.cancel()
+    await asyncio.gather(*workers.tasks, return_exceptions=True)
+
+    if workers.executor:
+        workers.executor.shutdown(wait=False)
+
+    workers.executor = None
+    workers.slots = None
+
+
+def timed(fn: Callable, *args) -> Tuple[Any, float]:
+    """
+    Calls a function, so that the time it took can be told apart from the time spent waiting for a worker.
+
+    Returns its result and the elapsed seconds.
+    """
+    start = time.perf_counter()
+    result = fn(*args)
+
+    return result, time.perf_counter() - start
+
+
+@contextmanager
+def blas_threads(n_threads: int) -> Iterator[None]:
+    """
+    Bounds the BLAS threads of the processes started within the block. Runtimes read these variables
+    when they are loaded, so they have to be in the environment the processes are spawned with.
+    """
+    previous = {var: os.environ.get(var) for var in BLAS_THREADS_VARS}
+    os.environ.update({var: str(n_threads) for var in BLAS_THREADS_VARS})
+    try:
+        yield
+    finally:
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def map_worker(fn: Callable, connection: Connection) -> None:
+    """
+    Worker loop of `ProcessMap`: once loaded, it applies the function to the items it receives until it gets `None`.
+    """
+    connection.send(None)
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        index, item = task
+        try:
+            connection.send((index, fn(item), None))
+        except Exception as err:
+            connection.send((index, None, f"{type(err).__name__}: {err}"))
+
+
+class ProcessMap:
+    """
+    Pool of spawned processes applying a picklable function to items, each process with a single BLAS thread,
+    so that the pool does not oversubscribe the cores. Unlike `ProcessPoolExecutor`, a call running for longer
+    than `timeout` seconds is killed along with its process, which is replaced. Processes are kept loaded
+    between calls to `map` until the pool is closed.
+    """
+
+    def __init__(self, fn: Callable, processes: int, timeout: float):
+        self.fn = fn
+        self.processes = processes
+        self.timeout = timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.procs: Dict[Connection, multiprocessing.Process] = {}
+        # Processes are only given items once they are loaded, so that the time to spawn them
+        # does not count towards the timeout.
+        self.starting: Set[Connection] = set()
+        self.idle: List[Connection] = []
+
+    def __enter__(self) -> "ProcessMap":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def map(self, items: Iterable) -> List[Tuple[Any, Optional[str]]]:
+        """
+        Applies the function to every item.
+
+        Returns a list of (result, error) tuples in the order of the items.
+        """
+        items = list(items)
+        results: List[Tuple[Any, Optional[str]]] = [(None, None)] * len(items)
+        pending = list(reversed(range(len(items))))
+        # Item every process is running and its deadline.
+        running: Dict[Connection, Tuple[int, float]] = {}
+
+        def dispatch(connection: Connection) -> None:
+            if pending:
+                index = pending.pop()
+                connection.send((index, items[index]))
+                running[connection] = (index, time.monotonic() + self.timeout)
+            else:
+                self.idle.append(connection)
+
+        while len(self.procs) < min(self.processes, len(items)):
+            self.start()
+        idle, self.idle = self.idle, []
+        for connection in idle:
+            dispatch(connection)
+
+        while running or (self.starting and pending):
+            deadline = min((task[1] for task in running.values()), default=None)
+            wait_timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+
+            for connection in wait([*running, *self.starting], wait_timeout):
+                try:
+                    message = connection.recv()
+                except EOFError:
+                    # A process dying while loading would die again, so it is only replaced if it was running.
+                    if connection in running:
+                        results[running.pop(connection)[0]] = (None, "Worker process died")
+                        if pending:
+                            self.start()
+                    self.stop(connection)
+                    continue
+                if connection in self.starting:
+                    self.starting.discard(connection)
+                else:
+                    index, result, error = message
+                    results[index] = (result, error)
+                    del running[connection]
+                dispatch(connection)
+
+            now = time.monotonic()
+            for connection, (index, task_deadline) in list(running.items()):
+                if task_deadline <= now:
+                    logger.debug(f"Item {index} has timed out after {self.timeout} s, its process is killed")
+                    results[index] = (None, "Timeout")
+                    del running[connection]
+                    self.stop(connection)
+                    if pending:
+                        self.start()
+
+        for index in pending:
+            results[index] = (None, "Worker processes could not be started")
+
+        return results
+
+    def start(self) -> None:
+        connection, child = self.context.Pipe()
+        with blas_threads(1):
+            proc = self.context.Process(target=map_worker, args=(self.fn, child), daemon=True)
+            proc.start()
+        child.close()
+        self.procs[connection] = proc
+        self.starting.add(connection)
+
+    def stop(self, connection: Connection) -> None:
+        self.procs.pop(connection).terminate()
+        self.starting.discard(connection)
+        connection.close()
+
+    def close(self) -> None:
+        """
+        Stops every process.
+        """
+        for connection in self.procs:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for connection, proc in self.procs.items():
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.terminate()
+            connection.close()
+
+        self.procs = {}
+        self.starting = set()
+        self.idle = []
+
+
+def map_in_processes(fn: Callable, items: Iterable, processes: int, timeout: float) -> List[Tuple[Any, Optional[str]]]:
+    """
+    Applies a picklable function to every item in a `ProcessMap` closed afterwards.
+
+    Returns a list of (result, error) tuples in the order of the items.
+    """
+    with ProcessMap(fn, processes, timeout) as pool:
+        return pool.map(items)
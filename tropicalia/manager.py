@@ -1,30 +1,68 @@
+import asyncio
 import json
+import os
 import pickle
-from datetime import datetime
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from datetime import date, datetime
 from secrets import token_hex
+from typing import IO, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
 from pydantic.main import BaseModel
 from pandas import DataFrame
 
-from tropicalia.algorithm import AlgorithmStack, MLAlgorithm, Prophet, SARIMA
-from tropicalia.database import Database
+from tropicalia.algorithm import ALGORITHMS, MLAlgorithm, SeriesFit, refresh_algorithm, train_algorithm
+from tropicalia.backtest import cutoffs, fold_forecast, pair_config, score
+from tropicalia.cache import table_cache
+from tropicalia.config import settings
+from tropicalia.database import Database, PrefixIndex, db, has_prefix, prefix_range, row_factory
+from tropicalia.formats import parquet
+from tropicalia.jobs import JobStatus, map_in_processes, start_workers, timed, workers
 from tropicalia.logger import get_logger
-from tropicalia.models.algorithm import Algorithm, AlgorithmPrediction
-from tropicalia.models.dataset import Dataset, DatasetRow, MonthRow, TableDataset
+from tropicalia.models.algorithm import (
+    Algorithm,
+    AlgorithmFlights,
+    AlgorithmMetrics,
+    AlgorithmPrediction,
+    BatchTraining,
+    Job,
+    PairTraining,
+)
+from tropicalia.models.dataset import Dataset, DatasetRow, ImportReport, MonthRow, TableDataset
+from tropicalia.scheduler import scheduler
+from tropicalia.singleflight import SingleFlight
 from tropicalia.storage.backend.minio import MinIOStorage
 
 logger = get_logger(__name__)
 
+# SQLite builds prior to 3.32 limit the number of host parameters per statement to 999.
+MAX_PARAMS = 500
 
-async def execute(query: str, model: BaseModel, db: Database, commit: bool = True) -> BaseModel:
+# Detail of the trainings which could not refresh the previously trained algorithm.
+NOT_REFRESHED = "Trained from scratch, as the previous model could not be refreshed"
+
+# Number of rows fetched at once from the database when streaming.
+STREAM_CHUNK_SIZE = 1000
+
+# Number of rows parsed, validated and written at once when importing a file.
+IMPORT_CHUNK_SIZE = 50000
+
+# Number of rows fetched from the database and written at once when exporting a file.
+EXPORT_CHUNK_SIZE = 10000
+
+
+async def execute(query: str, model: BaseModel, db: Database, commit: bool = True, params: list = None) -> BaseModel:
     """
-    Given the database it executes the specified query and returns the result.
+    Given the database it executes the specified query, bound to `params` if given, and returns the result.
     Only for single-row involving queries.
     """
     try:
-        res = await db.execute(query)
+        res = await db.execute(query, params)
         row = await res.fetchall()
     except Exception as err:
         logger.debug(err)
@@ -34,17 +72,25 @@ async def execute(query: str, model: BaseModel, db: Database, commit: bool = Tru
         await db.commit()
 
     if row:
-        row_dict = {key: row[0][t] for t, key in enumerate(model.__fields__.keys())}
-        return model(**row_dict)
-
-
-async def execute_upsert(query: str, res_query: str, model: BaseModel, db: Database, commit: bool = True) -> BaseModel:
+        return row_factory(model)(row[0])
+
+
+async def execute_upsert(
+    query: str,
+    res_query: str,
+    model: BaseModel,
+    db: Database,
+    commit: bool = True,
+    params: list = None,
+    res_params: list = None,
+) -> BaseModel:
     """
     Given the database it executes the query and returns the inserted/updated row.
+    The queries are bound to `params` and `res_params` if given.
     """
     try:
-        await db.execute(query)
-        res = await db.execute(res_query)
+        await db.execute(query, params)
+        res = await db.execute(res_query, res_params)
         row = await res.fetchall()
     except Exception as err:
         logger.debug(err)
@@ -54,8 +100,7 @@ async def execute_upsert(query: str, res_query: str, model: BaseModel, db: Datab
         await db.commit()
 
     if row:
-        row_dict = {key: row[0][t] for t, key in enumerate(model.__fields__.keys())}
-        return model(**row_dict)
+        return row_factory(model)(row[0])
 
 
 class DatasetManager:
@@ -63,79 +108,303 @@ class DatasetManager:
     Class implementing the user's interaction with the dataset
     """
 
-    async def get(self, crop_type: str, current_user: str, db: Database) -> Dataset:
+    async def get(
+        self,
+        crop_type: str,
+        current_user: str,
+        db: Database,
+        start_date: date = None,
+        end_date: date = None,
+        limit: int = None,
+        after_crop_type: str = None,
+        after_date: date = None,
+        after_uid: str = None,
+    ) -> Dataset:
         """
-        Retrieves specified data from the dataset in the database.
+        Retrieves specified data from the dataset in the database, ordered by crop type, date and id.
+        Results can be bounded to a date range and paged with `limit`, resuming after the
+        (`after_crop_type`, `after_date`, `after_uid`) cursor of the last row of the previous page.
         """
         logger.debug(f"User {current_user} has requested {crop_type} from the DB")
 
-        wildcard = crop_type + "%"
-        query = f"""
-            SELECT uid, date, crop_type, yield_values
-            FROM dataset
-            WHERE LIKE('{wildcard}', crop_type)
-        """
-        res = await db.execute(query)
+        query, params = self.select_query(
+            crop_type, start_date, end_date, limit, after_crop_type, after_date, after_uid
+        )
+        res = await db.execute(query, params)
         data = await res.fetchall()
-        rows = []
-        for r in range(len(data)):
-            rows.append({key: data[r][t] for t, key in enumerate(DatasetRow.__fields__.keys())})
 
-        dataset_rows = [DatasetRow(**row) for row in rows]
+        dataset_rows = list(map(row_factory(DatasetRow), data))
 
-        return Dataset(data=dataset_rows)
+        return Dataset.construct(data=dataset_rows)
 
-    async def upsert(self, row: DatasetRow, current_user: str, db: Database, commit: bool = True) -> DatasetRow:
+    def select_query(
+        self,
+        crop_type: str,
+        start_date: date = None,
+        end_date: date = None,
+        limit: int = None,
+        after_crop_type: str = None,
+        after_date: date = None,
+        after_uid: str = None,
+    ) -> Tuple[str, list]:
         """
-        Inserts or updates a row in the database given its id.
+        Builds the query selecting the dataset rows of a crop type prefix, and its parameters.
+
+        Crop types are looked up in the monthly aggregate, so that every crop type is read with an index
+        seek on (crop_type, date) and the date range is pushed down. The rows after the cursor are split into
+        the rest of the cursor's crop type and the following crop types, so that a page is read in O(page).
         """
-        logger.debug(f"User {current_user} has requested an update to the DB")
+        predicate, prefix_params = prefix_range("crop_type", crop_type)
+
+        date_filter, date_params = "", []
+        if start_date:
+            date_filter += " AND date >= ?"
+            date_params.append(str(start_date))
+        if end_date:
+            date_filter += " AND date <= ?"
+            date_params.append(str(end_date))
 
-        row_in_db = await self.find_one(row.uid, db)
+        columns = "SELECT uid, date, crop_type, yield_values FROM dataset"
+        # `IN` ignores repeated crop types, so they are not made distinct, which would take a temporary B-tree.
+        crop_types = f"SELECT crop_type FROM dataset_monthly WHERE {predicate}"
 
-        if row_in_db:
+        if after_crop_type is not None and after_date is not None and after_uid is not None:
             query = f"""
-                UPDATE dataset
-                SET (date, crop_type, yield_values) =
-                ('{row.date}', '{row.crop_type}', '{row.yield_values}')
-                WHERE uid = '{row.uid}'
+                {columns}
+                WHERE crop_type = ? AND (date, uid) > (?, ?) AND {predicate}{date_filter}
+                UNION ALL
+                {columns}
+                WHERE crop_type IN ({crop_types} AND crop_type > ?){date_filter}
             """
+            cursor_params = [after_crop_type, str(after_date), after_uid]
+            params = cursor_params + prefix_params + date_params + prefix_params + [after_crop_type] + date_params
         else:
             query = f"""
-                INSERT INTO dataset (uid, date, crop_type, yield_values)
-                VALUES ('{row.uid}', '{row.date}', '{row.crop_type}', '{row.yield_values}')
+                {columns}
+                WHERE crop_type IN ({crop_types}){date_filter}
             """
+            params = prefix_params + date_params
 
-        res_query = f"""
-            SELECT * FROM dataset WHERE uid = '{row.uid}'
+        query += " ORDER BY crop_type, date, uid LIMIT ?"
+        params.append(-1 if limit is None else limit)
+
+        return query, params
+
+    async def get_revision(self, crop_type: str, db: Database) -> str:
+        """
+        Returns the revision of the data of a crop type prefix. It changes whenever a day or a trained algorithm
+        of any of its crop types does, and when a crop type starts matching the prefix.
+        """
+        predicate, params = prefix_range("crop_type", crop_type)
+        query = f"""
+            SELECT crop_type, revision
+            FROM crop_revision
+            WHERE {predicate}
+            ORDER BY crop_type
         """
-        res = await execute_upsert(query, res_query, DatasetRow, db, commit)
+        res = await db.execute(query, params)
+        data = await res.fetchall()
+
+        return ",".join(f"{crop}:{revision}" for crop, revision in data)
+
+    async def upsert(self, row: DatasetRow, current_user: str, db: Database, commit: bool = True) -> DatasetRow:
+        """
+        Inserts or updates a row in the database given its id.
+        """
+        rows_in_db = await self.upsert_many([row], current_user, db, commit)
+
+        if rows_in_db:
+            return rows_in_db[0]
 
-        row_in_db = await self.find_one(res.uid, db)
-        row.uid = row_in_db.uid
+    async def upsert_many(
+        self, rows: List[DatasetRow], current_user: str, db: Database, commit: bool = True
+    ) -> List[DatasetRow]:
+        """
+        Inserts or updates a batch of rows in the database given their ids.
+        The whole batch is written within a single transaction and the stored rows are read back at once.
+        """
+        logger.debug(f"User {current_user} has requested an update of {len(rows)} rows to the DB")
+
+        for row in rows:
+            if not row.uid:
+                row.uid = token_hex(8)
+
+        records = [(row.uid, str(row.date), row.crop_type, row.yield_values) for row in rows]
+
+        try:
+            await self.write_rows(records, db)
+            rows_in_db = await self.find_many([row.uid for row in rows], db)
+        except Exception as err:
+            logger.debug(err)
+            await db.rollback()
+            return
+
+        if commit:
+            await db.commit()
 
-        if row_in_db == row:
-            return row_in_db
+        # If a uid is repeated within the batch, the last occurrence is the one stored.
+        expected = {row.uid: row for row in rows}
+        stored = {row.uid: row for row in rows_in_db}
+
+        if stored == expected:
+            return [stored[row.uid] for row in rows]
+
+    async def write_rows(self, records: List[tuple], db: Database) -> None:
+        """
+        Writes (uid, date, crop_type, yield_values) records with a single `executemany` statement.
+        Existing uids are updated in place and the cached tables of their crop types are invalidated.
+        It does not commit.
+        """
+        query = """
+            INSERT INTO dataset (uid, date, crop_type, yield_values)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(uid) DO UPDATE SET
+                date = excluded.date,
+                crop_type = excluded.crop_type,
+                yield_values = excluded.yield_values
+        """
+        await db.executemany(query, records)
+
+        table_cache.invalidate(record[2] for record in records)
+        scheduler.notify()
+
+    async def import_file(
+        self,
+        file: IO,
+        file_format: str,
+        current_user: str,
+        db: Database,
+        commit: bool = True,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+    ) -> ImportReport:
+        """
+        Inserts or updates the rows of a CSV or Parquet file with `uid`, `date`, `crop_type` and `yield_values` columns.
+        The file is parsed and validated in chunks, off the event loop, and every chunk is written within
+        the same transaction, so memory usage does not depend on the file size and a file is imported as a whole.
+
+        Raises a ValueError if the file is malformed or holds invalid rows.
+        """
+        logger.debug(f"User {current_user} has requested a {file_format} import to the DB")
+
+        start = time.perf_counter()
+        rows = 0
+        chunks = self.read_chunks(file, file_format, chunk_size)
+        try:
+            while True:
+                df = await run_in_threadpool(next, chunks, None)
+                if df is None:
+                    break
+                records = await run_in_threadpool(self.validate_chunk, df, rows)
+                await self.write_rows(records, db)
+                rows += len(records)
+        except ValueError:
+            await db.rollback()
+            raise
+        except Exception as err:
+            logger.debug(err)
+            await db.rollback()
+            return
+        finally:
+            chunks.close()
+
+        if commit:
+            await db.commit()
+
+        seconds = time.perf_counter() - start
+        logger.debug(f"Imported {rows} rows in {seconds:.2f} seconds")
+
+        return ImportReport(rows=rows, seconds=seconds, rows_per_second=rows / seconds if seconds else 0.0)
+
+    def read_chunks(self, file: IO, file_format: str, chunk_size: int) -> Iterator[DataFrame]:
+        """
+        Given a CSV or Parquet file, yields its rows as DataFrames of up to `chunk_size` rows.
+        """
+        if file_format == "csv":
+            with pd.read_csv(file, chunksize=chunk_size, dtype={"uid": str, "crop_type": str}) as reader:
+                yield from reader
+        elif file_format == "parquet":
+            if parquet is None:
+                raise ValueError("Parquet files are not supported")
+            for batch in parquet.ParquetFile(file).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+        else:
+            raise ValueError(f"Unknown file format: {file_format}")
+
+    def validate_chunk(self, df: DataFrame, offset: int = 0) -> List[tuple]:
+        """
+        Given a chunk of rows, validates them as a whole and returns them as (uid, date, crop_type, yield_values)
+        records. Rows without a uid are given a new one.
+
+        Raises a ValueError naming the invalid rows, counted from 1 along the whole file.
+        """
+        missing = [column for column in ("date", "crop_type", "yield_values") if column not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+        dates = pd.to_datetime(df["date"], errors="coerce")
+        yield_values = pd.to_numeric(df["yield_values"], errors="coerce")
+        crop_types = df["crop_type"]
+
+        invalid = dates.isna() | yield_values.isna() | crop_types.isna() | (crop_types.astype(str).str.len() == 0)
+        if invalid.any():
+            positions = (invalid.to_numpy().nonzero()[0][:10] + offset + 1).tolist()
+            raise ValueError(f"Invalid rows: {', '.join(map(str, positions))}")
+
+        if "uid" in df.columns:
+            uids = df["uid"].astype(object).where(df["uid"].notna(), None).tolist()
+        else:
+            uids = [None] * len(df)
+        uids = [token_hex(8) if uid is None or uid == "" else str(uid) for uid in uids]
+
+        return list(
+            zip(uids, dates.dt.strftime("%Y-%m-%d"), crop_types.astype(str), yield_values.astype(float).tolist())
+        )
 
     async def delete(self, row: DatasetRow, current_user: str, db: Database, commit: bool = True) -> DatasetRow:
         """
         Deletes a dataset entry in the database given its id.
         """
-        logger.debug(f"User {current_user} has requested a row delete to the DB")
+        deleted_rows = await self.delete_many([row], current_user, db, commit)
 
-        row_in_db = await self.find_one(row.uid, db)
+        if deleted_rows:
+            return row
 
-        if row_in_db:
-            query = f"""
-                DELETE FROM dataset
-                WHERE uid = '{row.uid}'
-            """
-            await execute(query, DatasetRow, db, commit)
+    async def delete_many(
+        self, rows: List[DatasetRow], current_user: str, db: Database, commit: bool = True
+    ) -> List[DatasetRow]:
+        """
+        Deletes a batch of dataset entries in the database given their ids, returning the stored rows actually removed.
+        Ids are deleted with set-based statements in chunks, within the transaction of the connection.
+        """
+        logger.debug(f"User {current_user} has requested a delete of {len(rows)} rows to the DB")
 
-            row_in_db = await self.find_one(row.uid, db)
+        uids = list(dict.fromkeys(row.uid for row in rows if row.uid))
 
-            if not row_in_db:
-                return row
+        try:
+            rows_in_db = await self.find_many(uids, db)
+            removed = 0
+            for i in range(0, len(uids), MAX_PARAMS):
+                chunk = uids[i : i + MAX_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                res = await db.execute(f"DELETE FROM dataset WHERE uid IN ({placeholders})", chunk)
+                removed += res.rowcount
+        except Exception as err:
+            logger.debug(err)
+            await db.rollback()
+            return
+
+        if removed != len(rows_in_db):
+            logger.debug(f"{removed} rows were deleted instead of {len(rows_in_db)}")
+            await db.rollback()
+            return
+
+        table_cache.invalidate(row.crop_type for row in rows_in_db)
+        scheduler.notify()
+
+        if commit:
+            await db.commit()
+
+        return rows_in_db
 
     async def find_one(self, uid: int, db: Database) -> DatasetRow:
         """
@@ -150,75 +419,374 @@ class DatasetManager:
 
         return row
 
+    async def find_many(self, uids: List[str], db: Database) -> List[DatasetRow]:
+        """
+        Find the dataset entries in the database given their ids.
+        Ids are queried in chunks to stay below SQLite's host parameter limit.
+        """
+        uids = list(dict.fromkeys(uids))
+        rows = []
+        for i in range(0, len(uids), MAX_PARAMS):
+            chunk = uids[i : i + MAX_PARAMS]
+            placeholders = ", ".join("?" * len(chunk))
+            query = f"""
+                SELECT uid, date, crop_type, yield_values
+                FROM dataset
+                WHERE uid IN ({placeholders})
+            """
+            res = await db.execute(query, chunk)
+            data = await res.fetchall()
+            rows.extend(map(row_factory(DatasetRow), data))
+
+        return rows
+
     async def commit(self, db: Database):
         """
         Given the order, commits the current changes to the DB
         """
         await db.commit()
 
-    def get_table(self, daily_data: Dataset) -> TableDataset:
+    def get_table(self, daily_data: Dataset, monthly_data: Dataset) -> TableDataset:
         """
-        Given a daily data history, groups the data per month and returns a JSON object
+        Given a daily data history and its monthly sums, returns a JSON object
         with each month having the month's days as children.
         """
-        monthly_data = self.get_monthly(daily_data).data
-        monthly_data = list(map(lambda row: row.dict(), monthly_data))
-        map(lambda row: row.pop("uid", None), monthly_data)
+        days_in_month = defaultdict(list)
+        for row in daily_data.data:
+            day = row.dict()
+            days_in_month[(day["crop_type"], day["date"].year, day["date"].month)].append(day)
+
+        dataset_rows = []
+        for row in sorted(monthly_data.data, key=lambda row: row.date):
+            children = days_in_month.get((row.crop_type, row.date.year, row.date.month))
+            # Months outside of a page of daily data are left out.
+            if not children:
+                continue
+            month_data = row.dict(exclude={"uid"})
+            month_data["children"] = children
+            dataset_rows.append(MonthRow.construct(**month_data))
+
+        return TableDataset.construct(data=dataset_rows)
+
+    async def stream_table(
+        self,
+        crop_type: str,
+        current_user: str,
+        db: Database,
+        start_date: date = None,
+        end_date: date = None,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+    ) -> AsyncIterator[str]:
+        """
+        Streams the data table as newline-delimited JSON, one month with its days as children per line.
+        Rows are fetched in chunks and months are emitted as soon as they are complete, so memory usage
+        does not depend on the history length. Months are ordered by crop type and then by date.
+        """
+        logger.debug(f"User {current_user} has requested a {crop_type} stream from the DB")
+
+        # The months at the ends of the date range may be missing some of their days, so their sums are read
+        # from the monthly aggregate, as they are in the data table.
+        months = sorted({str(day.replace(day=1)) for day in (start_date, end_date) if day})
+        month_sums = {}
+        if months:
+            predicate, params = prefix_range("crop_type", crop_type)
+            query = f"""
+                SELECT crop_type, month, yield_values
+                FROM dataset_monthly
+                WHERE {predicate} AND month IN ({", ".join("?" * len(months))})
+            """
+            res = await db.execute(query, params + months)
+            month_sums = {(crop, month[:7]): yield_values for crop, month, yield_values in await res.fetchall()}
+
+        query, params = self.select_query(crop_type, start_date, end_date)
+        res = await db.execute(query, params)
+
+        month_key, children = None, []
+        while True:
+            data = await res.fetchmany(chunk_size)
+            if not data:
+                break
+
+            for uid, day, crop, yield_values in data:
+                key = (crop, day[:7])
+                if key != month_key:
+                    line = self.month_line(children, month_sums.get(month_key))
+                    if line:
+                        yield line
+                    month_key, children = key, []
+                children.append({"uid": uid, "date": day, "crop_type": crop, "yield_values": yield_values})
+
+        line = self.month_line(children, month_sums.get(month_key))
+        if line:
+            yield line
+
+    def month_line(self, children: List[dict], yield_values: float = None) -> Optional[str]:
+        """
+        Given the days of a month, returns the NDJSON line of the month as in the data table.
+        The month's sum is that of its days unless given. Months without yield are left out,
+        as they are from the monthly sums.
+        """
+        if yield_values is None:
+            yield_values = sum(day["yield_values"] for day in children)
+        if yield_values <= 0.0:
+            return
 
-        daily_data = list(map(lambda row: row.dict(), daily_data.data))
+        month_data = {
+            "date": children[0]["date"][:7] + "-01",
+            "crop_type": children[0]["crop_type"],
+            "yield_values": yield_values,
+            "children": children,
+        }
+
+        return json.dumps(month_data) + "\n"
+
+    async def export_chunks(
+        self,
+        crop_type: str,
+        current_user: str,
+        db: Database,
+        start_date: date = None,
+        end_date: date = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+    ) -> AsyncIterator[List[tuple]]:
+        """
+        Yields the (uid, date, crop_type, yield_values) rows of the dataset in chunks, straight from the cursor,
+        ordered by crop type and date.
+        """
+        logger.debug(f"User {current_user} has requested a {crop_type} export from the DB")
+
+        query, params = self.select_query(crop_type, start_date, end_date)
+        res = await db.execute(query, params)
+
+        while True:
+            data = await res.fetchmany(chunk_size)
+            if not data:
+                break
+            yield data
+
+    async def get_monthly(
+        self,
+        crop_type: str,
+        current_user: str,
+        db: Database,
+        models: bool = False,
+        start_date: date = None,
+        end_date: date = None,
+    ) -> Dataset:
+        """
+        Retrieves the monthly sum for each crop from the maintained monthly aggregate of the dataset.
+        If bounded to a date range, the months overlapping the range are returned.
+        """
+        df_month = await self.get_monthly_frame(crop_type, current_user, db, models, start_date, end_date)
+
+        return self.frame_to_dataset(df_month)
+
+    async def get_monthly_frame(
+        self,
+        crop_type: str,
+        current_user: str,
+        db: Database,
+        models: bool = False,
+        start_date: date = None,
+        end_date: date = None,
+    ) -> DataFrame:
+        """
+        Same as `get_monthly`, but returns a pandas DataFrame with `date`, `crop_type` and `yield_values` columns.
+        """
+        logger.debug(f"User {current_user} has requested monthly {crop_type} from the DB")
+
+        predicate, params = prefix_range("crop_type", crop_type)
+        if start_date:
+            predicate += " AND month >= ?"
+            params.append(str(start_date.replace(day=1)))
+        if end_date:
+            predicate += " AND month <= ?"
+            params.append(str(end_date))
+        query = f"""
+            SELECT month, crop_type, yield_values
+            FROM dataset_monthly
+            WHERE {predicate}
+            ORDER BY crop_type, month
+        """
+        res = await db.execute(query, params)
+        data = await res.fetchall()
 
-        for month_data in monthly_data:
-            year = month_data["date"].year
-            month = month_data["date"].month
-            crop_type = month_data["crop_type"]
+        df_monthly = pd.DataFrame(data, columns=["date", "crop_type", "yield_values"])
 
-            data_in_month = [
-                x
-                for x in daily_data
-                if x["date"].year == year and x["date"].month == month and x["crop_type"] == crop_type
-            ]
-            month_data["children"] = data_in_month
+        return self.monthly_frame(df_monthly, models)
 
-        monthly_data = sorted(monthly_data, key=lambda k: k["date"])
-        dataset_rows = [MonthRow(**row) for row in monthly_data]
+    async def get_monthly_frames(self, crop_types: List[str], current_user: str, db: Database) -> Dict[str, DataFrame]:
+        """
+        Same as `get_monthly_frame` for the models, for several crop types at once. The monthly sums are read with
+        a single query and laid out as a table with a column per crop, so that the series of each crop type
+        is the sum of the columns matching it.
 
-        return TableDataset(data=dataset_rows)
+        Returns the DataFrame of every crop type with data.
+        """
+        table = await self.get_monthly_table(crop_types, current_user, db)
+        if table is None:
+            return {}
+
+        index = PrefixIndex(table.columns)
+        frames = {}
+        for crop_type in crop_types:
+            columns = table.columns[index.find(crop_type)]
+            if columns.empty:
+                continue
+            # Months without data within the range of the crop type count as zero, as in `monthly_frame`.
+            series = table[columns].sum(axis=1, min_count=1)
+            series = series.loc[series.first_valid_index() : series.last_valid_index()].fillna(0.0)
+            frames[crop_type] = pd.DataFrame({"date": series.index, "crop_type": "", "yield_values": series.values})
+
+        return frames
+
+    async def get_monthly_matrix(
+        self, crop_types: List[str], current_user: str, db: Database
+    ) -> Tuple[List[str], pd.DatetimeIndex, np.ndarray]:
+        """
+        Same as `get_monthly_frames`, but the series of every crop type are laid out as the rows of a single
+        2-D array (crop types x months), so that they can be forecast at once. The columns matching each crop type
+        are gathered one group after the other, and the sums of every group are computed together.
+        Months outside the range of each crop type are NaN.
 
-    def get_monthly(self, daily_data: Dataset, models: bool = False) -> Dataset:
+        Returns the crop types with data, the months and the array.
         """
-        Given a daily data history, returns the monthly sum for each crop
+        table = await self.get_monthly_table(crop_types, current_user, db)
+        if table is None:
+            return [], pd.DatetimeIndex([]), np.empty((0, 0))
+
+        index = PrefixIndex(table.columns)
+        selected = []
+        for crop_type in crop_types:
+            positions = index.find(crop_type)
+            if positions:
+                selected.append((crop_type, positions))
+        if not selected:
+            return [], pd.DatetimeIndex([]), np.empty((0, 0))
+
+        # `reduceat` sums between consecutive indices, so that each sum is that of the group of a crop type.
+        crop_types, groups = zip(*selected)
+        starts = np.cumsum([0] + [len(positions) for positions in groups[:-1]])
+        values = table.to_numpy(dtype=float)[:, np.concatenate(groups)]
+        sums = np.add.reduceat(np.nan_to_num(values), starts, axis=1).T
+        counts = np.add.reduceat((~np.isnan(values)).astype(int), starts, axis=1).T
+
+        # Months without data within the range of the crop type count as zero, as in `monthly_frame`.
+        months = np.arange(len(table.index))
+        has_data = counts > 0
+        first = has_data.argmax(axis=1)
+        last = len(months) - 1 - has_data[:, ::-1].argmax(axis=1)
+        within = (months >= first[:, None]) & (months <= last[:, None])
+
+        return list(crop_types), table.index, np.where(within, sums, np.nan)
+
+    async def get_monthly_table(self, crop_types: List[str], current_user: str, db: Database) -> Optional[DataFrame]:
         """
-        daily_data = [row.dict() for row in daily_data.data]
-        df_month = pd.DataFrame()
-        df_daily = pd.DataFrame()
-        df_daily = df_daily.from_dict(daily_data)
-        df_daily["date"] = pd.to_datetime(df_daily["date"])
+        Reads the monthly sums of several crop types with a single query.
+
+        Returns a pandas DataFrame indexed by month with a column per crop, NaN where there is no data,
+        or None if there is no data at all.
+        """
+        logger.debug(f"User {current_user} has requested monthly {', '.join(crop_types)} from the DB")
+
+        predicates, params = [], []
+        for crop_type in crop_types:
+            predicate, prefix_params = prefix_range("crop_type", crop_type)
+            predicates.append(f"({predicate})")
+            params += prefix_params
+        # Filtering too many crop types in SQL would exceed the parameters limit, so they are filtered afterwards.
+        if len(params) > MAX_PARAMS:
+            predicates, params = ["1 = 1"], []
+
+        query = f"""
+            SELECT month, crop_type, yield_values
+            FROM dataset_monthly
+            WHERE {" OR ".join(predicates)}
+            ORDER BY crop_type, month
+        """
+        res = await db.execute(query, params)
+        data = await res.fetchall()
+
+        df_monthly = pd.DataFrame(data, columns=["date", "crop_type", "yield_values"])
+        if df_monthly.empty:
+            return None
+
+        df_monthly["date"] = pd.to_datetime(df_monthly["date"])
+        table = df_monthly.pivot_table(index="date", columns="crop_type", values="yield_values", aggfunc="sum")
+
+        return table.asfreq("MS")
+
+    async def get_crop_types(self, current_user: str, db: Database) -> List[str]:
+        """
+        Returns every crop type with data.
+        """
+        logger.debug(f"User {current_user} has requested the crop types from the DB")
+
+        res = await db.execute("SELECT DISTINCT crop_type FROM dataset_monthly ORDER BY crop_type")
+        data = await res.fetchall()
+
+        return [crop_type for crop_type, in data]
+
+    async def get_frame(
+        self,
+        crop_type: str,
+        current_user: str,
+        db: Database,
+        start_date: date = None,
+        end_date: date = None,
+        limit: int = None,
+        after_crop_type: str = None,
+        after_date: date = None,
+        after_uid: str = None,
+    ) -> DataFrame:
+        """
+        Same as `get`, but returns a pandas DataFrame with a column per field of the dataset rows.
+        """
+        logger.debug(f"User {current_user} has requested {crop_type} from the DB")
+
+        query, params = self.select_query(
+            crop_type, start_date, end_date, limit, after_crop_type, after_date, after_uid
+        )
+        res = await db.execute(query, params)
+        data = await res.fetchall()
+
+        return pd.DataFrame(data, columns=list(DatasetRow.__fields__.keys()))
+
+    def monthly_frame(self, df_daily: DataFrame, models: bool = False) -> DataFrame:
+        """
+        Given a data history, returns the monthly sum for each crop as a pandas DataFrame.
+        When aggregating for the models, every crop is summed up into a single continuous monthly series.
+        """
+        if df_daily.empty:
+            return pd.DataFrame(columns=["date", "crop_type", "yield_values"])
+
+        df_daily = df_daily.assign(date=pd.to_datetime(df_daily["date"]))
 
         if models:
-            df_month = df_daily.set_index("date").resample("MS").sum()
-            df_month = df_month.reset_index()
+            df_month = df_daily.groupby(pd.Grouper(key="date", freq="MS"))["yield_values"].sum().reset_index()
             df_month["crop_type"] = ""
         else:
-            crop_varieties = df_daily["crop_type"].unique()
-            for v in crop_varieties:
-                df_var = df_daily[df_daily["crop_type"] == v]
-                df_var = df_var.set_index("date").resample("MS").sum()
-                df_var["crop_type"] = v
-                df_var = df_var.reset_index()
-
-                df_month = pd.concat([df_month, df_var])
+            df_month = df_daily.groupby(["crop_type", pd.Grouper(key="date", freq="MS")])["yield_values"].sum()
+            df_month = df_month[df_month > 0.0].reset_index()
 
-            df_month = df_month[df_month["yield_values"] > 0.0]
+        return df_month[["date", "crop_type", "yield_values"]]
 
-        df_month["date"] = df_month["date"].dt.strftime("%Y-%m-%d")
-        df_month = df_month[["date", "crop_type", "yield_values"]]
-        month_json = df_month.to_json(orient="table", index=False)
-        month_json = eval(month_json)
-        month_json = eval(json.dumps(month_json["data"]))
+    def frame_to_dataset(self, df_month: DataFrame) -> Dataset:
+        """
+        Given a monthly sums DataFrame, builds the pydantic `Dataset` model.
+        """
+        if df_month.empty:
+            return Dataset.construct(data=[])
 
-        dataset_rows = [DatasetRow(**row) for row in month_json]
+        # Values come straight from the aggregation with their final types, so rows are not validated again.
+        dataset_rows = [
+            DatasetRow.construct(uid=None, date=month, crop_type=crop_type, yield_values=yield_values)
+            for month, crop_type, yield_values in zip(
+                df_month["date"].dt.date, df_month["crop_type"], df_month["yield_values"].tolist()
+            )
+        ]
 
-        return Dataset(data=dataset_rows)
+        return Dataset.construct(data=dataset_rows)
 
 
 class AlgorithmManager:
@@ -227,6 +795,9 @@ class AlgorithmManager:
     """
 
     minio = MinIOStorage()
+    # Concurrent identical trainings and predictions share a single computation.
+    train_flights = SingleFlight()
+    predict_flights = SingleFlight()
 
     async def check(self, algorithm: str, crop_type: str, current_user: str, db: Database) -> Algorithm:
         """
@@ -234,57 +805,312 @@ class AlgorithmManager:
         """
         logger.debug(f"User {current_user} has requested whether {algorithm}/{crop_type} is trained from the DB")
 
-        query = f"""
+        query = """
             SELECT uid, algorithm, crop_type, last_date
             FROM algorithm
-            WHERE algorithm = '{algorithm}' AND crop_type = '{crop_type}'
+            WHERE algorithm = ? AND crop_type = ?
             ORDER BY last_date DESC
             LIMIT 1
         """
-        trained_alg = await execute(query, Algorithm, db)
+        trained_alg = await execute(query, Algorithm, db, params=[algorithm, crop_type])
 
         return trained_alg
 
-    async def train(self, algorithm: str, crop_type: str, current_user: str, db: Database) -> Algorithm:
+    async def train_shared(
+        self,
+        algorithm: str,
+        crop_type: str,
+        current_user: str,
+        refresh: bool = False,
+        revision: Optional[str] = None,
+    ) -> Tuple[Algorithm, Optional[str]]:
         """
         Given a crop type, it trains the algorithm for the according data.
         It stores the pickled trained algorithm's object into MinIO to reuse it for predictions.
+        In refresh mode, the previously trained algorithm is extended with the new data when possible.
+        Data is read and the trained algorithm is stored with short-lived connections,
+        so that the writer is not held while the model is fitted. Concurrent identical trainings share
+        a single one, so that the parameters are not searched and the trained algorithm is not stored twice.
+        Only trainings of the same revision of the crop type data are shared, so that a training requested
+        after a change never gets an algorithm trained on the data before it. The revision is read unless given.
+
+        Returns the trained algorithm and, in refresh mode, whether it was refreshed.
         """
-        daily_dataset = await DatasetManager().get(crop_type, current_user, db)
-        monthly_dataset = DatasetManager().get_monthly(daily_dataset, models=True)
+        logger.debug(f"User {current_user} has requested a trained {algorithm}/{crop_type}")
 
-        df = pd.DataFrame(jsonable_encoder(monthly_dataset.data))
-        last_date = datetime.strptime(df["date"].iloc[-1], "%Y-%m-%d").date()
-        df["date"] = pd.to_datetime(df["date"])
+        if revision is None:
+            async with db.read() as connection:
+                revision = await DatasetManager().get_revision(crop_type, connection)
+
+        async def train() -> Tuple[Algorithm, Optional[str]]:
+            async with db.read() as connection:
+                df, last_date = await self.train_frame(crop_type, current_user, connection)
+                previous = await self.load_previous(algorithm, crop_type, current_user, connection) if refresh else None
+
+            detail = None
+            if previous:
+                alg_obj, refreshed = await self.refit(algorithm, df, previous)
+                detail = "Refreshed" if refreshed else NOT_REFRESHED
+            else:
+                alg_obj = await self.fit(algorithm, df)
+
+            row_in_db = await self.insert_algorithm(algorithm, crop_type, last_date, alg_obj)
+            if not row_in_db:
+                raise RuntimeError("Trained algorithm could not be stored")
+
+            return row_in_db, detail
+
+        return await self.train_flights.do(self.train_key(algorithm, crop_type, refresh, revision), train)
+
+    def train_key(self, algorithm: str, crop_type: str, refresh: bool, revision: str) -> tuple:
+        """
+        Returns the key identical trainings share a single one by.
+        """
+        return algorithm, crop_type, refresh, revision
+
+    def is_training(self, algorithm: str, crop_type: str, refresh: bool, revision: str) -> bool:
+        """
+        Returns whether an identical training of the given revision of the crop type data is in flight.
+        """
+        return self.train_key(algorithm, crop_type, refresh, revision) in self.train_flights.calls
+
+    def flight_stats(self) -> AlgorithmFlights:
+        """
+        Returns the counters of the trainings and predictions, along with how many requests were coalesced.
+        """
+        return AlgorithmFlights(train=self.train_flights.stats(), predict=self.predict_flights.stats())
+
+    async def train_frame(self, crop_type: str, current_user: str, db: Database) -> Tuple[DataFrame, date]:
+        """
+        Given a crop type, returns the pandas DataFrame of monthly data to train the algorithms with and its last date.
+        """
+        df_month = await DatasetManager().get_monthly_frame(crop_type, current_user, db, models=True)
+        if df_month.empty:
+            raise ValueError(f"There is no data for crop type {crop_type}")
+
+        return self.model_frame(df_month)
+
+    def model_frame(self, df_month: DataFrame) -> Tuple[DataFrame, date]:
+        """
+        Given the monthly sums of a crop type, returns the pandas DataFrame to train the algorithms with,
+        indexed by date, and its last date.
+        """
+        df = pd.DataFrame(
+            {
+                "uid": None,
+                "date": pd.to_datetime(df_month["date"]).values,
+                "crop_type": df_month["crop_type"].values,
+                "yield_values": df_month["yield_values"].astype(float).values,
+            }
+        )
         df = df.set_index(["date"])
 
-        logger.debug(f"User {current_user} has requested a trained {algorithm}/{crop_type} from the DB")
+        return df, df.index[-1].date()
 
-        alg = self.get_ml_algorithm(algorithm)
-        trained_alg = alg().train(df)
-        alg_obj = pickle.dumps(trained_alg)
+    async def fit(self, algorithm: str, df: DataFrame) -> bytes:
+        """
+        Trains the algorithm for the given data in a worker process, off the event loop.
 
-        row_in_db = await self.insert_algorithm(algorithm, crop_type, last_date, alg_obj, db)
+        Returns the pickled trained algorithm's object.
+        """
+        return await workers.run(train_algorithm, algorithm, df)
+
+    async def train_batch(
+        self, algorithms: List[str], crop_types: List[str], current_user: str, refresh: bool = False
+    ) -> BatchTraining:
+        """
+        Trains every algorithm for every crop type in one pass, every crop type with data if none is given.
+        The data of all the crop types is read and aggregated at once, the algorithms are fitted in the worker
+        processes concurrently, and the trained algorithms are uploaded to MinIO concurrently and stored in the DB
+        within a single transaction. Data is read and stored with short-lived connections, as in training jobs.
 
-        if row_in_db:
-            return row_in_db
+        Returns the outcome of every pair with its timings.
+        """
+        logger.debug(f"User {current_user} has requested a batch training of {algorithms} for {crop_types}")
+        start = time.perf_counter()
+
+        async with db.read() as connection:
+            crop_types = crop_types or await DatasetManager().get_crop_types(current_user, connection)
+            frames = await DatasetManager().get_monthly_frames(crop_types, current_user, connection)
+            pairs = [
+                PairTraining.construct(algorithm=algorithm, crop_type=crop_type, status=JobStatus.PENDING.value)
+                for algorithm in algorithms
+                for crop_type in crop_types
+            ]
+            previous = [None] * len(pairs)
+            if refresh:
+                previous = await asyncio.gather(
+                    *(self.load_previous(pair.algorithm, pair.crop_type, current_user, connection) for pair in pairs)
+                )
+        model_frames = {crop_type: self.model_frame(df_month) for crop_type, df_month in frames.items()}
+        load_end = time.perf_counter()
+
+        async def fit(pair: PairTraining, previous: Optional[bytes]) -> bytes:
+            if pair.crop_type not in model_frames:
+                raise ValueError(f"There is no data for crop type {pair.crop_type}")
+            df, pair.last_date = model_frames[pair.crop_type]
+
+            if previous:
+                (alg_obj, refreshed), pair.fit_seconds = await workers.run(
+                    timed, refresh_algorithm, pair.algorithm, df, previous
+                )
+                pair.detail = "Refreshed" if refreshed else NOT_REFRESHED
+            else:
+                alg_obj, pair.fit_seconds = await workers.run(timed, train_algorithm, pair.algorithm, df)
+
+            return alg_obj
+
+        alg_objs = await asyncio.gather(*map(fit, pairs, previous), return_exceptions=True)
+        fit_end = time.perf_counter()
+
+        async def upload(pair: PairTraining, alg_obj: bytes) -> None:
+            uid = token_hex(4)
+            upload_start = time.perf_counter()
+            await run_in_threadpool(self.minio.put_file, folder_name=pair.last_date, file_name=uid, data=alg_obj)
+            pair.algorithm_uid, pair.upload_seconds = uid, time.perf_counter() - upload_start
+
+        trained = []
+        for pair, alg_obj in zip(pairs, alg_objs):
+            if isinstance(alg_obj, Exception):
+                logger.debug(f"Training of {pair.algorithm}/{pair.crop_type} has failed.")
+                logger.debug(alg_obj)
+                pair.status, pair.detail = JobStatus.FAILED.value, str(alg_obj) or type(alg_obj).__name__
+            else:
+                trained.append((pair, alg_obj))
+
+        uploads = await asyncio.gather(*(upload(pair, alg_obj) for pair, alg_obj in trained), return_exceptions=True)
+
+        uploaded = []
+        for (pair, _), err in zip(trained, uploads):
+            if err:
+                logger.debug(f"Trained algorithm {pair.algorithm}/{pair.crop_type} could not be uploaded.")
+                logger.debug(err)
+                pair.status, pair.detail = JobStatus.FAILED.value, "Trained algorithm could not be stored"
+            else:
+                uploaded.append(pair)
+
+        try:
+            async with db.write() as connection:
+                # Previously trained algorithms for such combinations are deleted.
+                await connection.executemany(
+                    "DELETE FROM algorithm WHERE algorithm = ? AND crop_type = ? AND last_date = ?",
+                    [(pair.algorithm, pair.crop_type, str(pair.last_date)) for pair in uploaded],
+                )
+                await connection.executemany(
+                    "INSERT INTO algorithm (uid, algorithm, crop_type, last_date) VALUES (?, ?, ?, ?)",
+                    [(pair.algorithm_uid, pair.algorithm, pair.crop_type, str(pair.last_date)) for pair in uploaded],
+                )
+        except Exception as err:
+            logger.debug("Trained algorithms could not be stored in the DB.")
+            logger.debug(err)
+            for pair in uploaded:
+                pair.status, pair.detail, pair.algorithm_uid = JobStatus.FAILED.value, str(err), None
+        else:
+            for pair in uploaded:
+                pair.status = JobStatus.DONE.value
+        end = time.perf_counter()
+
+        return BatchTraining.construct(
+            load_seconds=load_end - start,
+            fit_seconds=fit_end - load_end,
+            upload_seconds=end - fit_end,
+            total_seconds=end - start,
+            pairs=pairs,
+        )
+
+    async def refit(self, algorithm: str, df: DataFrame, previous: bytes) -> Tuple[bytes, bool]:
+        """
+        Refreshes the previously trained algorithm's object with the given data in a worker process. It falls back
+        to training from scratch when the data has drifted or too many new months have piled up.
+
+        Returns the pickled trained algorithm's object and whether it was refreshed.
+        """
+        return await workers.run(refresh_algorithm, algorithm, df, previous)
+
+    async def load_previous(self, algorithm: str, crop_type: str, current_user: str, db: Database) -> Optional[bytes]:
+        """
+        Returns the pickled object of the latest trained algorithm for the given crop type, if any.
+        """
+        trained_alg = await self.check(algorithm, crop_type, current_user, db)
+        if not trained_alg:
+            return
+
+        try:
+            return await self.load(trained_alg)
+        except Exception as err:
+            logger.debug(f"Trained algorithm {algorithm} for crop {crop_type} was not found.")
+            logger.debug(err)
+
+    async def load(self, trained_alg: Algorithm) -> bytes:
+        """
+        Downloads the pickled object of a trained algorithm from MinIO.
+        """
+        dfs_path = self.minio.get_url(trained_alg.last_date, trained_alg.uid)
+        alg_path = await run_in_threadpool(self.minio.get_file, dfs_path.resource)
+
+        with open(alg_path, mode="rb") as file:
+            return file.read()
 
     async def predict(
-        self, algorithm: str, crop_type: str, is_monthly: bool, current_user: str, db: Database
+        self,
+        algorithm: str,
+        crop_type: str,
+        is_monthly: bool,
+        current_user: str,
+        db: Database,
+        revision: Optional[str] = None,
     ) -> AlgorithmPrediction:
         """
         Loads the trained algorithm for the given crop and performs a prediction.
         """
+        frames = await self.predict_frames(algorithm, crop_type, is_monthly, current_user, db, revision)
+        if not frames:
+            return
+
+        trained_alg, last_year_data, pred, forecast = frames
+        data = self.df_to_model(last_year_data, pred, forecast, trained_alg)
+
+        if data:
+            return data
+
+    async def predict_frames(
+        self,
+        algorithm: str,
+        crop_type: str,
+        is_monthly: bool,
+        current_user: str,
+        db: Database,
+        revision: Optional[str] = None,
+    ) -> Optional[Tuple[Algorithm, DataFrame, DataFrame, DataFrame]]:
+        """
+        Same as `predict`, but returns the trained algorithm along with the pandas DataFrames of
+        the last year data, the prediction and the forecast.
+        Concurrent identical predictions share a single computation, so the DataFrames are not to be modified.
+        Only predictions of the same revision of the crop type data are shared, so that a prediction requested
+        after a change never gets the result of a computation which may have started before it. The revision
+        is read unless given, e.g. the one a response is tagged with.
+        """
         logger.debug(f"User {current_user} has requested a prediction with {algorithm}/{crop_type}")
 
+        if revision is None:
+            revision = await DatasetManager().get_revision(crop_type, db)
+
+        return await self.predict_flights.do(
+            (algorithm, crop_type, is_monthly, revision),
+            lambda: self.compute_prediction(algorithm, crop_type, is_monthly, current_user, db),
+        )
+
+    async def compute_prediction(
+        self, algorithm: str, crop_type: str, is_monthly: bool, current_user: str, db: Database
+    ) -> Optional[Tuple[Algorithm, DataFrame, DataFrame, DataFrame]]:
+        """
+        Loads the trained algorithm for the given crop and performs a prediction, as `predict_frames`.
+        """
         trained_alg = await self.check(algorithm, crop_type, current_user, db)
 
         try:
-            dfs_path = self.minio.get_url(trained_alg.last_date, trained_alg.uid)
-            alg_path = self.minio.get_file(dfs_path.resource)
-            with open(alg_path, mode="rb") as file:
-                b_obj = file.read()
-                alg_obj = pickle.loads(b_obj)
+            b_obj = await self.load(trained_alg)
+            alg_obj = pickle.loads(b_obj)
         except Exception as err:
             logger.debug(f"Trained algorithm {algorithm} for crop {crop_type} was not found.")
             logger.debug(err)
@@ -292,8 +1118,7 @@ class AlgorithmManager:
 
         logger.debug(f"Selected trained model for prediction has uid: {trained_alg.uid}")
 
-        daily_dataset = await DatasetManager().get(crop_type, current_user, db)
-        monthly_dataset = DatasetManager().get_monthly(daily_dataset, models=True)
+        monthly_dataset = await DatasetManager().get_monthly(crop_type, current_user, db, models=True)
         df = pd.DataFrame(jsonable_encoder(monthly_dataset.data))
 
         alg = self.get_ml_algorithm(algorithm)
@@ -304,23 +1129,121 @@ class AlgorithmManager:
         else:
             pred = alg().predict(df, alg_obj)
 
-        data = self.df_to_model(last_year_data, pred, forecast, trained_alg)
+        return trained_alg, last_year_data, pred, forecast
 
-        if data:
-            return data
+    async def predict_batch(
+        self, algorithm: str, crop_types: List[str], is_monthly: bool, current_user: str, db: Database
+    ) -> List[AlgorithmPrediction]:
+        """
+        Makes a prediction, as `predict`, for every given crop type, by default every crop type with data, with
+        a vectorized algorithm fitted to all of them at once instead of one at a time. The algorithm is fitted
+        on the fly and not stored, so predictions lack the uid of a trained algorithm.
+        Crop types without enough data for the algorithm are left out.
+        """
+        batch = await self.predict_batch_series(algorithm, crop_types, is_monthly, current_user, db)
+
+        predictions = []
+        for trained_alg, series in batch:
+            datasets = {
+                name: Dataset.construct(
+                    data=[
+                        DatasetRow.construct(
+                            uid=None, date=row_date, crop_type=trained_alg.crop_type, yield_values=value
+                        )
+                        for row_date, value in zip(dates, values)
+                    ]
+                )
+                for name, (dates, values) in series.items()
+            }
+            predictions.append(AlgorithmPrediction.construct(**trained_alg.__dict__, **datasets))
+
+        return predictions
+
+    async def predict_batch_series(
+        self, algorithm: str, crop_types: List[str], is_monthly: bool, current_user: str, db: Database
+    ) -> List[Tuple[Algorithm, Dict[str, Tuple[List[date], List[float]]]]]:
+        """
+        Same as `predict_batch`, but returns the algorithm info of every prediction along with its series,
+        by name, as lists of dates and values.
+        """
+        logger.debug(f"User {current_user} has requested a batch prediction with {algorithm}")
+
+        crop_types = crop_types or await DatasetManager().get_crop_types(current_user, db)
+        crop_types, months, values = await DatasetManager().get_monthly_matrix(crop_types, current_user, db)
+
+        return await run_in_threadpool(self.forecast_matrix, algorithm, crop_types, months, values, is_monthly)
+
+    def forecast_matrix(
+        self, algorithm: str, crop_types: List[str], months: pd.DatetimeIndex, values: np.ndarray, is_monthly: bool
+    ) -> List[Tuple[Algorithm, Dict[str, Tuple[List[date], List[float]]]]]:
+        """
+        Given the monthly series of several crop types, as the rows of a 2-D array, fits the vectorized algorithm
+        to them and predicts every crop type, as `predict_batch_series`. As forecasts start the month after the data,
+        series are fitted together with those ending in the same month, usually all of them.
+        """
+        alg = self.get_ml_algorithm(algorithm)()
+        steps = 1 if is_monthly else 12
+        dates = np.array([month.date() for month in months], dtype=object)
+
+        n_months = np.sum(~np.isnan(values), axis=1)
+        last = len(months) - 1 - np.argmin(np.isnan(values)[:, ::-1], axis=1)
+
+        def series(row_dates: np.ndarray, row_values: np.ndarray) -> Tuple[List[date], List[float]]:
+            # Months without values, NaN, are left out.
+            kept = ~np.isnan(row_values)
+            return row_dates[kept].tolist(), row_values[kept].tolist()
+
+        batch = []
+        for end in np.unique(last):
+            rows = np.flatnonzero((last == end) & (n_months >= alg.MIN_MONTHS))
+            if not len(rows):
+                continue
+
+            data = values[rows, : end + 1]
+            fitted, state = alg.fit_values(data)
+            forecast = alg.forecast_values(SeriesFit(last_date=months[end], fitted=fitted, state=state), steps)
+            future = pd.date_range(months[end], periods=steps + 1, freq="MS")[1:]
+            future = np.array([month.date() for month in future], dtype=object)
+            last_years = dates[max(end - 35, 0) : end + 1]
+
+            for i, row in enumerate(rows):
+                trained_alg = Algorithm.construct(
+                    uid=None, algorithm=algorithm, crop_type=crop_types[row], last_date=dates[end]
+                )
+                forecast_series = series(future, forecast[i])
+                if is_monthly:
+                    last_year_series = series(dates[end - 11 : end - 10], data[i, -12:-11])
+                    prediction_series = forecast_series
+                else:
+                    last_year_series = series(last_years, data[i, -36:])
+                    prediction_series = series(last_years, fitted[i, -36:])
+
+                batch.append(
+                    (
+                        trained_alg,
+                        {
+                            "last_year_data": last_year_series,
+                            "prediction": prediction_series,
+                            "forecast": forecast_series,
+                        },
+                    )
+                )
+
+        return batch
 
     def get_ml_algorithm(self, algorithm: str) -> MLAlgorithm:
         """
-        Given an algorithm name, returns an object of the class of the algorithm.
+        Given an algorithm name, returns the class registered for it, either built-in or provided by a plugin.
 
-        Returns a MLAlgorithm class.
+        Returns a MLAlgorithm class, or None if there is no such algorithm.
         """
-        if algorithm == AlgorithmStack.SARIMA.value:
-            return SARIMA
-        elif algorithm == AlgorithmStack.Prophet.value:
-            return Prophet
-        else:
-            return
+        return ALGORITHMS.get(algorithm)
+
+    def get_ml_algorithms(self) -> List[str]:
+        """
+        Returns the names of every algorithm.
+        """
+        return list(ALGORITHMS)
 
     def df_to_model(
         self, ly_data: DataFrame, pred: DataFrame, fc: DataFrame, algorithm: Algorithm
@@ -360,46 +1283,410 @@ class AlgorithmManager:
             forecast=forecast,
         )
 
-    async def insert_algorithm(
-        self, algorithm: str, crop_type: str, last_date: datetime, alg_obj, db: Database
-    ) -> Algorithm:
+    async def insert_algorithm(self, algorithm: str, crop_type: str, last_date: date, alg_obj) -> Algorithm:
         """
-        Auxiliar method to insert a new algorithm's info in the DB and to upload the object to MinIO
+        Auxiliar method to upload the object to MinIO and to insert the new algorithm's info in the DB.
+        The object is uploaded first, as in `train_batch`, so that the writer is only held to store its info.
         """
         uid = token_hex(4)
 
-        # Previously trained algorithms for such combination are deleted.
-        await self.delete_algorithm(algorithm, crop_type, last_date, db)
+        resource = await run_in_threadpool(self.minio.put_file, folder_name=last_date, file_name=uid, data=alg_obj)
+        if not resource:
+            return
+        logger.debug(f"Algorithm {uid} has been succesfully uploaded, with path {resource.scheme}")
 
-        query = f"""
+        query = """
             INSERT INTO algorithm (uid, algorithm, crop_type, last_date)
-            VALUES ('{uid}', '{algorithm}', '{crop_type}', '{last_date}')
+            VALUES (?, ?, ?, ?)
         """
 
-        res_query = f"""
-            SELECT * FROM algorithm WHERE uid = '{uid}'
+        res_query = """
+            SELECT * FROM algorithm WHERE uid = ?
         """
 
-        row_in_db = await execute_upsert(query, res_query, Algorithm, db, commit=False)
-
-        resource = self.minio.put_file(folder_name=row_in_db.last_date, file_name=row_in_db.uid, data=alg_obj)
-        if resource:
-            logger.debug(f"Algorithm {row_in_db.uid} has been succesfully uploaded, with path {resource.scheme}")
-            await db.commit()
-            return row_in_db
-
-    async def delete_algorithm(self, algorithm: str, crop_type: str, last_date: datetime, db: Database):
+        async with db.write() as connection:
+            # Previously trained algorithms for such combination are deleted.
+            await self.delete_algorithm(algorithm, crop_type, last_date, connection)
+            row_in_db = await execute_upsert(
+                query,
+                res_query,
+                Algorithm,
+                connection,
+                commit=False,
+                params=[uid, algorithm, crop_type, str(last_date)],
+                res_params=[uid],
+            )
+
+        return row_in_db
+
+    async def delete_algorithm(self, algorithm: str, crop_type: str, last_date: date, db: Database):
         """
         Auxiliar method to delete records for an algorithm both from DB and MinIO
         """
         # It is required to specify the date format, as SQL *WHEN QUERYING*
         # internally does not appear to recognize datetime
-        delete_query = f"""
+        delete_query = """
             DELETE FROM algorithm
-            WHERE algorithm = '{algorithm}' AND crop_type = '{crop_type}' AND
-            last_date = '{last_date.strftime('%Y-%m-%d')}'
+            WHERE algorithm = ? AND crop_type = ? AND last_date = ?
         """
-        await execute(delete_query, Algorithm, db, commit=False)
+        params = [algorithm, crop_type, last_date.strftime("%Y-%m-%d")]
+        await execute(delete_query, Algorithm, db, commit=False, params=params)
 
         # TODO
         # Delete from MinIO too.
+
+
+class JobManager:
+    """
+    Class implementing the training jobs, which run in worker processes and are tracked in the DB
+    """
+
+    async def submit(
+        self, algorithm: str, crop_type: str, current_user: str, db: Database, refresh: bool = False
+    ) -> Job:
+        """
+        Stores a pending job to train the algorithm for the given crop type and runs it in the background.
+        In refresh mode, the job extends the previously trained algorithm with the new data when possible.
+        """
+        logger.debug(f"User {current_user} has requested a training job for {algorithm}/{crop_type}")
+
+        job = await self.create(algorithm, crop_type, current_user, db, refresh)
+        await db.commit()
+
+        await self.schedule([job])
+
+        return job
+
+    async def create(
+        self, algorithm: str, crop_type: str, current_user: str, db: Database, refresh: bool = False
+    ) -> Job:
+        """
+        Stores a pending job to train the algorithm for the given crop type. It does not commit.
+        """
+        job = Job.construct(
+            uid=token_hex(8),
+            algorithm=algorithm,
+            crop_type=crop_type,
+            username=current_user,
+            status=JobStatus.PENDING.value,
+            submitted=datetime.utcnow().replace(microsecond=0),
+            finished=None,
+            algorithm_uid=None,
+            detail=None,
+            refresh=refresh,
+        )
+        query = """
+            INSERT INTO job (uid, algorithm, crop_type, username, status, submitted, refresh)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """
+        params = [job.uid, algorithm, crop_type, current_user, job.status, job.submitted.isoformat(), refresh]
+        await db.execute(query, params)
+
+        return job
+
+    async def schedule(self, jobs: List[Job]) -> None:
+        """
+        Runs stored jobs in the background, starting the workers if needed.
+        """
+        if jobs and not workers.executor:
+            await start_workers()
+
+        for job in jobs:
+            workers.spawn(self.run(job))
+
+    async def run(self, job: Job) -> None:
+        """
+        Runs a job once a worker is free.
+        """
+        async with AsyncExitStack() as stack:
+            async with db.read() as connection:
+                revision = await DatasetManager().get_revision(job.crop_type, connection)
+
+            # A job identical to one in flight shares its training, so it does not wait for a worker of its own.
+            if not AlgorithmManager().is_training(job.algorithm, job.crop_type, job.refresh, revision):
+                await stack.enter_async_context(workers.slots)
+
+            async with db.write() as connection:
+                await self.set_status(job.uid, JobStatus.RUNNING, connection)
+
+            try:
+                row_in_db, detail = await AlgorithmManager().train_shared(
+                    job.algorithm, job.crop_type, job.username, job.refresh, revision
+                )
+
+                async with db.write() as connection:
+                    await self.set_status(
+                        job.uid, JobStatus.DONE, connection, algorithm_uid=row_in_db.uid, detail=detail
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.debug(f"Training job {job.uid} for {job.algorithm}/{job.crop_type} has failed.")
+                logger.debug(err)
+                async with db.write() as connection:
+                    await self.set_status(job.uid, JobStatus.FAILED, connection, detail=str(err) or type(err).__name__)
+
+    async def set_status(
+        self,
+        uid: str,
+        status: JobStatus,
+        db: Database,
+        algorithm_uid: Optional[str] = None,
+        detail: Optional[str] = None,
+    ) -> None:
+        """
+        Updates the status of a job, stamping it as finished once it is done or has failed.
+        It does not commit.
+        """
+        finished = None
+        if status in (JobStatus.DONE, JobStatus.FAILED):
+            finished = datetime.utcnow().replace(microsecond=0).isoformat()
+
+        query = """
+            UPDATE job
+            SET status = ?, finished = ?, algorithm_uid = ?, detail = ?
+            WHERE uid = ?
+        """
+        await db.execute(query, [status.value, finished, algorithm_uid, detail, uid])
+
+    async def get(self, uid: str, db: Database) -> Job:
+        """
+        Find a job in the database given its id.
+        """
+        query = """
+            SELECT uid, algorithm, crop_type, username, status, submitted, finished, algorithm_uid, detail, refresh
+            FROM job
+            WHERE uid = ?
+        """
+        job = await execute(query, Job, db, commit=False, params=[uid])
+
+        return job
+
+    async def resume(self) -> List[Job]:
+        """
+        Runs again the jobs left unfinished by a previous run of the API, in submission order.
+        """
+        query = """
+            SELECT uid, algorithm, crop_type, username, status, submitted, finished, algorithm_uid, detail, refresh
+            FROM job
+            WHERE status IN (?, ?)
+            ORDER BY submitted
+        """
+        async with db.read() as connection:
+            res = await connection.execute(query, [JobStatus.PENDING.value, JobStatus.RUNNING.value])
+            jobs = list(map(row_factory(Job), await res.fetchall()))
+
+        for job in jobs:
+            logger.debug(f"Resuming training job {job.uid} for {job.algorithm}/{job.crop_type}")
+        await self.schedule(jobs)
+
+        return jobs
+
+
+class RetrainManager:
+    """
+    Class implementing the retraining of the algorithms whose data has changed. Crop types are queued by triggers
+    whenever their data is written, and their trained algorithms are retrained in training jobs once it settles.
+    """
+
+    async def start(self) -> None:
+        """
+        Starts retraining in the background, including the crop types queued by a previous run of the API.
+        """
+        if settings.RETRAIN_ENABLED:
+            logger.debug("Starting retraining scheduler")
+            scheduler.start(self.retrain_due, poll=max(settings.RETRAIN_DEBOUNCE, 1))
+
+    async def retrain_due(self) -> Optional[float]:
+        """
+        Retrains the crop types due, that is, whose data has not changed for `RETRAIN_DEBOUNCE` seconds
+        or which have been queued for `RETRAIN_MAX_DELAY` seconds, so that a stream of changes does not
+        postpone them forever.
+
+        Returns the seconds until the next queued crop type is due, if any.
+        """
+        query = """
+            SELECT
+                crop_type,
+                last_changed,
+                MIN(
+                    (julianday(last_changed) - julianday('now')) * 86400 + ?,
+                    (julianday(first_changed) - julianday('now')) * 86400 + ?
+                )
+            FROM retrain_queue
+        """
+        async with db.read() as connection:
+            res = await connection.execute(query, [settings.RETRAIN_DEBOUNCE, settings.RETRAIN_MAX_DELAY])
+            queue = await res.fetchall()
+
+        due = [(crop_type, last_changed) for crop_type, last_changed, wait in queue if wait <= 0]
+        if due:
+            await self.retrain(due)
+
+        return min((wait for _, _, wait in queue if wait > 0), default=None)
+
+    async def retrain(self, due: List[Tuple[str, str]]) -> List[Job]:
+        """
+        Given (crop type, last change) pairs, submits a job for every trained algorithm whose crop type is
+        a prefix of any of them, as its data includes theirs. Algorithms with a pending job are skipped,
+        as the job will read the new data anyway. Jobs wait for a free worker as any other, which bounds
+        how many algorithms are retrained at once.
+
+        Crop types leave the queue within the transaction their jobs are stored in, unless they have changed
+        since, so that restarts do not lose them and several API processes do not retrain them twice.
+        """
+        async with db.write() as connection:
+            changed = []
+            for crop_type, last_changed in due:
+                res = await connection.execute(
+                    "DELETE FROM retrain_queue WHERE crop_type = ? AND last_changed = ?", [crop_type, last_changed]
+                )
+                if res.rowcount:
+                    changed.append(crop_type)
+
+            res = await connection.execute("SELECT DISTINCT algorithm, crop_type FROM algorithm")
+            trained = await res.fetchall()
+            res = await connection.execute(
+                "SELECT algorithm, crop_type FROM job WHERE status = ?", [JobStatus.PENDING.value]
+            )
+            pending = {tuple(row) for row in await res.fetchall()}
+
+            jobs = []
+            for algorithm, crop_type in trained:
+                if (algorithm, crop_type) in pending or not AlgorithmManager().get_ml_algorithm(algorithm):
+                    continue
+                if any(has_prefix(changed_crop, crop_type) for changed_crop in changed):
+                    logger.debug(f"Retraining {algorithm}/{crop_type}, as its data has changed")
+                    job = await JobManager().create(
+                        algorithm, crop_type, "scheduler", connection, settings.RETRAIN_REFRESH
+                    )
+                    jobs.append(job)
+
+        await JobManager().schedule(jobs)
+
+        return jobs
+
+
+class BacktestManager:
+    """
+    Class implementing the evaluation of the algorithms with rolling-origin backtesting
+    """
+
+    async def backtest(self, algorithms: List[str], crop_types: List[str], current_user: str) -> List[AlgorithmMetrics]:
+        """
+        Evaluates every algorithm for every crop type, every crop type with data if none is given. Each algorithm
+        is fitted with the data up to each of the last `BACKTEST_FOLDS` cutoffs, `BACKTEST_STEP` months apart,
+        and its forecasts are compared with the following months.
+
+        Folds reuse the hyperparameters of the trained algorithm, or those searched for the data of the first fold
+        if it is not trained, so that each fold is a single fit. The folds of every pair are fitted in parallel
+        in a pool of processes. Metrics replace those of previous backtests of the pairs.
+
+        Returns the metrics of every pair with enough data, at each horizon.
+        """
+        logger.debug(f"User {current_user} has requested a backtest of {algorithms} for {crop_types}")
+
+        async with db.read() as connection:
+            crop_types = crop_types or await DatasetManager().get_crop_types(current_user, connection)
+            frames = await DatasetManager().get_monthly_frames(crop_types, current_user, connection)
+            model_frames = {
+                crop_type: AlgorithmManager().model_frame(df_month)[0] for crop_type, df_month in frames.items()
+            }
+
+            fold_cutoffs = {
+                crop_type: cutoffs(len(df), settings.BACKTEST_FOLDS, settings.BACKTEST_STEP)
+                for crop_type, df in model_frames.items()
+            }
+            pairs = [
+                (algorithm, crop_type)
+                for algorithm in algorithms
+                for crop_type in crop_types
+                if fold_cutoffs.get(crop_type)
+            ]
+            trained = await asyncio.gather(
+                *(AlgorithmManager().load_previous(*pair, current_user, connection) for pair in pairs)
+            )
+
+        configs = await asyncio.gather(
+            *(
+                workers.run(pair_config, algorithm, model_frames[crop_type].iloc[: fold_cutoffs[crop_type][0]], alg_obj)
+                for (algorithm, crop_type), alg_obj in zip(pairs, trained)
+            ),
+            return_exceptions=True,
+        )
+
+        folds, fold_pairs = [], []
+        for (algorithm, crop_type), config in zip(pairs, configs):
+            if isinstance(config, Exception):
+                logger.debug(f"Parameters of {algorithm}/{crop_type} could not be searched.")
+                logger.debug(config)
+                continue
+            df = model_frames[crop_type]
+            for cutoff in fold_cutoffs[crop_type]:
+                folds.append((algorithm, config, df.iloc[:cutoff]))
+                fold_pairs.append((algorithm, crop_type))
+
+        processes = settings.BACKTEST_WORKERS or os.cpu_count() or 1
+        results = await run_in_threadpool(map_in_processes, fold_forecast, folds, processes, settings.GRID_FIT_TIMEOUT)
+
+        forecasts = defaultdict(list)
+        for pair, (forecast, error) in zip(fold_pairs, results):
+            if error:
+                logger.debug(f"A fold of {pair[0]}/{pair[1]} has failed.")
+                logger.debug(error)
+            forecasts[pair].append(forecast)
+
+        evaluated = datetime.utcnow().replace(microsecond=0)
+        metrics = [
+            AlgorithmMetrics.construct(
+                algorithm=algorithm,
+                crop_type=crop_type,
+                horizon=horizon,
+                evaluated=evaluated,
+                **pair_score._asdict(),
+            )
+            for (algorithm, crop_type), pair_forecasts in forecasts.items()
+            for horizon, pair_score in score(
+                model_frames[crop_type]["yield_values"].to_numpy(), fold_cutoffs[crop_type], pair_forecasts
+            ).items()
+        ]
+
+        query = """
+            INSERT INTO metric (algorithm, crop_type, horizon, folds, mae, mape, rmse, evaluated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (algorithm, crop_type, horizon) DO UPDATE SET
+                folds = excluded.folds,
+                mae = excluded.mae,
+                mape = excluded.mape,
+                rmse = excluded.rmse,
+                evaluated = excluded.evaluated
+        """
+        async with db.write() as connection:
+            await connection.executemany(
+                query,
+                [
+                    (m.algorithm, m.crop_type, m.horizon, m.folds, m.mae, m.mape, m.rmse, m.evaluated.isoformat())
+                    for m in metrics
+                ],
+            )
+
+        return metrics
+
+    async def get(
+        self, algorithm: Optional[str], crop_type: Optional[str], current_user: str, db: Database
+    ) -> List[AlgorithmMetrics]:
+        """
+        Returns the metrics of the latest backtests, optionally of a given algorithm or crop type,
+        the most accurate algorithm first for each crop type and horizon.
+        """
+        logger.debug(f"User {current_user} has requested the metrics of {algorithm}/{crop_type} from the DB")
+
+        query = """
+            SELECT algorithm, crop_type, horizon, folds, mae, mape, rmse, evaluated
+            FROM metric
+            WHERE (? IS NULL OR algorithm = ?) AND (? IS NULL OR crop_type = ?)
+            ORDER BY crop_type, horizon, mae
+        """
+        res = await db.execute(query, [algorithm, algorithm, crop_type, crop_type])
+
+        return list(map(row_factory(AlgorithmMetrics), await res.fetchall()))
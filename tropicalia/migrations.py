@@ -0,0 +1,352 @@
+import aiosqlite
+
+from tropicalia.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Ordered list of schema migrations. The database schema version is the number of applied migrations,
+# which is tracked with SQLite's `user_version` pragma. Only ever append new migrations to this list.
+MIGRATIONS = [
+    # 1. Initial schema and indexes for the hot queries.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS dataset (
+            uid TEXT PRIMARY KEY,
+            date TEXT NOT NULL,
+            crop_type TEXT NOT NULL,
+            yield_values REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS algorithm (
+            uid TEXT PRIMARY KEY,
+            algorithm TEXT NOT NULL,
+            crop_type TEXT NOT NULL,
+            last_date TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT NOT NULL,
+            email TEXT NOT NULL,
+            password TEXT NOT NULL
+        )
+        """,
+        # Covers `DatasetManager.get`, which reads every column of a crop type range ordered by date.
+        "CREATE INDEX IF NOT EXISTS ix_dataset_crop_type_date ON dataset (crop_type, date, uid, yield_values)",
+        # Covers `AlgorithmManager.check`, which looks for the latest trained algorithm / crop type pair.
+        "CREATE INDEX IF NOT EXISTS ix_algorithm_pair_last_date ON algorithm (algorithm, crop_type, last_date, uid)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_users_username ON users (username)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_users_email ON users (email)",
+    ],
+    # 2. Monthly aggregate of the dataset, kept up to date by triggers within the writing transaction.
+    # Triggers avoid `INSERT OR IGNORE`, as the conflict policy of an outer upsert would override it.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS dataset_monthly (
+            crop_type TEXT NOT NULL,
+            month TEXT NOT NULL,
+            yield_values REAL NOT NULL,
+            days INTEGER NOT NULL,
+            PRIMARY KEY (crop_type, month)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO dataset_monthly (crop_type, month, yield_values, days)
+        SELECT crop_type, strftime('%Y-%m-01', date), SUM(yield_values), COUNT(*)
+        FROM dataset
+        GROUP BY crop_type, strftime('%Y-%m-01', date)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS dataset_monthly_insert AFTER INSERT ON dataset
+        BEGIN
+            INSERT INTO dataset_monthly (crop_type, month, yield_values, days)
+            SELECT new.crop_type, strftime('%Y-%m-01', new.date), 0, 0
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dataset_monthly
+                WHERE crop_type = new.crop_type AND month = strftime('%Y-%m-01', new.date)
+            );
+            UPDATE dataset_monthly
+            SET yield_values = yield_values + new.yield_values, days = days + 1
+            WHERE crop_type = new.crop_type AND month = strftime('%Y-%m-01', new.date);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS dataset_monthly_delete AFTER DELETE ON dataset
+        BEGIN
+            UPDATE dataset_monthly
+            SET yield_values = yield_values - old.yield_values, days = days - 1
+            WHERE crop_type = old.crop_type AND month = strftime('%Y-%m-01', old.date);
+            DELETE FROM dataset_monthly
+            WHERE crop_type = old.crop_type AND month = strftime('%Y-%m-01', old.date) AND days <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS dataset_monthly_update AFTER UPDATE OF date, crop_type, yield_values ON dataset
+        BEGIN
+            UPDATE dataset_monthly
+            SET yield_values = yield_values - old.yield_values, days = days - 1
+            WHERE crop_type = old.crop_type AND month = strftime('%Y-%m-01', old.date);
+            DELETE FROM dataset_monthly
+            WHERE crop_type = old.crop_type AND month = strftime('%Y-%m-01', old.date) AND days <= 0;
+            INSERT INTO dataset_monthly (crop_type, month, yield_values, days)
+            SELECT new.crop_type, strftime('%Y-%m-01', new.date), 0, 0
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dataset_monthly
+                WHERE crop_type = new.crop_type AND month = strftime('%Y-%m-01', new.date)
+            );
+            UPDATE dataset_monthly
+            SET yield_values = yield_values + new.yield_values, days = days + 1
+            WHERE crop_type = new.crop_type AND month = strftime('%Y-%m-01', new.date);
+        END
+        """,
+    ],
+    # 3. Revision of each crop type, bumped by triggers whenever its data or its trained algorithms change.
+    # Revisions are never deleted, so the crop type of a deleted or updated row already has one.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS crop_revision (
+            crop_type TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO crop_revision (crop_type, revision)
+        SELECT crop_type, 1 FROM dataset UNION SELECT crop_type, 1 FROM algorithm
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS crop_revision_dataset_insert AFTER INSERT ON dataset
+        BEGIN
+            INSERT INTO crop_revision (crop_type, revision)
+            SELECT new.crop_type, 0
+            WHERE NOT EXISTS (SELECT 1 FROM crop_revision WHERE crop_type = new.crop_type);
+            UPDATE crop_revision SET revision = revision + 1 WHERE crop_type = new.crop_type;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS crop_revision_dataset_delete AFTER DELETE ON dataset
+        BEGIN
+            UPDATE crop_revision SET revision = revision + 1 WHERE crop_type = old.crop_type;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS crop_revision_dataset_update
+        AFTER UPDATE OF date, crop_type, yield_values ON dataset
+        WHEN old.date IS NOT new.date OR old.crop_type IS NOT new.crop_type OR old.yield_values IS NOT new.yield_values
+        BEGIN
+            UPDATE crop_revision SET revision = revision + 1 WHERE crop_type = old.crop_type;
+            INSERT INTO crop_revision (crop_type, revision)
+            SELECT new.crop_type, 0
+            WHERE NOT EXISTS (SELECT 1 FROM crop_revision WHERE crop_type = new.crop_type);
+            UPDATE crop_revision SET revision = revision + 1 WHERE crop_type = new.crop_type;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS crop_revision_algorithm_insert AFTER INSERT ON algorithm
+        BEGIN
+            INSERT INTO crop_revision (crop_type, revision)
+            SELECT new.crop_type, 0
+            WHERE NOT EXISTS (SELECT 1 FROM crop_revision WHERE crop_type = new.crop_type);
+            UPDATE crop_revision SET revision = revision + 1 WHERE crop_type = new.crop_type;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS crop_revision_algorithm_delete AFTER DELETE ON algorithm
+        BEGIN
+            UPDATE crop_revision SET revision = revision + 1 WHERE crop_type = old.crop_type;
+        END
+        """,
+    ],
+    # 4. Training jobs, which run in worker processes. Unfinished jobs are resumed on startup.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS job (
+            uid TEXT PRIMARY KEY,
+            algorithm TEXT NOT NULL,
+            crop_type TEXT NOT NULL,
+            username TEXT NOT NULL,
+            status TEXT NOT NULL,
+            submitted TEXT NOT NULL,
+            finished TEXT,
+            algorithm_uid TEXT,
+            detail TEXT
+        )
+        """,
+        # Covers `JobManager.resume`, which looks for the unfinished jobs in submission order.
+        "CREATE INDEX IF NOT EXISTS ix_job_status_submitted ON job (status, submitted)",
+    ],
+    # 5. Training jobs refreshing the previous model with the new data instead of training from scratch.
+    [
+        "ALTER TABLE job ADD COLUMN refresh INTEGER NOT NULL DEFAULT 0",
+    ],
+    # 6. Crop types whose data has changed since their algorithms were last retrained, marked by triggers
+    # within the writing transaction, along with the time of their first and last change.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS retrain_queue (
+            crop_type TEXT PRIMARY KEY,
+            first_changed TEXT NOT NULL,
+            last_changed TEXT NOT NULL
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS retrain_queue_dataset_insert AFTER INSERT ON dataset
+        BEGIN
+            INSERT INTO retrain_queue (crop_type, first_changed, last_changed)
+            VALUES (new.crop_type, strftime('%Y-%m-%dT%H:%M:%f', 'now'), strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+            ON CONFLICT (crop_type) DO UPDATE SET last_changed = excluded.last_changed
+            WHERE last_changed < excluded.last_changed;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS retrain_queue_dataset_delete AFTER DELETE ON dataset
+        BEGIN
+            INSERT INTO retrain_queue (crop_type, first_changed, last_changed)
+            VALUES (old.crop_type, strftime('%Y-%m-%dT%H:%M:%f', 'now'), strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+            ON CONFLICT (crop_type) DO UPDATE SET last_changed = excluded.last_changed
+            WHERE last_changed < excluded.last_changed;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS retrain_queue_dataset_update
+        AFTER UPDATE OF date, crop_type, yield_values ON dataset
+        WHEN old.date IS NOT new.date OR old.crop_type IS NOT new.crop_type OR old.yield_values IS NOT new.yield_values
+        BEGIN
+            INSERT INTO retrain_queue (crop_type, first_changed, last_changed)
+            VALUES (old.crop_type, strftime('%Y-%m-%dT%H:%M:%f', 'now'), strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+            ON CONFLICT (crop_type) DO UPDATE SET last_changed = excluded.last_changed
+            WHERE last_changed < excluded.last_changed;
+            INSERT INTO retrain_queue (crop_type, first_changed, last_changed)
+            VALUES (new.crop_type, strftime('%Y-%m-%dT%H:%M:%f', 'now'), strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+            ON CONFLICT (crop_type) DO UPDATE SET last_changed = excluded.last_changed
+            WHERE last_changed < excluded.last_changed;
+        END
+        """,
+    ],
+    # 7. Accuracy of every algorithm / crop type pair at each horizon, as measured by the latest backtest.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS metric (
+            algorithm TEXT NOT NULL,
+            crop_type TEXT NOT NULL,
+            horizon INTEGER NOT NULL,
+            folds INTEGER NOT NULL,
+            mae REAL NOT NULL,
+            mape REAL,
+            rmse REAL NOT NULL,
+            evaluated TEXT NOT NULL,
+            PRIMARY KEY (algorithm, crop_type, horizon)
+        ) WITHOUT ROWID
+        """,
+    ],
+    # 8. Crop types are matched by prefix with `LIKE`, ignoring case, which can only be answered with
+    # an index range scan by indexes with the NOCASE collation.
+    [
+        """
+        CREATE INDEX IF NOT EXISTS ix_dataset_monthly_crop_type_nocase
+        ON dataset_monthly (crop_type COLLATE NOCASE, month, yield_values)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_crop_revision_crop_type_nocase
+        ON crop_revision (crop_type COLLATE NOCASE, revision)
+        """,
+    ],
+    # 9. Monthly aggregate triggers recomputing the sums of the changed months from their days, over the
+    # (crop_type, date) index, instead of adding and subtracting to them, which accumulates rounding errors.
+    # Months are deleted before being inserted again, and left out when they have no days.
+    [
+        "DROP TRIGGER IF EXISTS dataset_monthly_insert",
+        "DROP TRIGGER IF EXISTS dataset_monthly_delete",
+        "DROP TRIGGER IF EXISTS dataset_monthly_update",
+        "DELETE FROM dataset_monthly",
+        """
+        INSERT INTO dataset_monthly (crop_type, month, yield_values, days)
+        SELECT crop_type, strftime('%Y-%m-01', date), SUM(yield_values), COUNT(*)
+        FROM dataset
+        GROUP BY crop_type, strftime('%Y-%m-01', date)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS dataset_monthly_insert AFTER INSERT ON dataset
+        BEGIN
+            DELETE FROM dataset_monthly
+            WHERE crop_type = new.crop_type AND month = strftime('%Y-%m-01', new.date);
+            INSERT INTO dataset_monthly (crop_type, month, yield_values, days)
+            SELECT crop_type, strftime('%Y-%m-01', new.date), SUM(yield_values), COUNT(*)
+            FROM dataset
+            WHERE crop_type = new.crop_type
+            AND date >= strftime('%Y-%m-01', new.date) AND date < date(new.date, 'start of month', '+1 month')
+            GROUP BY crop_type;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS dataset_monthly_delete AFTER DELETE ON dataset
+        BEGIN
+            DELETE FROM dataset_monthly
+            WHERE crop_type = old.crop_type AND month = strftime('%Y-%m-01', old.date);
+            INSERT INTO dataset_monthly (crop_type, month, yield_values, days)
+            SELECT crop_type, strftime('%Y-%m-01', old.date), SUM(yield_values), COUNT(*)
+            FROM dataset
+            WHERE crop_type = old.crop_type
+            AND date >= strftime('%Y-%m-01', old.date) AND date < date(old.date, 'start of month', '+1 month')
+            GROUP BY crop_type;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS dataset_monthly_update AFTER UPDATE OF date, crop_type, yield_values ON dataset
+        WHEN old.date IS NOT new.date OR old.crop_type IS NOT new.crop_type OR old.yield_values IS NOT new.yield_values
+        BEGIN
+            DELETE FROM dataset_monthly
+            WHERE crop_type = old.crop_type AND month = strftime('%Y-%m-01', old.date);
+            INSERT INTO dataset_monthly (crop_type, month, yield_values, days)
+            SELECT crop_type, strftime('%Y-%m-01', old.date), SUM(yield_values), COUNT(*)
+            FROM dataset
+            WHERE crop_type = old.crop_type
+            AND date >= strftime('%Y-%m-01', old.date) AND date < date(old.date, 'start of month', '+1 month')
+            GROUP BY crop_type;
+            DELETE FROM dataset_monthly
+            WHERE crop_type = new.crop_type AND month = strftime('%Y-%m-01', new.date);
+            INSERT INTO dataset_monthly (crop_type, month, yield_values, days)
+            SELECT crop_type, strftime('%Y-%m-01', new.date), SUM(yield_values), COUNT(*)
+            FROM dataset
+            WHERE crop_type = new.crop_type
+            AND date >= strftime('%Y-%m-01', new.date) AND date < date(new.date, 'start of month', '+1 month')
+            GROUP BY crop_type;
+        END
+        """,
+    ],
+]
+
+
+async def get_version(db: aiosqlite.Connection) -> int:
+    """
+    Returns the schema version of the database.
+    """
+    res = await db.execute("PRAGMA user_version")
+    (version,) = await res.fetchone()
+    return version
+
+
+async def migrate(db: aiosqlite.Connection) -> int:
+    """
+    Applies the pending migrations, each one within its own transaction.
+
+    Returns the resulting schema version.
+    """
+    version = await get_version(db)
+
+    for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.debug(f"Migrating database schema to version {target}")
+        try:
+            await db.execute("BEGIN")
+            for statement in statements:
+                await db.execute(statement)
+            await db.execute(f"PRAGMA user_version = {target}")
+            await db.commit()
+        except Exception as err:
+            logger.error(f"Database migration to version {target} failed")
+            logger.exception(err)
+            await db.rollback()
+            raise
+        version = target
+
+    return version
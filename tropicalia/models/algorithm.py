@@ -1,4 +1,5 @@
-from datetime import date
+from datetime import date, datetime
+from typing import List, Optional
 from pydantic import BaseModel
 
 from tropicalia.models.dataset import Dataset
@@ -12,6 +13,62 @@ class Algorithm(BaseModel):
 
 
 class AlgorithmPrediction(Algorithm):
+    # Algorithms fitted on the fly for a batch prediction are not stored.
+    uid: Optional[str]
     last_year_data: Dataset
     prediction: Dataset
     forecast: Dataset
+
+
+class Job(BaseModel):
+    uid: str
+    algorithm: str
+    crop_type: str
+    username: str
+    status: str
+    submitted: datetime
+    finished: Optional[datetime]
+    algorithm_uid: Optional[str]
+    detail: Optional[str]
+    refresh: bool = False
+
+
+class AlgorithmMetrics(BaseModel):
+    algorithm: str
+    crop_type: str
+    horizon: int
+    folds: int
+    mae: float
+    mape: Optional[float]
+    rmse: float
+    evaluated: datetime
+
+
+class FlightStats(BaseModel):
+    flights: int
+    coalesced: int
+    in_flight: int
+
+
+class AlgorithmFlights(BaseModel):
+    train: FlightStats
+    predict: FlightStats
+
+
+class PairTraining(BaseModel):
+    algorithm: str
+    crop_type: str
+    status: str
+    algorithm_uid: Optional[str]
+    last_date: Optional[date]
+    detail: Optional[str]
+    fit_seconds: Optional[float]
+    upload_seconds: Optional[float]
+
+
+class BatchTraining(BaseModel):
+    load_seconds: float
+    fit_seconds: float
+    upload_seconds: float
+    total_seconds: float
+    pairs: List[PairTraining]
@@ -23,3 +23,18 @@ class MonthRow(BaseModel):
 
 class TableDataset(BaseModel):
     data: List[MonthRow]
+
+
+class ImportReport(BaseModel):
+    rows: int
+    seconds: float
+    rows_per_second: float
+
+
+class CacheStats(BaseModel):
+    entries: int
+    bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from tropicalia.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Scheduler:
+    """
+    Runs a task in the background whenever it is due. The task returns the seconds until it is due again, if any,
+    and it is run at least every `poll` seconds, so that changes made by other processes are noticed too.
+    Changes made by this process wake it up right away through `notify`.
+    """
+
+    task: asyncio.Future = None
+    wakeup: asyncio.Event = None
+
+    def start(self, fn: Callable[[], Awaitable[Optional[float]]], poll: float) -> None:
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.ensure_future(self.run(fn, poll))
+
+    def notify(self) -> None:
+        """
+        Wakes up the task, which is run again.
+        """
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def run(self, fn: Callable[[], Awaitable[Optional[float]]], poll: float) -> None:
+        while True:
+            self.wakeup.clear()
+            try:
+                delay = await fn()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning("Scheduled task has failed")
+                logger.exception(err)
+                delay = None
+
+            timeout = poll if delay is None else min(max(delay, 0), poll)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+        self.task = None
+        self.wakeup = None
+
+
+scheduler = Scheduler()
+
+
+async def stop_scheduler() -> None:
+    logger.debug("Stopping retraining scheduler")
+    await scheduler.stop()
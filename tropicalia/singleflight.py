@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from tropicalia.logger import get_logger
+from tropicalia.models.algorithm import FlightStats
+
+logger = get_logger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight, the calls made for the same key
+    wait for it and receive its result, or its error, instead of computing it again.
+
+    The first caller computes the result itself, with its own resources (e.g. its DB connection), so that waiting
+    callers do not hold anything the computation needs. If the first caller is cancelled, one of the waiting
+    callers takes over.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+        self.flights = self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Any:
+        """
+        Returns the result of the call in flight for the given key, or of calling the function if there is none.
+        """
+        while key in self.calls:
+            future = self.calls[key]
+            logger.debug(f"Call {key} is in flight, waiting for its result")
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Unless this caller was the one cancelled, the first caller was, so this one takes over.
+                if not future.cancelled():
+                    raise
+                continue
+            except Exception:
+                self.coalesced += 1
+                raise
+            self.coalesced += 1
+            return result
+
+        future = asyncio.get_event_loop().create_future()
+        self.calls[key] = future
+        self.flights += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            # Marks the error as retrieved, as there may be no callers waiting for it.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.calls[key]
+
+    def stats(self) -> FlightStats:
+        """
+        Returns the counters of the calls.
+        """
+        return FlightStats(flights=self.flights, coalesced=self.coalesced, in_flight=len(self.calls))